@@ -1,13 +1,17 @@
 from collections import OrderedDict, defaultdict
 from datetime import timedelta
+from time import monotonic
 
 from django.db import transaction
+from django.db.models import Count
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _l
 from django.utils.timezone import now
 
+from pymess import metrics
+from pymess.tracing import start_span, set_span_attribute
 from pymess.config import settings
-from pymess.config import get_router, get_backend, get_default_sender_backend_name
+from pymess.config import get_router, get_backend, get_backend_names, get_default_sender_backend_name
 from pymess.utils import fullname
 
 
@@ -20,16 +24,41 @@ class BaseController:
 
     model = None
     backend_type_name = None
+    final_states = ()
+
+    _reported_queue_keys = defaultdict(set)
 
     def __init__(self):
         self._loaded_backends = {}
 
-    def get_backend(self, recipient):
-        backend_name = self.router.get_backend_name(recipient) or get_default_sender_backend_name(self.backend_type_name)
+    def _get_backend_by_name(self, backend_name):
         if backend_name not in self._loaded_backends:
             self._loaded_backends[backend_name] = get_backend(self.backend_type_name, backend_name)
         return self._loaded_backends[backend_name]
 
+    def get_backend(self, recipient):
+        return self._get_backend_by_name(
+            self.router.get_backend_name(recipient) or get_default_sender_backend_name(self.backend_type_name)
+        )
+
+    def _get_sticky_backend_name(self, message, backend_names):
+        if self.router.is_sticky and message.backend_name in backend_names:
+            return message.backend_name
+        else:
+            return None
+
+    def get_message_backend(self, message):
+        """
+        Returns backend for the already created message. If router is sticky the message is processed with the backend
+        which was used for the message before.
+        :param message: message object
+        """
+        sticky_backend_name = self._get_sticky_backend_name(message, get_backend_names(self.backend_type_name))
+        if sticky_backend_name:
+            return self._get_backend_by_name(sticky_backend_name)
+        else:
+            return self.get_backend(message.recipient)
+
     @cached_property
     def router(self):
         return get_router(self.backend_type_name)
@@ -38,24 +67,113 @@ class BaseController:
         """
         Return queryset of waiting messages to send
         """
-        return self.model.objects.filter(state__in={self.model.State.WAITING, self.model.State.ERROR_RETRY})
+        return self.model.objects.filter(
+            state__in={self.model.State.WAITING, self.model.State.ERROR_RETRY}
+        ).filter_query_window()
+
+    def update_queue_depth_metrics(self):
+        """
+        Sets queue depth metrics to the number of waiting messages grouped by state and priority. Already reported
+        combinations of state and priority without messages are set to zero.
+        """
+        queue_depths = {
+            (queue_depth['state'], queue_depth['priority']): queue_depth['count']
+            for queue_depth in self.get_waiting_or_retry_messages().order_by().values(
+                'state', 'priority'
+            ).annotate(count=Count('pk'))
+        }
+        reported_queue_keys = self._reported_queue_keys[self.backend_type_name]
+        reported_queue_keys.update(queue_depths.keys())
+        for state, priority in reported_queue_keys:
+            metrics.queue_depth.set(
+                queue_depths.get((state, priority), 0),
+                type=metrics.get_type_label(self.backend_type_name),
+                state=self.model.State(state).name,
+                priority=priority,
+            )
 
     def is_turned_on_batch_sending(self):
         return False
 
+    def rollup_statistics(self):
+        """
+        Refreshes pre-aggregated statistics of the messages changed since the last rollup
+        :return: number of refreshed hour buckets
+        """
+        from pymess.models import MessageStatistics
+
+        return MessageStatistics.objects.rollup(self.model, metrics.get_type_label(self.backend_type_name))
+
+    def get_statistics(self):
+        """
+        Returns queryset of pre-aggregated hour statistics of the messages
+        """
+        from pymess.models import MessageStatistics
+
+        return MessageStatistics.objects.filter_message_type(metrics.get_type_label(self.backend_type_name))
+
+    def _record_provider_call(self, backend, duration, number_of_messages=1):
+        self.router.record_latency(backend.name, duration / number_of_messages)
+        metrics.provider_call_duration.observe(
+            duration, type=metrics.get_type_label(self.backend_type_name), backend=metrics.get_backend_label(backend)
+        )
+
+    def _record_status_check(self, backend, duration, number_of_messages):
+        labels = {
+            'type': metrics.get_type_label(self.backend_type_name),
+            'backend': metrics.get_backend_label(backend),
+        }
+        metrics.status_check_duration.observe(duration, **labels)
+        metrics.status_checked_messages.inc(number_of_messages, **labels)
+
+    def _publish_message(self, backend, message):
+        with start_span('publish_message', type=metrics.get_type_label(self.backend_type_name),
+                        backend=metrics.get_backend_label(backend), message_pk=message.pk,
+                        template_slug=message.template_slug):
+            started_at = monotonic()
+            backend.publish_message(message)
+            self._record_provider_call(backend, monotonic() - started_at)
+
+    def _publish_messages(self, backend, messages):
+        with start_span('publish_messages', type=metrics.get_type_label(self.backend_type_name),
+                        backend=metrics.get_backend_label(backend), number_of_messages=len(messages)):
+            started_at = monotonic()
+            backend.publish_messages(messages)
+            self._record_provider_call(backend, monotonic() - started_at, len(messages))
+
     def publish_or_retry_message(self, message):
-        backend = self.get_backend(recipient=message.recipient)
+        backend = self.get_message_backend(message)
         if (message.number_of_send_attempts > backend.get_batch_max_number_of_send_attempts()
             or message.created_at < now() - timedelta(seconds=self.get_batch_max_seconds_to_send())):
             backend._set_message_as_failed(message)
             return False
         else:
-            backend.publish_message(message)
+            self._publish_message(backend, message)
             return True
 
+    def normalize_recipient(self, recipient):
+        """
+        Returns recipient in the same format as it is stored in the message model
+        """
+        return recipient
+
+    def get_recently_sent_recipients(self, recipients, template_slug, dedup_window_seconds):
+        """
+        Returns set of recipients which received a message created from the template in the last dedup_window_seconds
+        seconds. Messages without template are compared with other messages without template.
+        :param recipients: list of emails or phone numbers of recipients
+        :param template_slug: slug of the template or None
+        :param dedup_window_seconds: length of the window in seconds
+        """
+        return set(self.model.objects.filter(
+            recipient__in={self.normalize_recipient(recipient) for recipient in recipients},
+            template_slug=template_slug,
+            created_at__gte=now() - timedelta(seconds=dedup_window_seconds),
+        ).values_list('recipient', flat=True))
+
     @transaction.atomic
     def send(self, recipient, content, related_objects=None, tag=None, template=None, send_immediately=False,
-             message_backend=None, **kwargs):
+             message_backend=None, dedup_window_seconds=None, **kwargs):
         """
         Send message with the text content to the phone number (recipient)
         :param recipient: email or phone number of the recipient
@@ -66,13 +184,19 @@ class BaseController:
         :param template: template object from which content of the message was create
         :param send_immediately: publishes the message regardless of the `is_turned_on_batch_sending` result
         :param message_backend: message backend instance
+        :param dedup_window_seconds: message is not created (None is returned) if a message from the same template was
+        sent to the recipient in the last dedup_window_seconds seconds
         :param kwargs: extra attributes that will be stored to the message
         """
+        if dedup_window_seconds and self.get_recently_sent_recipients(
+                [recipient], template.slug if template else None, dedup_window_seconds):
+            return None
+
         backend = message_backend or self.get_backend(recipient)
         message = self.create_message(recipient=recipient, content=content, related_objects=related_objects, tag=tag,
                                       template=template, **kwargs)
         if send_immediately or not self.is_turned_on_batch_sending():
-            backend.publish_message(message)
+            self._publish_message(backend, message)
         return message
 
     def get_batch_max_seconds_to_send(self):
@@ -87,6 +211,62 @@ class BaseController:
         """
         raise NotImplementedError
 
+    def get_retention_days(self):
+        """
+        Return number of days after which messages in the final state are purged or None if messages are kept forever
+        """
+        raise NotImplementedError
+
+    def get_final_state_messages(self):
+        """
+        Return queryset of messages which state will not be changed
+        """
+        return self.model.objects.filter(state__in=self.final_states)
+
+    def get_messages_to_purge(self):
+        """
+        Return queryset of messages in the final state which are older than the retention period
+        """
+        retention_days = self.get_retention_days()
+        if retention_days is None:
+            return self.model.objects.none()
+        return self.get_final_state_messages().filter(created_at__lt=now() - timedelta(days=retention_days))
+
+    def get_purger(self, chunk_size=None, archive=False):
+        from pymess.retention import MessagePurger
+
+        return MessagePurger(self, chunk_size=chunk_size, archive=archive)
+
+    def purge_messages(self, chunk_size=None, archive=False):
+        """
+        Deletes messages in the final state which are older than the retention period
+        :param chunk_size: number of messages deleted in one transaction
+        :param archive: messages are archived to the storage before deleting if it is True
+        :return: PurgeResult instance
+        """
+        return self.get_purger(chunk_size=chunk_size, archive=archive).purge()
+
+    def get_exporter(self, include_body=False, chunk_size=None, max_workers=None):
+        from pymess.export import MessageExporter
+
+        return MessageExporter(self, include_body=include_body, chunk_size=chunk_size, max_workers=max_workers)
+
+    def export_messages(self, output, format='jsonl', queryset=None, include_body=False, chunk_size=None,
+                        max_workers=None):
+        """
+        Writes messages to the output in the JSON lines or CSV format, messages are streamed in chunks
+        :param output: text file object
+        :param format: format of the output (jsonl or csv)
+        :param queryset: queryset of the exported messages, all messages are exported by default
+        :param include_body: content of the messages is exported if it is True
+        :param chunk_size: number of messages fetched from the database at once
+        :param max_workers: maximal number of parallel reads of the message contents from the storage
+        :return: number of exported messages
+        """
+        return self.get_exporter(
+            include_body=include_body, chunk_size=chunk_size, max_workers=max_workers
+        ).export(output, format, queryset)
+
     def create_message(self, recipient, content, related_objects, tag, template,
                        priority=settings.DEFAULT_MESSAGE_PRIORITY, **kwargs):
         """
@@ -100,23 +280,39 @@ class BaseController:
         :param priority: priority of sending message 1 (highest) to 3 (lowest)
         :param kwargs: extra attributes that will be saved with the message
         """
-        message = self.model.objects.create(
-            recipient=recipient,
-            content=content,
-            tag=tag,
-            template=template,
-            template_slug=template.slug if template else None,
-            priority=priority,
-            **kwargs
-        )
-        if related_objects:
-            message.related_objects.create_from_related_objects(*related_objects)
+        with start_span('create_message', type=metrics.get_type_label(self.backend_type_name),
+                        template_slug=template.slug if template else None) as span:
+            message = self.model.objects.create(
+                recipient=recipient,
+                content=content,
+                tag=tag,
+                template=template,
+                template_slug=template.slug if template else None,
+                duplicate_key=template.get_duplicate_key(related_objects) if template and related_objects else None,
+                priority=priority,
+                **kwargs
+            )
+            set_span_attribute(span, 'message_pk', message.pk)
+            if related_objects:
+                with start_span('create_related_objects', message_pk=message.pk,
+                                number_of_related_objects=len(related_objects)):
+                    message.related_objects.bulk_create_from_related_objects(*related_objects)
+        metrics.messages_created.inc(type=metrics.get_type_label(self.backend_type_name))
         return message
 
     def _get_backend_messages_map(self, messages):
+        messages = list(messages)
+        configured_backend_names = get_backend_names(self.backend_type_name)
+        routed_backend_names = self.router.route_many([message.recipient for message in messages])
+        default_backend_name = get_default_sender_backend_name(self.backend_type_name)
+
         backends_messages_map = defaultdict(list)
-        for message in messages:
-            backend = self.get_backend(recipient=message.recipient)
+        for message, routed_backend_name in zip(messages, routed_backend_names):
+            backend = self._get_backend_by_name(
+                self._get_sticky_backend_name(message, configured_backend_names)
+                or routed_backend_name
+                or default_backend_name
+            )
             backends_messages_map[backend].append(message)
         return backends_messages_map
 
@@ -127,9 +323,22 @@ class BaseController:
         :param messages: list of messages
         """
         for backend, messages_for_backend in self._get_backend_messages_map(messages).items():
-            backend.publish_messages(messages_for_backend)
+            self._publish_messages(backend, messages_for_backend)
+
+    def _filter_recently_sent_recipients(self, recipients, template, dedup_window_seconds):
+        recently_sent_recipients = self.get_recently_sent_recipients(
+            recipients, template.slug if template else None, dedup_window_seconds
+        )
+        filtered_recipients = []
+        for recipient in recipients:
+            normalized_recipient = self.normalize_recipient(recipient)
+            if normalized_recipient not in recently_sent_recipients:
+                recently_sent_recipients.add(normalized_recipient)
+                filtered_recipients.append(recipient)
+        return filtered_recipients
 
-    def bulk_send(self, recipients, content, related_objects=None, tag=None, template=None, **kwargs):
+    def bulk_send(self, recipients, content, related_objects=None, tag=None, template=None, dedup_window_seconds=None,
+                  **kwargs):
         """
         Send more messages in one bulk
         :param recipients: list of emails or phone numbers of recipients
@@ -138,11 +347,17 @@ class BaseController:
         relation
         :param tag: string mark that will be saved with the message
         :param template: template object from which content of the message was create
+        :param dedup_window_seconds: messages are not created for recipients which received a message from the same
+        template in the last dedup_window_seconds seconds (and for duplicate recipients)
         :param kwargs: extra attributes that will be stored with messages
         """
+        if dedup_window_seconds:
+            recipients = self._filter_recently_sent_recipients(recipients, template, dedup_window_seconds)
+
         with transaction.atomic():
             messages = [
-                self.create_message(recipient, content, related_objects, tag, template, **kwargs)
+                self.create_message(recipient=recipient, content=content, related_objects=related_objects, tag=tag,
+                                    template=template, **kwargs)
                 for recipient in recipients
             ]
         self.bulk_send_messages(messages)
@@ -151,10 +366,12 @@ class BaseController:
 
 class BaseBackend:
 
+    backend_type_name = None
     config = {}
 
-    def __init__(self, config=None):
+    def __init__(self, config=None, name=None):
         self.config = {**self.config, **(config or {})}
+        self.name = name
 
     def _get_extra_sender_data(self):
         """
@@ -179,11 +396,27 @@ class BaseBackend:
             **self._get_extra_sender_data(),
             **({} if extra_sender_data is None else extra_sender_data)
         }
-        message.change_and_save(
-            backend=fullname(self),
-            extra_sender_data=extra_sender_data,
-            **kwargs
-        )
+        if self.name:
+            kwargs['backend_name'] = self.name
+        with start_span('update_message', type=metrics.get_type_label(self.backend_type_name),
+                        backend=metrics.get_backend_label(self), message_pk=message.pk,
+                        template_slug=message.template_slug,
+                        state=message.State(kwargs['state']).name if 'state' in kwargs else None):
+            message.change_and_save(
+                backend=fullname(self),
+                extra_sender_data=extra_sender_data,
+                **kwargs
+            )
+        if 'state' in kwargs:
+            metrics.message_state_updates.inc(
+                **self._get_metrics_labels(), state=message.State(kwargs['state']).name
+            )
+
+    def _get_metrics_labels(self):
+        return {
+            'type': metrics.get_type_label(self.backend_type_name),
+            'backend': metrics.get_backend_label(self),
+        }
 
     def _update_message_after_sending(self, message, extra_sender_data=None, **kwargs):
         """
@@ -198,6 +431,13 @@ class BaseBackend:
             number_of_send_attempts=message.number_of_send_attempts + 1,
             **kwargs
         )
+        # Provider can reject the message in the response of the sending request
+        if message.state == message.State.ERROR_RETRY:
+            metrics.messages_retried.inc(**self._get_metrics_labels())
+        elif message.failed or message.state == getattr(message.State, 'ERROR_UPDATE', None):
+            metrics.messages_failed.inc(**self._get_metrics_labels())
+        else:
+            metrics.messages_sent.inc(**self._get_metrics_labels())
 
     def _update_message_after_sending_error(self, message, extra_sender_data=None, state=None, **kwargs):
         """
@@ -225,6 +465,10 @@ class BaseBackend:
             number_of_send_attempts=number_of_send_attempts,
             **kwargs
         )
+        if state == message.State.ERROR_RETRY:
+            metrics.messages_retried.inc(**self._get_metrics_labels())
+        else:
+            metrics.messages_failed.inc(**self._get_metrics_labels())
 
     def _set_message_as_failed(self, message):
         """
@@ -235,6 +479,7 @@ class BaseBackend:
             message,
             state=message.State.ERROR,
         )
+        metrics.messages_failed.inc(**self._get_metrics_labels())
 
     def publish_message(self, message):
         """
@@ -263,7 +508,8 @@ class BaseBackend:
         raise NotImplementedError
 
 
-def send_template(recipient, slug, context_data, related_objects=None, tag=None, template_model=None, **kwargs):
+def send_template(recipient, slug, context_data, related_objects=None, tag=None, template_model=None,
+                  dedup_window_seconds=None, **kwargs):
     """
     Helper for building and sending message from a template.
     :param recipient: email or phone number of the recipient
@@ -273,6 +519,8 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
         relation
     :param tag: string mark that will be saved with the message
     :param template_model: template model instance
+    :param dedup_window_seconds: message is not sent if the template was sent to the recipient in the last
+        dedup_window_seconds seconds
     :param kwargs: extra attributes that will be stored with message
     :return: dialer message object or None if template cannot be sent
     """
@@ -284,6 +532,7 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
         context_data,
         related_objects=related_objects,
         tag=tag,
+        dedup_window_seconds=dedup_window_seconds,
         **kwargs
     )
 
@@ -299,10 +548,11 @@ def send(recipient, content, related_objects=None, tag=None, message_controller=
     :param message_controller: controller sender instance
     :return: True if message was successfully sent or False if message is in error state
     """
-    return message_controller.send(
+    message = message_controller.send(
         recipient,
         content,
         related_objects=related_objects,
         tag=tag,
         **kwargs
-    ).failed
+    )
+    return message.failed if message is not None else False
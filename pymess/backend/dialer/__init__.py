@@ -1,9 +1,12 @@
 import logging
 from datetime import timedelta
+from time import monotonic
 
 from chamber.exceptions import PersistenceException
+from django.db.models import Q
 from django.utils.timezone import now
 
+from pymess import metrics
 from pymess.backend import BaseBackend, BaseController
 from pymess.backend import send as _send
 from pymess.backend import send_template as _send_template
@@ -12,6 +15,8 @@ from pymess.config import (
     settings
 )
 from pymess.models import DialerMessage
+from pymess.tracing import start_span
+from pymess.utils import normalize_phone_number
 
 
 LOGGER = logging.getLogger(__name__)
@@ -22,6 +27,7 @@ class DialerController(BaseController):
 
     model = DialerMessage
     backend_type_name = ControllerType.DIALER
+    final_states = (DialerMessage.State.ERROR, DialerMessage.State.DEBUG)
 
     class DialerSendingError(Exception):
         pass
@@ -32,6 +38,15 @@ class DialerController(BaseController):
     def get_batch_max_seconds_to_send(self):
         return settings.DIALER_BATCH_MAX_SECONDS_TO_SEND
 
+    def get_retention_days(self):
+        return settings.DIALER_RETENTION_DAYS
+
+    def get_final_state_messages(self):
+        return self.model.objects.filter(Q(is_final_state=True) | Q(state__in=self.final_states))
+
+    def normalize_recipient(self, recipient):
+        return normalize_phone_number(str(recipient))
+
     def get_initial_dialer_state(self, recipient):
         """
         returns initial state for logged dialer instance.
@@ -72,16 +87,35 @@ class DialerController(BaseController):
     def bulk_check_dialer_status(self):
         """
         Method that finds messages that are not in the final state which were not sent and updates their states.
+        Messages whose state was received with the webhook recently are not checked, messages whose next webhook
+        was not received in PYMESS_DIALER_WEBHOOK_TIMEOUT_MINUTES are checked again.
         """
         messages_to_check = self.model.objects.filter(
+            Q(last_webhook_received_at__isnull=True)
+            | Q(last_webhook_received_at__lt=now() - timedelta(minutes=settings.DIALER_WEBHOOK_TIMEOUT_MINUTES)),
             is_final_state=False,
             sent_at__isnull=False,
             backend__in=get_supported_backend_paths(self.backend_type_name),
             created_at__gte=now() - timedelta(minutes=settings.DIALER_IDLE_MESSAGES_TIMEOUT_MINUTES),
         )
-        if messages_to_check.exists():
-            for backend, messages_for_backend in self._get_backend_messages_map(messages_to_check).items():
-                backend._update_dialer_states(messages_for_backend)
+        with start_span('claim_messages', type=metrics.get_type_label(self.backend_type_name)):
+            backend_messages_map = (
+                self._get_backend_messages_map(messages_to_check) if messages_to_check.exists() else {}
+            )
+        for backend, messages_for_backend in backend_messages_map.items():
+            started_at = monotonic()
+            backend._update_dialer_states(messages_for_backend)
+            self._record_status_check(backend, monotonic() - started_at, len(messages_for_backend))
+
+    def bulk_update_dialer_states_from_records(self, records):
+        """
+        Method updates states of the messages which are not in the final state from the records received from
+        the dialer service (webhook).
+        :param records: dict of the dialer service records where key is external ID of the message
+        """
+        messages_to_update = self.model.objects.filter_external_ids(records.keys()).filter(is_final_state=False)
+        for backend, messages_for_backend in self._get_backend_messages_map(messages_to_update).items():
+            backend._update_dialer_states_from_records(messages_for_backend, records)
 
     def is_turned_on_batch_sending(self):
         return is_turned_on_dialer_batch_sending()
@@ -93,6 +127,8 @@ class DialerBackend(BaseBackend):
     is used for automatic call to selected phone number.
     """
 
+    backend_type_name = ControllerType.DIALER
+
     def get_batch_max_number_of_send_attempts(self):
         return settings.DIALER_BATCH_MAX_NUMBER_OF_SEND_ATTEMPTS
 
@@ -106,8 +142,17 @@ class DialerBackend(BaseBackend):
         """
         raise NotImplementedError('Check dialer state is not supported with the backend')
 
+    def _update_dialer_states_from_records(self, messages, records):
+        """
+        If dialer sender provides notifications about dialer state changes this method can be overridden.
+        :param messages: messages which state will be updated
+        :param records: dict of the dialer service records where key is external ID of the message
+        """
+        raise NotImplementedError('Dialer state notifications are not supported with the backend')
+
 
-def send_template(recipient, slug, context_data, related_objects=None, tag=None, send_immediately=False):
+def send_template(recipient, slug, context_data, related_objects=None, tag=None, send_immediately=False,
+                  dedup_window_seconds=None):
     """
     Helper for building and sending dialer message from a template.
     :param recipient: phone number of the recipient
@@ -117,6 +162,8 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
         relation
     :param tag: string mark that will be saved with the message
     :param send_immediately: publishes the message regardless of the `is_turned_on_batch_sending` result
+    :param dedup_window_seconds: message is not sent if the template was sent to the recipient in the last
+        dedup_window_seconds seconds
     :return: dialer message object or None if template cannot be sent
     """
     return _send_template(
@@ -126,7 +173,8 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
         related_objects,
         tag,
         template_model=get_dialer_template_model(),
-        send_immediately=send_immediately
+        send_immediately=send_immediately,
+        dedup_window_seconds=dedup_window_seconds
     )
 
 
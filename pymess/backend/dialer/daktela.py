@@ -1,3 +1,4 @@
+import logging
 import re
 
 from django.utils import timezone as tz
@@ -6,9 +7,14 @@ from django.utils.translation import ugettext as _
 from pymess.backend.dialer import DialerBackend
 from pymess.config import settings
 from pymess.enums import DialerMessageState
+from pymess.models import DialerMessage
+from pymess.tracing import start_span
 from pymess.utils.logged_requests import generate_session
 
 
+logger = logging.getLogger(__name__)
+
+
 class DaktelaDialerBackend(DialerBackend):
     """
     Dialer backend implementing Daktela service https://www.daktela.com/api/v6/models/campaignsrecords
@@ -30,6 +36,7 @@ class DaktelaDialerBackend(DialerBackend):
             '6': 6,
         },
         'TIMEOUT': 5,  # 5s
+        'WEBHOOK_TOKEN': None,
     }
 
     def _get_dialer_api_url(self, name=None):
@@ -57,25 +64,15 @@ class DaktelaDialerBackend(DialerBackend):
                 self._update_message_state_with_error(message, error_message=resp_json.get('error'))
                 continue
 
-            message.extra_data.update({
-                'name': name,
-                'daktela_action': resp_json['result']['action'],
-                'daktela_statuses': resp_json['result']['statuses'],
-            })
-            resp_message_state = resp_json['result']['statuses'][0]['name'] if len(
-                resp_json['result']['statuses']) else resp_json['result']['action']
-            state_mapped = self.config['STATES_MAPPING'][resp_message_state]
             message_error = resp_json['error'] if len(resp_json['error']) else None
 
-            is_final_state = resp_json['result']['action'] == '5'
-
             try:
+                with start_span('parse_status', **self._get_metrics_labels()):
+                    record_changes = self._get_record_changes(message, resp_json['result'])
                 self._update_message(
                     message,
-                    state=state_mapped,
                     error=message_error,
-                    extra_data=message.extra_data,
-                    is_final_state=is_final_state,
+                    **record_changes
                 )
             except Exception as ex:
                 self._update_message_state_with_error(message, error_message=ex)
@@ -83,6 +80,52 @@ class DaktelaDialerBackend(DialerBackend):
                 # and log them into database. Re-raise exception causes transaction rollback (lost of information about
                 # exception).
 
+    def _get_record_changes(self, message, record):
+        """
+        Returns changed message fields according to the Daktela campaign record
+        :param message: dialer message
+        :param record: Daktela campaign record
+        """
+        resp_message_state = record['statuses'][0]['name'] if len(record['statuses']) else record['action']
+        return {
+            'state': self.config['STATES_MAPPING'][resp_message_state],
+            'extra_data': {
+                **message.extra_data,
+                'name': record['name'],
+                'daktela_action': record['action'],
+                'daktela_statuses': record['statuses'],
+            },
+            'is_final_state': record['action'] == '5',
+        }
+
+    def _update_dialer_states_from_records(self, messages, records):
+        """
+        Method updates dialer messages from the Daktela campaign records with one bulk update
+        :param messages: list of dialer messages to update
+        :param records: dict of Daktela campaign records where key is name of the record
+        """
+        changed_at = tz.now()
+        messages_to_update = []
+        for message in messages:
+            try:
+                changes = self._get_record_changes(message, records[message.external_id])
+            except (KeyError, IndexError, TypeError) as ex:
+                logger.exception(ex)
+                continue
+
+            for field_name, value in changes.items():
+                setattr(message, field_name, value)
+            message.error = None
+            message.changed_at = changed_at
+            message.last_webhook_received_at = changed_at
+            messages_to_update.append(message)
+
+        with start_span('update_messages', **self._get_metrics_labels(), number_of_messages=len(messages_to_update)):
+            DialerMessage.objects.bulk_update(
+                messages_to_update,
+                ('state', 'extra_data', 'is_final_state', 'error', 'changed_at', 'last_webhook_received_at')
+            )
+
     def _update_message_state_with_error(self, message, error_message):
         is_final_state = message.number_of_status_check_attempts >= settings.DIALER_NUMBER_OF_STATUS_CHECK_ATTEMPTS
         message_kwargs = {
@@ -145,6 +188,7 @@ class DaktelaDialerBackend(DialerBackend):
                     state=DialerMessageState.READY,
                     sent_at=tz.now(),
                     extra_data=message.extra_data,
+                    external_id=resp_json['result']['name'],
                 )
         except Exception as ex:
             self._update_message_after_sending_error(
@@ -1,10 +1,19 @@
+import logging
+
+from collections import Counter
+from time import monotonic
+
 from chamber.exceptions import PersistenceException
 
 from pymess.backend import BaseBackend, send_template as _send_template, BaseController
 from pymess.config import (
     ControllerType, get_email_template_model, is_turned_on_email_batch_sending, settings,
 )
-from pymess.models import EmailMessage
+from pymess.models import Attachment, EmailMessage
+from pymess.tracing import start_span
+
+
+logger = logging.getLogger(__name__)
 
 
 class EmailController(BaseController):
@@ -12,6 +21,7 @@ class EmailController(BaseController):
 
     model = EmailMessage
     backend_type_name = ControllerType.EMAIL
+    final_states = (EmailMessage.State.SENT, EmailMessage.State.ERROR, EmailMessage.State.DEBUG)
 
     class EmailSendingError(Exception):
         pass
@@ -22,6 +32,19 @@ class EmailController(BaseController):
     def get_batch_max_seconds_to_send(self):
         return settings.EMAIL_BATCH_MAX_SECONDS_TO_SEND
 
+    def get_retention_days(self):
+        return settings.EMAIL_RETENTION_DAYS
+
+    def get_purger(self, chunk_size=None, archive=False):
+        from pymess.retention import EmailMessagePurger
+
+        return EmailMessagePurger(self, chunk_size=chunk_size, archive=archive)
+
+    def get_exporter(self, include_body=False, chunk_size=None, max_workers=None):
+        from pymess.export import EmailMessageExporter
+
+        return EmailMessageExporter(self, include_body=include_body, chunk_size=chunk_size, max_workers=max_workers)
+
     def get_initial_email_state(self, recipient):
         """
         returns initial state for logged e-mail message.
@@ -62,7 +85,8 @@ class EmailController(BaseController):
                 **self.get_backend(recipient).get_extra_message_kwargs()
             )
             if attachments:
-                message.attachments.create_from_tripples(*attachments)
+                with start_span('create_attachments', message_pk=message.pk, number_of_attachments=len(attachments)):
+                    message.attachments.create_from_tripples(*attachments)
             return message
         except PersistenceException as ex:
             raise self.EmailSendingError(str(ex))
@@ -70,6 +94,23 @@ class EmailController(BaseController):
     def is_turned_on_batch_sending(self):
         return is_turned_on_email_batch_sending()
 
+    def bulk_pull_messages_info(self, messages):
+        """
+        Pulls info of the messages from e-mail services. Messages are grouped by backend and every backend pulls
+        info of its messages at once. Returns list of messages which info was pulled.
+        :param messages: list of messages
+        """
+        pulled_messages = []
+        for backend, backend_messages in self._get_backend_messages_map(messages).items():
+            started_at = monotonic()
+            try:
+                pulled_messages += backend.pull_messages_info(backend_messages)
+            except Exception as ex:
+                # Error of one backend should not stop pulling info of the other backends messages
+                logger.exception(ex)
+            self._record_status_check(backend, monotonic() - started_at, len(backend_messages))
+        return pulled_messages
+
 
 class EmailBackend(BaseBackend):
     """
@@ -77,6 +118,52 @@ class EmailBackend(BaseBackend):
     is used for sending messages.
     """
 
+    backend_type_name = ControllerType.EMAIL
+
+    def __init__(self, config=None, name=None):
+        super().__init__(config=config, name=name)
+        self._shared_attachment_contents = {}
+
+    def _get_attachment_content(self, attachment, read_content):
+        """
+        Returns content of the attachment loaded with read_content function. Files shared by more messages of the batch
+        (template attachments, deduplicated attachments) are loaded from the storage only once per batch.
+        :param attachment: Attachment object
+        :param read_content: function which loads content of the attachment
+        """
+        file_name = attachment.file.name
+        if file_name not in self._shared_attachment_contents:
+            return read_content(attachment)
+        if self._shared_attachment_contents[file_name] is None:
+            self._shared_attachment_contents[file_name] = read_content(attachment)
+        return self._shared_attachment_contents[file_name]
+
+    def is_shared_attachment(self, attachment):
+        return attachment.file.name in self._shared_attachment_contents
+
+    def read_attachment(self, attachment):
+        """
+        Returns content of the attachment file.
+        :param attachment: Attachment object
+        """
+        return self._get_attachment_content(attachment, lambda attachment: self._read_file(attachment.file))
+
+    def _read_file(self, file):
+        with file.open('rb') as f:
+            return f.read()
+
+    def publish_messages(self, messages):
+        attachment_file_names = Counter(
+            Attachment.objects.filter(email_message__in=messages).values_list('file', flat=True)
+        )
+        self._shared_attachment_contents = {
+            file_name: None for file_name, count in attachment_file_names.items() if count > 1
+        }
+        try:
+            return super().publish_messages(messages)
+        finally:
+            self._shared_attachment_contents = {}
+
     def get_batch_max_number_of_send_attempts(self):
         return settings.EMAIL_BATCH_MAX_NUMBER_OF_SEND_ATTEMPTS
 
@@ -90,9 +177,25 @@ class EmailBackend(BaseBackend):
         """
         raise NotImplementedError
 
+    def pull_messages_info(self, messages):
+        """
+        Pull info of more messages from email service at once. Returns list of messages which info was pulled.
+        If concrete backend provides pulling info of more messages at once the method can be overridden.
+        :param messages: list of Email messages
+        """
+        pulled_messages = []
+        for message in messages:
+            try:
+                self.pull_message_info(message)
+                pulled_messages.append(message)
+            except Exception as ex:
+                # One message error should not stop pulling info of the other messages
+                logger.exception(ex)
+        return pulled_messages
+
 
 def send_template(recipient, slug, context_data, related_objects=None, attachments=None, tag=None,
-                  send_immediately=False):
+                  send_immediately=False, dedup_window_seconds=None):
     """
     Helper for building and sending e-mail message from a template.
     :param recipient: e-mail address of the receiver
@@ -103,6 +206,8 @@ def send_template(recipient, slug, context_data, related_objects=None, attachmen
     :param attachments: list of files that will be sent with the message as attachments
     :param tag: string mark that will be saved with the message
     :param send_immediately: publishes the message regardless of the `is_turned_on_batch_sending` result
+    :param dedup_window_seconds: e-mail is not sent if the template was sent to the recipient in the last
+        dedup_window_seconds seconds
     :return: e-mail message object or None if template cannot be sent
     """
     return _send_template(
@@ -113,7 +218,8 @@ def send_template(recipient, slug, context_data, related_objects=None, attachmen
         tag=tag,
         template_model=get_email_template_model(),
         attachments=attachments,
-        send_immediately=send_immediately
+        send_immediately=send_immediately,
+        dedup_window_seconds=dedup_window_seconds
     )
 
 
@@ -135,7 +241,7 @@ def send(sender, recipient, subject, content, sender_name=None, related_objects=
     :param kwargs: extra data that will be saved in JSON format in the extra_data model field
     :return: True if e-mail was successfully sent or False if e-mail is in error state
     """
-    return EmailController().send(
+    message = EmailController().send(
         sender=sender,
         recipient=recipient,
         subject=subject,
@@ -147,4 +253,5 @@ def send(sender, recipient, subject, content, sender_name=None, related_objects=
         send_immediately=send_immediately,
         message_backend=message_backend,
         **kwargs
-    ).failed
+    )
+    return message.failed if message is not None else False
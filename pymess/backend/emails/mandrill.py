@@ -1,11 +1,17 @@
 import os
 import base64
+import json
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from json.decoder import JSONDecodeError
 
 from enum import Enum
+from uuid import uuid4
 
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
@@ -15,10 +21,15 @@ import mandrill
 
 from pymess.backend.emails import EmailBackend
 from pymess.enums import EmailMessageState
+from pymess.models import EmailMessage
 from pymess.config import settings
+from pymess.tracing import start_span
 from pymess.utils.logged_requests import generate_session
 
 
+logger = logging.getLogger(__name__)
+
+
 class MandrillState(str, Enum):
 
     SENT = 'SENT'
@@ -28,6 +39,58 @@ class MandrillState(str, Enum):
     INVALID = 'INVALID'
 
 
+# Size of the chunk must be multiple of 3, therefore encoded chunks can be concatenated
+BASE64_CHUNK_SIZE = 3 * 64 * 1024
+
+def get_base64_encoded_length(size):
+    return 4 * ((size + 2) // 3)
+
+
+def iter_base64_encoded_file(file, chunk_size=BASE64_CHUNK_SIZE):
+    """
+    Encodes file to base64 chunk by chunk
+    """
+    remainder = b''
+    with file.open('rb') as f:
+        for chunk in f.chunks(chunk_size):
+            chunk = remainder + chunk
+            encoded_chunk_size = len(chunk) - len(chunk) % 3
+            remainder = chunk[encoded_chunk_size:]
+            yield base64.b64encode(chunk[:encoded_chunk_size])
+    if remainder:
+        yield base64.b64encode(remainder)
+
+
+class MandrillRequestBody:
+    """
+    JSON body of the Mandrill API request which is generated while it is sent. Placeholders of the contents are
+    replaced with the iterables of base64 encoded attachments. Content length is computed in advance, therefore
+    request is not sent with chunked transfer encoding.
+    """
+
+    def __init__(self, data, content_placeholder, encoded_contents):
+        """
+        :param data: request data where contents of attachments are replaced with content_placeholder
+        :param content_placeholder: unique string used instead of the attachment contents
+        :param encoded_contents: list of pairs (length, iterable of base64 encoded chunks) in order of placeholders
+        """
+        self._parts = json.dumps(data).encode().split('"{}"'.format(content_placeholder).encode())
+        self._encoded_contents = encoded_contents
+
+    def __len__(self):
+        return sum(len(part) for part in self._parts) + sum(
+            length + 2 for length, _ in self._encoded_contents
+        )
+
+    def __iter__(self):
+        yield self._parts[0]
+        for part, (_, encoded_chunks) in zip(self._parts[1:], self._encoded_contents):
+            yield b'"'
+            yield from encoded_chunks
+            yield b'"'
+            yield part
+
+
 class MandrillEmailBackend(EmailBackend):
     """
     E-mail backend implementing Mandrill service (https://mandrillapp.com/api/docs/index.python.html).
@@ -52,31 +115,90 @@ class MandrillEmailBackend(EmailBackend):
         'VIEW_CONTENT_LINK': True,
         'ASYNC': False,
         'TIMEOUT': 5,  # 5s
+        'PULL_INFO_MAX_WORKERS': 10,
+        'URL': None,
+        'WEBHOOK_KEY': None,
+        'WEBHOOK_URL': None,
     }
 
-    def _serialize_attachments(self, message):
+    def _get_api_url(self, path):
+        return '{}{}.json'.format(self.config['URL'] or mandrill.ROOT, path)
+
+    def _call_api(self, mandrill_client, path, data):
+        """
+        Posts data to the Mandrill API URL defined in the backend config. Data can be a dict or iterable request body.
+        """
+        response = mandrill_client.session.post(
+            self._get_api_url(path),
+            data=json.dumps({**data, 'key': mandrill_client.apikey}) if isinstance(data, dict) else data,
+            headers={'content-type': 'application/json'}
+        )
+        if response.status_code != requests.codes.ok:
+            raise mandrill_client.cast_error(response.json())
+        return response.json()
+
+    def _get_encoded_attachment_content(self, attachment):
+        """
+        Returns pair (length, iterable of chunks) with base64 encoded content of the attachment. Contents of
+        attachments shared by more messages of the batch are encoded only once, other attachments are streamed from
+        the storage.
+        """
+        if self.is_shared_attachment(attachment):
+            encoded_content = self._get_attachment_content(
+                attachment, lambda attachment: b''.join(iter_base64_encoded_file(attachment.file))
+            )
+            return len(encoded_content), (encoded_content,)
+        else:
+            return get_base64_encoded_length(attachment.file.size), iter_base64_encoded_file(attachment.file)
+
+    def _serialize_attachments(self, attachments, content_placeholder):
         return [
             {
                 'type': attachment.content_type,
                 'name': attachment.filename or os.path.basename(attachment.file.name),
-                'content': base64.b64encode(attachment.file.read()).decode('utf-8')
-            } for attachment in message.attachments.all()
+                'content': content_placeholder,
+            } for attachment in attachments
         ]
 
-    def _create_client(self, message):
+    def _send_message(self, mandrill_client, message_data, attachments):
+        """
+        Sends message to the Mandrill API. Attachments are streamed to the request body.
+        """
+        content_placeholder = uuid4().hex
+        request_body = MandrillRequestBody(
+            {
+                'message': {
+                    **message_data,
+                    'attachments': self._serialize_attachments(attachments, content_placeholder),
+                },
+                'async': False,
+                'ip_pool': None,
+                'send_at': None,
+                'key': mandrill_client.apikey,
+            },
+            content_placeholder,
+            [self._get_encoded_attachment_content(attachment) for attachment in attachments]
+        )
+        return self._call_api(mandrill_client, 'messages/send', request_body)
+
+    def _create_client(self, *related_objects, pool_size=None):
         mandrill_client = mandrill.Mandrill(self.config['KEY'])
         mandrill_client.session = generate_session(
             slug='pymess - Mandrill',
-            related_objects=(message,),
+            related_objects=related_objects,
             timeout=self.config['TIMEOUT']
         )
+        if pool_size:
+            mandrill_client.session.mount('https://', HTTPAdapter(pool_maxsize=pool_size))
         return mandrill_client
 
     def publish_message(self, message):
         mandrill_client = self._create_client(message)
         try:
-            result = mandrill_client.messages.send(
-                message={
+            attachments = list(message.attachments.all())
+            result = self._send_message(
+                mandrill_client,
+                {
                     'to': [{'email': message.recipient}],
                     'from_email': message.sender,
                     'from_name': message.sender_name,
@@ -90,8 +212,8 @@ class MandrillEmailBackend(EmailBackend):
                     'preserve_recipients': self.config['PRESERVE_RECIPIENTS'],
                     'view_content_link': self.config['VIEW_CONTENT_LINK'],
                     'async': self.config['ASYNC'],
-                    'attachments': self._serialize_attachments(message)
                 },
+                attachments
             )[0]
             mandrill_state = MandrillState(result['status'].upper())
             state = self.MANDRILL_STATES_MAPPING.get(mandrill_state)
@@ -119,18 +241,56 @@ class MandrillEmailBackend(EmailBackend):
             # Do not re-raise caught exception. Re-raise exception causes transaction rollback (lost of information
             # about exception).
 
+    def _get_message_info(self, mandrill_client, message):
+        try:
+            return self._call_api(mandrill_client, 'messages/info', {'id': message.external_id})
+        except mandrill.UnknownMessageError:
+            return None
+
     def pull_message_info(self, message):
-        if message.external_id:
-            mandrill_client = self._create_client(message)
-            try:
-                info = mandrill_client.messages.info(message.external_id)
-                self._update_message(
-                    message,
-                    extra_sender_data={**message.extra_sender_data, 'info': info},
-                    info_changed_at=timezone.now(),
-                    update_only_changed_fields=True,
-                )
-            except mandrill.UnknownMessageError:
-                self._update_message(message, info_changed_at=timezone.now(), update_only_changed_fields=True)
+        info = self._get_message_info(self._create_client(message), message) if message.external_id else None
+        if info is not None:
+            self._update_message(
+                message,
+                extra_sender_data={**message.extra_sender_data, 'info': info},
+                info_changed_at=timezone.now(),
+                update_only_changed_fields=True,
+            )
         else:
             self._update_message(message, info_changed_at=timezone.now(), update_only_changed_fields=True)
+
+    def pull_messages_info(self, messages):
+        """
+        Info of the messages is pulled with concurrent requests through one pooled session and stored with one
+        bulk update.
+        """
+        messages_with_external_id = [message for message in messages if message.external_id]
+        futures = {}
+        if messages_with_external_id:
+            max_workers = min(self.config['PULL_INFO_MAX_WORKERS'], len(messages_with_external_id))
+            mandrill_client = self._create_client(*messages_with_external_id, pool_size=max_workers)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    message.pk: executor.submit(self._get_message_info, mandrill_client, message)
+                    for message in messages_with_external_id
+                }
+
+        info_changed_at = timezone.now()
+        pulled_messages = []
+        for message in messages:
+            future = futures.get(message.pk)
+            if future is not None and future.exception() is not None:
+                # One message error should not stop pulling info of the other messages
+                logger.error(str(future.exception()), exc_info=future.exception())
+                continue
+
+            info = future.result() if future is not None else None
+            if info is not None:
+                message.extra_sender_data = {**(message.extra_sender_data or {}), 'info': info}
+            message.info_changed_at = info_changed_at
+            message.changed_at = info_changed_at
+            pulled_messages.append(message)
+
+        with start_span('update_messages', **self._get_metrics_labels(), number_of_messages=len(pulled_messages)):
+            EmailMessage.objects.bulk_update(pulled_messages, ('extra_sender_data', 'info_changed_at', 'changed_at'))
+        return pulled_messages
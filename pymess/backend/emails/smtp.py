@@ -1,6 +1,7 @@
 import os
 
 from django.core.mail import EmailMultiAlternatives
+from django.core.mail.message import make_msgid
 from django.utils import timezone
 
 from pymess.backend.emails import EmailBackend
@@ -12,22 +13,26 @@ class SMTPEmailBackend(EmailBackend):
     """
 
     def publish_message(self, message):
+        message_id = make_msgid()
         email_message = EmailMultiAlternatives(
             message.subject,
             ' ',
             message.friendly_sender,
             [message.recipient],
+            headers={'Message-ID': message_id},
         )
         email_message.attach_alternative(message.content, 'text/html')
         for attachment in message.attachments.all():
             email_message.attach(
                 attachment.filename or os.path.basename(attachment.file.name),
-                attachment.file.read().decode('utf-8'),
+                self.read_attachment(attachment),
                 attachment.content_type,
             )
         try:
             email_message.send()
-            self._update_message_after_sending(message, state=message.State.SENT, sent_at=timezone.now())
+            self._update_message_after_sending(
+                message, state=message.State.SENT, sent_at=timezone.now(), external_id=message_id
+            )
         except Exception as ex:
             self._update_message_after_sending_error(message, error=str(ex))
             # Do not re-raise caught exception. We do not know exact exception to catch so we catch them all
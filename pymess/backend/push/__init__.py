@@ -12,6 +12,12 @@ class PushNotificationController(BaseController):
 
     model = PushNotificationMessage
     backend_type_name = ControllerType.PUSH_NOTIFICATION
+    final_states = (
+        PushNotificationMessage.State.SENT,
+        PushNotificationMessage.State.ERROR,
+        PushNotificationMessage.State.DEBUG,
+        PushNotificationMessage.State.DELIVERED,
+    )
 
     class PushNotificationSendingError(Exception):
         pass
@@ -22,6 +28,9 @@ class PushNotificationController(BaseController):
     def get_batch_size(self):
         return settings.PUSH_NOTIFICATION_BATCH_SIZE
 
+    def get_retention_days(self):
+        return settings.PUSH_NOTIFICATION_RETENTION_DAYS
+
     def is_turned_on_batch_sending(self):
         return is_turned_on_push_notification_batch_sending()
 
@@ -44,6 +53,8 @@ class PushNotificationController(BaseController):
 
 class PushNotificationBackend(BaseBackend):
 
+    backend_type_name = ControllerType.PUSH_NOTIFICATION
+
     def get_batch_max_number_of_send_attempts(self):
         return settings.PUSH_NOTIFICATION_BATCH_MAX_NUMBER_OF_SEND_ATTEMPTS
 
@@ -51,7 +62,8 @@ class PushNotificationBackend(BaseBackend):
         return settings.PUSH_NOTIFICATION_RETRY_SENDING and is_turned_on_push_notification_batch_sending()
 
 
-def send_template(recipient, slug, context_data, related_objects=None, tag=None, send_immediately=None):
+def send_template(recipient, slug, context_data, related_objects=None, tag=None, send_immediately=None,
+                  dedup_window_seconds=None):
     """
     Helper for building and sending push notification message from a template.
     :param recipient: push notification recipient
@@ -61,6 +73,8 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
         relation
     :param tag: string mark that will be saved with the message
     :param send_immediately: publishes the message regardless of the `is_turned_on_batch_sending` result
+    :param dedup_window_seconds: push notification is not sent if the template was sent to the recipient in the last
+        dedup_window_seconds seconds
     :return: Push notification message object or None if template cannot be sent
     """
     return _send_template(
@@ -70,7 +84,8 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
         related_objects=related_objects,
         tag=tag,
         template_model=get_push_notification_template_model(),
-        send_immediately=send_immediately
+        send_immediately=send_immediately,
+        dedup_window_seconds=dedup_window_seconds
     )
 
 
@@ -19,6 +19,8 @@ class OneSignalPushNotificationBackend(PushNotificationBackend):
         'API_KEY': None,
         'LANGUAGE': None,
         'TIMEOUT': 5,  # 5s
+        'URL': None,
+        'WEBHOOK_TOKEN': None,
     }
 
     def _is_result_partial_error(self, result):
@@ -30,6 +32,8 @@ class OneSignalPushNotificationBackend(PushNotificationBackend):
     def publish_message(self, message):
         onesignal_client = OneSignalClient(self.config['APP_ID'],
                                            self.config['API_KEY'])
+        if self.config['URL']:
+            onesignal_client.base_api_url = self.config['URL']
         onesignal_client.session = generate_session(
             slug='pymess - OneSignal',
             related_objects=(message,),
@@ -71,6 +75,7 @@ class OneSignalPushNotificationBackend(PushNotificationBackend):
                     state=PushNotificationMessageState.SENT,
                     sent_at=timezone.now(),
                     extra_sender_data=extra_sender_data,
+                    external_id=result.body.get('id'),
                 )
         except (JSONDecodeError, requests.exceptions.RequestException, OneSignalAPIError) as ex:
             self._update_message_after_sending_error(
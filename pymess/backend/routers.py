@@ -1,13 +1,166 @@
+import hashlib
+import math
+import threading
+from collections import defaultdict, deque
+from functools import lru_cache
+from statistics import median
+from time import monotonic
+
+from pymess.config import get_backend_router_prefixes, get_backend_weights
+from pymess.utils import normalize_phone_number
+
+
 class BaseRouter:
 
+    # If router is sticky, already sent messages (retries, status checks) are processed with the same backend
+    is_sticky = False
+
+    def __init__(self, backend_type=None):
+        self.backend_type = backend_type
+
     def get_backend_name(self, recipient):
         """
         Method should return name of the backend specified in PYMESS_*_BACKEND_ROUTER setting option
         """
         raise NotImplementedError
 
+    def route_many(self, recipients):
+        """
+        Method returns list of backend names for the list of recipients (one batch of messages)
+        """
+        backend_names = {}
+        for recipient in recipients:
+            if recipient not in backend_names:
+                backend_names[recipient] = self.get_backend_name(recipient)
+        return [backend_names[recipient] for recipient in recipients]
+
+    def record_latency(self, backend_name, seconds):
+        """
+        Method is called by the controller with duration of the provider call. Router can use it for load balancing.
+        """
+        pass
+
 
 class DefaultBackendRouter(BaseRouter):
 
     def get_backend_name(self, recipient):
         return None
+
+
+class WeightedBackendRouter(BaseRouter):
+    """
+    Router spreads recipients across backends according to the weight defined in the backend configuration
+    (PYMESS_*_BACKENDS[name]['weight']). Only backends with defined weight are used. Weighted rendezvous hashing is
+    used for the choice, therefore one recipient is routed to the same backend until weights are changed.
+    """
+
+    is_sticky = True
+
+    def _get_weights(self):
+        return get_backend_weights(self.backend_type)
+
+    def _get_score(self, recipient, backend_name, weight):
+        digest = hashlib.sha1('{}:{}'.format(backend_name, recipient).encode()).digest()
+        # uniformly distributed value from the open interval (0, 1)
+        hash_value = (int.from_bytes(digest[:8], 'big') + 1) / (2 ** 64 + 1)
+        return -weight / math.log(hash_value)
+
+    def get_backend_name(self, recipient):
+        weights = {
+            backend_name: weight for backend_name, weight in self._get_weights().items() if weight > 0
+        }
+        if not weights:
+            return None
+        return max(
+            sorted(weights),
+            key=lambda backend_name: self._get_score(recipient, backend_name, weights[backend_name])
+        )
+
+
+class LeastLatencyBackendRouter(WeightedBackendRouter):
+    """
+    Router prefers backends with the lowest median (p50) latency of provider calls. Configured weight of every backend
+    is scaled down by the ratio of the lowest observed p50 latency and the backend p50 latency. Latencies are measured
+    per process in the time window defined by latency_window_seconds. Backends without measured latency keep their
+    weight, so they get traffic and can be measured again.
+    """
+
+    latency_window_seconds = 5 * 60
+    max_latency_samples = 100
+
+    _latency_samples = defaultdict(deque)
+    _latency_samples_lock = threading.Lock()
+
+    def _get_latency_samples_key(self, backend_name):
+        return self.backend_type, backend_name
+
+    def record_latency(self, backend_name, seconds):
+        if backend_name is None:
+            return
+
+        with self._latency_samples_lock:
+            samples = self._latency_samples[self._get_latency_samples_key(backend_name)]
+            samples.append((monotonic(), seconds))
+            while len(samples) > self.max_latency_samples:
+                samples.popleft()
+
+    def get_latency_p50(self, backend_name):
+        """
+        Returns median latency of the backend in seconds or None if latency was not measured
+        """
+        min_measured_at = monotonic() - self.latency_window_seconds
+        with self._latency_samples_lock:
+            samples = self._latency_samples.get(self._get_latency_samples_key(backend_name))
+            while samples and samples[0][0] < min_measured_at:
+                samples.popleft()
+            return median(seconds for _, seconds in samples) if samples else None
+
+    def _get_weights(self):
+        weights = super()._get_weights()
+        latencies = {backend_name: self.get_latency_p50(backend_name) for backend_name in weights}
+        measured_latencies = [latency for latency in latencies.values() if latency]
+        if not measured_latencies:
+            return weights
+
+        min_latency = min(measured_latencies)
+        return {
+            backend_name: weight * min_latency / (latencies[backend_name] or min_latency)
+            for backend_name, weight in weights.items()
+        }
+
+
+@lru_cache(maxsize=None)
+def _compile_prefix_trie(prefixes):
+    """
+    Compiles tuple of pairs (prefix, backend name) to the trie. Every node is a dict where keys are characters of
+    the prefix and the key None contains name of the backend.
+    """
+    trie = {}
+    for prefix, backend_name in prefixes:
+        node = trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = backend_name
+    return trie
+
+
+class PhonePrefixBackendRouter(BaseRouter):
+    """
+    Router selects backend according to the longest prefix of the normalized phone number. Prefixes are defined
+    in the setting PYMESS_{SMS,DIALER}_BACKEND_ROUTER_PREFIXES as dict {prefix: backend name}.
+    """
+
+    def __init__(self, backend_type=None):
+        super().__init__(backend_type)
+        prefixes = get_backend_router_prefixes(backend_type) if backend_type else {}
+        self._prefix_trie = _compile_prefix_trie(tuple(sorted(prefixes.items())))
+
+    def get_backend_name(self, recipient):
+        node = self._prefix_trie
+        backend_name = node.get(None)
+        for char in normalize_phone_number(str(recipient)) or '':
+            node = node.get(char)
+            if node is None:
+                break
+            backend_name = node.get(None, backend_name)
+        return backend_name
@@ -1,19 +1,24 @@
 import logging
 from datetime import timedelta
+from time import monotonic
 
+from django.db.models import Count
 from django.utils import timezone
-from django.utils.module_loading import import_string
 from django.utils.translation import ugettext_lazy as _
 
 from chamber.exceptions import PersistenceException
 
+from pymess import metrics
 from pymess.backend import BaseBackend, BaseController
 from pymess.backend import send as _send
 from pymess.backend import send_template as _send_template
 from pymess.config import (
-    ControllerType, get_sms_template_model, get_supported_backend_paths, is_turned_on_sms_batch_sending, settings,
+    ControllerType, get_backend_names, get_sms_template_model, get_supported_backend_paths,
+    is_turned_on_sms_batch_sending, settings,
 )
 from pymess.models import OutputSMSMessage
+from pymess.tracing import start_span
+from pymess.utils import fullname, normalize_phone_number
 
 LOGGER = logging.getLogger(__name__)
 
@@ -24,6 +29,14 @@ class SMSController(BaseController):
     """
     model = OutputSMSMessage
     backend_type_name = ControllerType.SMS
+    final_states = (
+        OutputSMSMessage.State.UNKNOWN,
+        OutputSMSMessage.State.SENT,
+        OutputSMSMessage.State.ERROR_UPDATE,
+        OutputSMSMessage.State.DEBUG,
+        OutputSMSMessage.State.DELIVERED,
+        OutputSMSMessage.State.ERROR,
+    )
 
     class SMSSendingError(Exception):
         pass
@@ -34,6 +47,12 @@ class SMSController(BaseController):
     def get_batch_max_seconds_to_send(self):
         return settings.SMS_BATCH_MAX_SECONDS_TO_SEND
 
+    def get_retention_days(self):
+        return settings.SMS_RETENTION_DAYS
+
+    def normalize_recipient(self, recipient):
+        return normalize_phone_number(str(recipient))
+
     def get_initial_sms_state(self, recipient):
         """
         returns initial state for logged SMS instance.
@@ -69,14 +88,53 @@ class SMSController(BaseController):
         except PersistenceException as ex:
             raise self.SMSSendingError(str(ex))
 
+    def _get_backend_by_path(self, backend_path):
+        """
+        Returns the first configured backend with the backend class path
+        """
+        for backend_name in get_backend_names(self.backend_type_name):
+            backend = self._get_backend_by_name(backend_name)
+            if fullname(backend) == backend_path:
+                return backend
+        return None
+
+    def _get_backend_to_check(self, backend_path, backend_name):
+        """
+        Returns configured backend which sent the messages. Messages without stored backend name or sent with the
+        backend which is not configured anymore are checked with the first backend with the same class path.
+        """
+        if backend_name in get_backend_names(self.backend_type_name):
+            backend = self._get_backend_by_name(backend_name)
+            if fullname(backend) == backend_path:
+                return backend
+        return self._get_backend_by_path(backend_path)
+
     def bulk_check_sms_states(self):
         """
-        Method that find messages that is not in the final state and updates its states.
+        Method that find messages that is not in the final state and updates its states. Messages are checked with
+        the configured backend (account) which sent them.
         """
         for backend in get_supported_backend_paths(self.backend_type_name):
-            messages_to_check = self.model.objects.filter(state=self.model.State.SENDING, backend=backend)
-            if messages_to_check.exists():
-                import_string(backend)().update_sms_states(messages_to_check)
+            messages_to_check = self.model.objects.filter(
+                state=self.model.State.SENDING, backend=backend
+            ).filter_query_window()
+            with start_span('claim_messages', type=metrics.get_type_label(self.backend_type_name)):
+                backend_name_counts = list(
+                    messages_to_check.order_by().values('backend_name').annotate(
+                        count=Count('pk')
+                    ).values_list('backend_name', 'count')
+                )
+            for backend_name, number_of_messages_to_check in backend_name_counts:
+                sms_backend = self._get_backend_to_check(backend, backend_name)
+                if sms_backend is None:
+                    LOGGER.warning('Backend "{}" is not configured, states of the messages are not checked'.format(
+                        backend
+                    ))
+                    continue
+
+                started_at = monotonic()
+                sms_backend.update_sms_states(messages_to_check.filter(backend_name=backend_name))
+                self._record_status_check(sms_backend, monotonic() - started_at, number_of_messages_to_check)
 
             idle_output_sms = messages_to_check.filter(
                 created_at__lt=timezone.now() - timedelta(minutes=settings.SMS_IDLE_MESSAGES_TIMEOUT_MINUTES),
@@ -88,7 +146,7 @@ class SMSController(BaseController):
 
             if settings.SMS_SET_ERROR_TO_IDLE_MESSAGES:
                 idle_output_sms.update(
-                    state=self.model.State.ERROR, error=_('timeouted')
+                    state=self.model.State.ERROR, error=_('timeouted'), changed_at=timezone.now()
                 )
 
     def is_turned_on_batch_sending(self):
@@ -101,6 +159,8 @@ class SMSBackend(BaseBackend):
     is used for sending SMS messages.
     """
 
+    backend_type_name = ControllerType.SMS
+
     def update_sms_states(self, messages):
         """
         If SMS sender provides check SMS delivery this method can be overridden.
@@ -115,7 +175,8 @@ class SMSBackend(BaseBackend):
         return settings.SMS_RETRY_SENDING and is_turned_on_sms_batch_sending()
 
 
-def send_template(recipient, slug, context_data, related_objects=None, tag=None, send_immediately=False):
+def send_template(recipient, slug, context_data, related_objects=None, tag=None, send_immediately=False,
+                  dedup_window_seconds=None):
     """
     Helper for building and sending SMS message from a template.
     :param recipient: phone number of the recipient
@@ -126,6 +187,8 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
     :param tag: string mark that will be saved with the message
     :return: SMS message object or None if template cannot be sent
     :param send_immediately: publishes the message regardless of the `is_turned_on_batch_sending` result
+    :param dedup_window_seconds: SMS is not sent if the template was sent to the recipient in the last
+        dedup_window_seconds seconds
     """
     return _send_template(
         recipient=recipient,
@@ -134,7 +197,8 @@ def send_template(recipient, slug, context_data, related_objects=None, tag=None,
         related_objects=related_objects,
         tag=tag,
         template_model=get_sms_template_model(),
-        send_immediately=send_immediately
+        send_immediately=send_immediately,
+        dedup_window_seconds=dedup_window_seconds
     )
 
 
@@ -13,6 +13,7 @@ from enumfields import IntegerChoicesEnum
 
 from pymess.backend.sms import SMSBackend
 from pymess.enums import OutputSMSMessageState
+from pymess.tracing import start_span
 from pymess.utils.logged_requests import generate_session
 
 
@@ -132,6 +133,9 @@ class ATSSMSBackend(SMSBackend):
             'sender': self.config['OUTPUT_SENDER_NUMBER'],
         }
 
+    def _get_message_uniq(self, message):
+        return '{}-{}'.format(self.config['UNIQ_PREFIX'], message.pk)
+
     def _serialize_messages(self, messages, request_type):
         """
         Serialize SMS messages to the XML
@@ -177,9 +181,9 @@ class ATSSMSBackend(SMSBackend):
                 raise self.ATSSendingError(
                     'ATS operator returned invalid response status code: {}'.format(resp.status_code)
                 )
-            self._update_sms_states_from_response(
-                messages, self._parse_response_codes(resp.text), is_sending, **change_sms_kwargs
-            )
+            with start_span('parse_status', **self._get_metrics_labels()):
+                parsed_response = self._parse_response_codes(resp.text)
+            self._update_sms_states_from_response(messages, parsed_response, is_sending, **change_sms_kwargs)
         except requests.exceptions.RequestException as ex:
             raise self.ATSSendingError(
                 'ATS operator returned returned exception: {}'.format(str(ex))
@@ -220,6 +224,7 @@ class ATSSMSBackend(SMSBackend):
                         state=state,
                         error=error,
                         extra_sender_data={'sender_state': ats_state},
+                        external_id=self._get_message_uniq(sms),
                         **change_sms_kwargs
                     )
                 else:
@@ -227,6 +232,7 @@ class ATSSMSBackend(SMSBackend):
                         sms,
                         state=state,
                         extra_sender_data={'sender_state': ats_state},
+                        external_id=self._get_message_uniq(sms),
                         **change_sms_kwargs
                     )
             else:
@@ -12,6 +12,7 @@ from enumfields import IntegerChoicesEnum
 
 from pymess.backend.sms import SMSBackend
 from pymess.enums import OutputSMSMessageState
+from pymess.tracing import start_span
 from pymess.utils.logged_requests import generate_session
 from pymess.config import settings
 
@@ -88,6 +89,9 @@ class SMSOperatorBackend(SMSBackend):
             'prefix': self.config['UNIQ_PREFIX'],
         }
 
+    def _get_message_uniq(self, message):
+        return '{}-{}'.format(self.config['UNIQ_PREFIX'], message.pk)
+
     def _serialize_messages(self, messages, request_type):
         """
         Serialize SMS messages to the XML
@@ -126,9 +130,9 @@ class SMSOperatorBackend(SMSBackend):
                 raise self.SMSOperatorSendingError(
                     'SMS operator returned invalid response status code: {}'.format(resp.status_code)
                 )
-            self._update_sms_states_from_response(
-                messages, self._parse_response_codes(resp.text), is_sending, **change_sms_kwargs
-            )
+            with start_span('parse_status', **self._get_metrics_labels()):
+                parsed_response = self._parse_response_codes(resp.text)
+            self._update_sms_states_from_response(messages, parsed_response, is_sending, **change_sms_kwargs)
         except requests.exceptions.RequestException as ex:
             raise self.SMSOperatorSendingError(
                 'SMS operator returned returned exception: {}'.format(str(ex))
@@ -169,6 +173,7 @@ class SMSOperatorBackend(SMSBackend):
                         state=state,
                         error=error,
                         extra_sender_data={'sender_state': sms_operator_state},
+                        external_id=self._get_message_uniq(sms),
                         **change_sms_kwargs
                     )
                 else:
@@ -176,6 +181,7 @@ class SMSOperatorBackend(SMSBackend):
                         sms,
                         state=state,
                         extra_sender_data={'sender_state': sms_operator_state},
+                        external_id=self._get_message_uniq(sms),
                         **change_sms_kwargs
                     )
             else:
@@ -19,6 +19,7 @@ class SNSSMSBackend(SMSBackend):
         'AWS_SECRET_ACCESS_KEY': None,
         'AWS_REGION': None,
         'SENDER_ID': None,
+        'DELIVERY_STATUS_TOPIC_ARN': None,
     }
 
     def _get_sns_client(self):
@@ -55,8 +56,13 @@ class SNSSMSBackend(SMSBackend):
                 }
             })
         try:
-            sns_client.publish(**publish_kwargs)
-            self._update_message_after_sending(message, state=OutputSMSMessageState.SENT, sent_at=timezone.now())
+            result = sns_client.publish(**publish_kwargs)
+            self._update_message_after_sending(
+                message,
+                state=OutputSMSMessageState.SENT,
+                sent_at=timezone.now(),
+                external_id=result.get('MessageId'),
+            )
         except Exception as ex:
             self._update_message_after_sending_error(
                 message, error=str(ex)
@@ -28,6 +28,9 @@ class TwilioSMSBackend(SMSBackend):
     """
 
     twilio_client = None
+    config = {
+        'STATUS_CALLBACK': None,
+    }
 
     STATES_MAPPING = {
         TwilioState.ACCEPTED: OutputSMSMessageState.SENT,
@@ -58,13 +61,15 @@ class TwilioSMSBackend(SMSBackend):
             result = client.messages.create(
                 from_=settings.TWILIO_SENDER,
                 to=str(message.recipient),
-                body=message.content
+                body=message.content,
+                **({'status_callback': self.config['STATUS_CALLBACK']} if self.config['STATUS_CALLBACK'] else {})
             )
             self._update_message_after_sending(
                 message,
                 state=self.STATES_MAPPING[TwilioState(result.status.upper())],
                 error=result.error_message if result.error_message else None,
-                sent_at=timezone.now()
+                sent_at=timezone.now(),
+                external_id=result.sid,
             )
         except Exception as ex:
             self._update_message_after_sending_error(
@@ -0,0 +1,536 @@
+import json
+import math
+from io import StringIO
+from time import monotonic
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+
+from pymess.backend.dialer import DialerController
+from pymess.backend.dialer import send_template as send_dialer_template
+from pymess.backend.emails import EmailController
+from pymess.backend.emails import send_template as send_email_template
+from pymess.backend.push import PushNotificationController
+from pymess.backend.push import send_template as send_push_notification_template
+from pymess.backend.sms import SMSController
+from pymess.backend.sms import send_template as send_sms_template
+from pymess.config import (
+    DEFAULT_SENDER_BACKEND_NAME, get_dialer_template_model, get_email_template_model,
+    get_push_notification_template_model, get_sms_template_model
+)
+from pymess.models import EmailContent
+
+from .servers import (
+    ATSRequestHandler, DaktelaRequestHandler, MandrillRequestHandler, OneSignalRequestHandler, ProviderStubServer,
+    SMSOperatorRequestHandler
+)
+
+
+def get_percentile(values, percentile):
+    """
+    Returns percentile of the values with the nearest-rank method
+    """
+    if not values:
+        return None
+    sorted_values = sorted(values)
+    return sorted_values[max(int(math.ceil(percentile / 100 * len(sorted_values))) - 1, 0)]
+
+
+class BenchmarkOperation:
+    """
+    One measured call of the public API (sending of the message, sending of the bulk, one batch, ...)
+    """
+
+    def __init__(self, number_of_messages, duration, queries):
+        self.number_of_messages = number_of_messages
+        self.duration = duration
+        self.queries = queries
+
+    @property
+    def number_of_queries(self):
+        return len(self.queries)
+
+
+class BenchmarkResult:
+
+    def __init__(self, scenario, number_of_messages, duration, operations, number_of_queries):
+        self.scenario = scenario
+        self.number_of_messages = number_of_messages
+        self.duration = duration
+        self.operations = operations
+        self.number_of_queries = number_of_queries
+
+    @property
+    def latencies(self):
+        return [operation.duration for operation in self.operations]
+
+    @property
+    def messages_per_second(self):
+        return self.number_of_messages / self.duration if self.duration else None
+
+    @property
+    def latency_p50(self):
+        return get_percentile(self.latencies, 50)
+
+    @property
+    def latency_p99(self):
+        return get_percentile(self.latencies, 99)
+
+    @property
+    def queries_per_message(self):
+        return self.number_of_queries / self.number_of_messages if self.number_of_messages else None
+
+
+class BenchmarkMeasurement:
+    """
+    Measures latencies and DB queries of the operations and of the whole scenario
+    """
+
+    def __init__(self):
+        self.operations = []
+        self.number_of_messages = 0
+        self._captured_queries = CaptureQueriesContext(connection)
+
+    def measure(self, operation, *args, number_of_messages=1, **kwargs):
+        first_query_index = len(self._captured_queries)
+        started_at = monotonic()
+        result = operation(*args, **kwargs)
+        self.operations.append(BenchmarkOperation(
+            number_of_messages, monotonic() - started_at, self._captured_queries[first_query_index:]
+        ))
+        self.number_of_messages += number_of_messages
+        return result
+
+    def __enter__(self):
+        self._started_at = monotonic()
+        self._captured_queries.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._captured_queries.__exit__(exc_type, exc_value, traceback)
+        self.duration = monotonic() - self._started_at
+
+    def get_result(self, scenario):
+        return BenchmarkResult(
+            scenario, self.number_of_messages, self.duration, self.operations, len(self._captured_queries)
+        )
+
+
+class BaseBenchmark:
+    """
+    Benchmark of one message type. Backend of the message type sends messages to the local provider stub server.
+    Every scenario is run in the transaction which is rolled back, therefore created messages are not stored.
+    """
+
+    controller_class = None
+    command_type = None
+    backend = None
+    handler_class = None
+    scenarios = ('send', 'send_template', 'bulk_send', 'batch', 'check', 'webhook')
+    webhook_view = None
+    get_template_model = None
+    send_template = None
+
+    def __init__(self, number_of_messages=100, bulk_size=20, latency=0, error_rate=0):
+        self.number_of_messages = number_of_messages
+        self.bulk_size = bulk_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.controller = self.controller_class()
+        self.request_factory = RequestFactory()
+
+    def get_backend_config(self, server_url):
+        raise NotImplementedError
+
+    def get_recipient(self, index):
+        raise NotImplementedError
+
+    def get_message_kwargs(self):
+        return {'content': 'Pymess benchmark message'}
+
+    def get_template_kwargs(self):
+        return {'body': 'Pymess benchmark message {{ index }}'}
+
+    def _get_settings(self, server_url, batch_sending=False):
+        type_name = self.controller.backend_type_name.name
+        return {
+            'PYMESS_{}_BACKENDS'.format(type_name): {
+                DEFAULT_SENDER_BACKEND_NAME: {
+                    'backend': self.backend,
+                    'config': self.get_backend_config(server_url),
+                }
+            },
+            'PYMESS_{}_DEFAULT_SENDER_BACKEND_NAME'.format(type_name): DEFAULT_SENDER_BACKEND_NAME,
+            'PYMESS_{}_BACKEND_ROUTER'.format(type_name): 'pymess.backend.routers.DefaultBackendRouter',
+            'PYMESS_{}_BATCH_SENDING'.format(type_name): batch_sending,
+            # Signatures of the webhook requests contain absolute URL with the host of the request factory
+            'ALLOWED_HOSTS': ['testserver'],
+        }
+
+    def _get_recipients(self):
+        return [self.get_recipient(i) for i in range(self.number_of_messages)]
+
+    def _get_bulks(self, values):
+        return [values[i:i + self.bulk_size] for i in range(0, len(values), self.bulk_size)]
+
+    def _send_messages(self, send_immediately=True):
+        return [
+            self.controller.send(recipient, send_immediately=send_immediately, **self.get_message_kwargs())
+            for recipient in self._get_recipients()
+        ]
+
+    def prepare_send(self):
+        return self._get_recipients()
+
+    def run_send(self, measurement, recipients):
+        for recipient in recipients:
+            measurement.measure(
+                self.controller.send, recipient, send_immediately=True, **self.get_message_kwargs()
+            )
+
+    def prepare_send_template(self):
+        template = self.get_template_model().objects.create(
+            slug='pymess-benchmark', is_allowed_duplicate_messages=False, **self.get_template_kwargs()
+        )
+        # Every message is related to other message to check duplicate messages
+        return template, [
+            (
+                recipient,
+                self.controller.create_message(
+                    recipient=recipient, related_objects=None, tag=None, template=None, **self.get_message_kwargs()
+                )
+            )
+            for recipient in self._get_recipients()
+        ]
+
+    def run_send_template(self, measurement, prepared_data):
+        template, recipients_related_objects = prepared_data
+        for index, (recipient, related_object) in enumerate(recipients_related_objects):
+            measurement.measure(
+                self.send_template, recipient, template.slug, {'index': index}, related_objects=[related_object],
+                send_immediately=True
+            )
+
+    def prepare_bulk_send(self):
+        return self._get_bulks(self._get_recipients())
+
+    def run_bulk_send(self, measurement, recipients_bulks):
+        for recipients in recipients_bulks:
+            measurement.measure(
+                self.controller.bulk_send, recipients, number_of_messages=len(recipients), **self.get_message_kwargs()
+            )
+
+    def prepare_batch(self):
+        return self._send_messages(send_immediately=False)
+
+    def run_batch(self, measurement, messages):
+        batch_size = self.controller.get_batch_size()
+        # Failed messages are retried, but number of sending attempts is limited
+        max_number_of_batches = math.ceil(len(messages) / batch_size) * 5
+        for _ in range(max_number_of_batches):
+            number_of_waiting_messages = self.controller.get_waiting_or_retry_messages().count()
+            if not number_of_waiting_messages:
+                break
+            measurement.measure(
+                call_command, 'send_messages_batch', type=self.command_type, stdout=StringIO(),
+                number_of_messages=min(batch_size, number_of_waiting_messages)
+            )
+
+    def prepare_check(self):
+        return self._send_messages()
+
+    def run_check(self, measurement, messages):
+        raise NotImplementedError
+
+    def get_webhook_requests(self, messages):
+        """
+        Returns list of triples (view, request, number of messages) which notify about delivery of the messages
+        """
+        raise NotImplementedError
+
+    def prepare_webhook(self):
+        return self.get_webhook_requests([message for message in self._send_messages() if message.external_id])
+
+    def run_webhook(self, measurement, webhook_requests):
+        for view, request, number_of_messages in webhook_requests:
+            measurement.measure(view, request, number_of_messages=number_of_messages)
+
+    def _clean_stored_files(self):
+        pass
+
+    def run_scenario(self, scenario, server):
+        with override_settings(**self._get_settings(server.url, batch_sending=scenario == 'batch')):
+            with transaction.atomic():
+                # Preparation of the scenario data is not measured
+                prepared_data = getattr(self, 'prepare_{}'.format(scenario))()
+                with BenchmarkMeasurement() as measurement:
+                    getattr(self, 'run_{}'.format(scenario))(measurement, prepared_data)
+                self._clean_stored_files()
+                transaction.set_rollback(True)
+        return measurement.get_result(scenario)
+
+    @classmethod
+    def _import_webhook_view(cls):
+        return import_string(cls.webhook_view)
+
+    @classmethod
+    def get_scenarios(cls):
+        """
+        Returns supported scenarios. Webhook views can depend on optional libraries (e.g. twilio), webhook scenario is
+        not supported if the view can't be imported.
+        """
+        try:
+            cls._import_webhook_view()
+        except ImportError:
+            return tuple(scenario for scenario in cls.scenarios if scenario != 'webhook')
+        return cls.scenarios
+
+    def get_webhook_view(self):
+        return self._import_webhook_view().as_view()
+
+    def run(self, scenarios=None):
+        supported_scenarios = self.get_scenarios()
+        scenarios = [scenario for scenario in (scenarios or supported_scenarios) if scenario in supported_scenarios]
+        with ProviderStubServer(self.handler_class, latency=self.latency, error_rate=self.error_rate) as server:
+            return [self.run_scenario(scenario, server) for scenario in scenarios]
+
+
+class SMSBenchmark(BaseBenchmark):
+
+    controller_class = SMSController
+    command_type = 'sms'
+    backend = 'pymess.backend.sms.ats_sms_operator.ATSSMSBackend'
+    handler_class = ATSRequestHandler
+    # States of the SMS messages are updated by external ID regardless of the backend which sent them
+    webhook_view = 'pymess.webhooks.twilio.TwilioStatusCallbackView'
+    get_template_model = staticmethod(get_sms_template_model)
+    send_template = staticmethod(send_sms_template)
+
+    def get_backend_config(self, server_url):
+        return {
+            'URL': server_url,
+            'USERNAME': 'benchmark',
+            'PASSWORD': 'benchmark',
+            'PROJECT_KEYWORD': 'BENCHMARK',
+            'OUTPUT_SENDER_NUMBER': '+420777000000',
+            'UNIQ_PREFIX': 'benchmark',
+        }
+
+    def get_recipient(self, index):
+        return '+420777{:06d}'.format(index)
+
+    def run_check(self, measurement, messages):
+        measurement.measure(
+            self.controller.bulk_check_sms_states,
+            number_of_messages=len([message for message in messages if message.state == message.State.SENDING])
+        )
+
+    def _get_settings(self, server_url, batch_sending=False):
+        return {
+            **super()._get_settings(server_url, batch_sending=batch_sending),
+            'TWILIO_AUTH_TOKEN': 'benchmark',
+        }
+
+    def _get_twilio_request(self, data):
+        from pymess.webhooks import get_request_signature
+
+        request = self.request_factory.post('/', data)
+        request.META['HTTP_X_TWILIO_SIGNATURE'] = get_request_signature(
+            'benchmark', request.build_absolute_uri(), request.POST
+        )
+        return request
+
+    def get_webhook_requests(self, messages):
+        view = self.get_webhook_view()
+        return [
+            (view, self._get_twilio_request({'MessageSid': message.external_id, 'MessageStatus': 'delivered'}), 1)
+            for message in messages
+        ]
+
+
+class SMSOperatorBenchmark(SMSBenchmark):
+
+    backend = 'pymess.backend.sms.sms_operator.SMSOperatorBackend'
+    handler_class = SMSOperatorRequestHandler
+
+    def get_backend_config(self, server_url):
+        return {
+            'URL': server_url,
+            'USERNAME': 'benchmark',
+            'PASSWORD': 'benchmark',
+            'UNIQ_PREFIX': 'benchmark',
+        }
+
+
+class EmailBenchmark(BaseBenchmark):
+
+    controller_class = EmailController
+    command_type = 'email'
+    backend = 'pymess.backend.emails.mandrill.MandrillEmailBackend'
+    handler_class = MandrillRequestHandler
+    webhook_view = 'pymess.webhooks.mandrill.MandrillWebhookView'
+    get_template_model = staticmethod(get_email_template_model)
+    send_template = staticmethod(send_email_template)
+
+    def get_backend_config(self, server_url):
+        return {
+            'KEY': 'benchmark',
+            'URL': server_url,
+            'WEBHOOK_KEY': 'benchmark',
+        }
+
+    def get_recipient(self, index):
+        return 'benchmark-{}@example.com'.format(index)
+
+    def get_message_kwargs(self):
+        return {
+            'content': '<html><body><p>Pymess benchmark message</p></body></html>',
+            'sender': 'benchmark@example.com',
+            'sender_name': None,
+            'subject': 'Pymess benchmark',
+            'attachments': None,
+        }
+
+    def get_template_kwargs(self):
+        return {
+            'body': '<p>Pymess benchmark message {{ index }}</p>',
+            'subject': 'Pymess benchmark',
+            'sender': 'benchmark@example.com',
+        }
+
+    def run_check(self, measurement, messages):
+        for messages_bulk in self._get_bulks(messages):
+            measurement.measure(
+                self.controller.bulk_pull_messages_info, messages_bulk, number_of_messages=len(messages_bulk)
+            )
+
+    def _get_mandrill_request(self, data):
+        from pymess.webhooks import get_request_signature
+
+        request = self.request_factory.post('/', data)
+        request.META['HTTP_X_MANDRILL_SIGNATURE'] = get_request_signature(
+            'benchmark', request.build_absolute_uri(), request.POST
+        )
+        return request
+
+    def get_webhook_requests(self, messages):
+        view = self.get_webhook_view()
+        return [
+            (
+                view,
+                self._get_mandrill_request({'mandrill_events': json.dumps([
+                    {'event': 'open', '_id': message.external_id, 'ts': 1} for message in messages_bulk
+                ])}),
+                len(messages_bulk)
+            )
+            for messages_bulk in self._get_bulks(messages)
+        ]
+
+    def _clean_stored_files(self):
+        # Files are not removed with the transaction rollback
+        for message in self.controller.model.objects.filter(pk__gt=self._last_message_pk):
+            if message.content_file:
+                message.content_file.delete(save=False)
+        for email_content in EmailContent.objects.filter(pk__gt=self._last_email_content_pk):
+            email_content.file.delete(save=False)
+
+    def run_scenario(self, scenario, server):
+        last_message = self.controller.model.objects.order_by('pk').last()
+        last_email_content = EmailContent.objects.order_by('pk').last()
+        self._last_message_pk = last_message.pk if last_message else 0
+        self._last_email_content_pk = last_email_content.pk if last_email_content else 0
+        return super().run_scenario(scenario, server)
+
+
+class DialerBenchmark(BaseBenchmark):
+
+    controller_class = DialerController
+    command_type = 'dialer'
+    backend = 'pymess.backend.dialer.daktela.DaktelaDialerBackend'
+    handler_class = DaktelaRequestHandler
+    webhook_view = 'pymess.webhooks.daktela.DaktelaWebhookView'
+    get_template_model = staticmethod(get_dialer_template_model)
+    send_template = staticmethod(send_dialer_template)
+
+    def get_backend_config(self, server_url):
+        return {
+            'URL': '{}campaignsRecords'.format(server_url),
+            'ACCESS_TOKEN': 'benchmark',
+            'AUTODIALER_RECORD_TYPE': 'benchmark',
+            'PREDICTIVE_RECORD_TYPE': 'benchmark',
+            'WEBHOOK_TOKEN': 'benchmark',
+        }
+
+    def get_recipient(self, index):
+        return '+420777{:06d}'.format(index)
+
+    def run_check(self, measurement, messages):
+        measurement.measure(
+            self.controller.bulk_check_dialer_status,
+            number_of_messages=len([message for message in messages if message.sent_at and not message.is_final_state])
+        )
+
+    def get_webhook_requests(self, messages):
+        view = self.get_webhook_view()
+        return [
+            (
+                view,
+                self.request_factory.post('/', json.dumps([
+                    {'name': message.external_id, 'action': '5', 'statuses': []} for message in messages_bulk
+                ]), content_type='application/json', HTTP_AUTHORIZATION='Bearer benchmark'),
+                len(messages_bulk)
+            )
+            for messages_bulk in self._get_bulks(messages)
+        ]
+
+
+class PushNotificationBenchmark(BaseBenchmark):
+
+    controller_class = PushNotificationController
+    command_type = 'push-notification'
+    backend = 'pymess.backend.push.onesignal.OneSignalPushNotificationBackend'
+    handler_class = OneSignalRequestHandler
+    webhook_view = 'pymess.webhooks.onesignal.OneSignalEventView'
+    scenarios = ('send', 'send_template', 'bulk_send', 'batch', 'webhook')
+    get_template_model = staticmethod(get_push_notification_template_model)
+    send_template = staticmethod(send_push_notification_template)
+
+    def get_backend_config(self, server_url):
+        return {
+            'APP_ID': 'benchmark',
+            'API_KEY': 'benchmark',
+            'URL': server_url,
+            'WEBHOOK_TOKEN': 'benchmark',
+        }
+
+    def get_recipient(self, index):
+        return 'benchmark-{}'.format(index)
+
+    def get_message_kwargs(self):
+        return {
+            'content': 'Pymess benchmark message',
+            'heading': 'Pymess benchmark',
+            'state': self.controller.model.State.WAITING,
+        }
+
+    def get_template_kwargs(self):
+        return {
+            'body': 'Pymess benchmark message {{ index }}',
+            'heading': 'Pymess benchmark',
+        }
+
+    def get_webhook_requests(self, messages):
+        view = self.get_webhook_view()
+        return [
+            (
+                view,
+                self.request_factory.post('/', json.dumps([
+                    {'id': message.external_id, 'event': 'notification.displayed'} for message in messages_bulk
+                ]), content_type='application/json', HTTP_AUTHORIZATION='Bearer benchmark'),
+                len(messages_bulk)
+            )
+            for messages_bulk in self._get_bulks(messages)
+        ]
@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+from time import monotonic
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from pymess.config import settings
+
+
+# Budgets are the worst case of one call, queries of cold caches (content types, disallowed objects) are included
+DEFAULT_QUERY_BUDGETS = {
+    'sms': {
+        'send': {'queries': 4},
+        'send_template': {'queries': 12},
+        'bulk_send': {'queries': 2, 'queries_per_message': 2},
+        'batch': {'queries': 7, 'queries_per_message': 4},
+        'check': {'queries': 4, 'queries_per_message': 1},
+        'webhook': {'queries': 3, 'queries_per_message': 1},
+    },
+    'email': {
+        'send': {'queries': 5},
+        'send_template': {'queries': 14},
+        'bulk_send': {'queries': 3, 'queries_per_message': 3},
+        'batch': {'queries': 7, 'queries_per_message': 5},
+        'check': {'queries': 1},
+        'webhook': {'queries': 1},
+    },
+    'dialer': {
+        'send': {'queries': 4},
+        'send_template': {'queries': 12},
+        'bulk_send': {'queries': 2, 'queries_per_message': 2},
+        'batch': {'queries': 7, 'queries_per_message': 4},
+        'check': {'queries': 2, 'queries_per_message': 1},
+        'webhook': {'queries': 2},
+    },
+    'push-notification': {
+        'send': {'queries': 4},
+        'send_template': {'queries': 12},
+        'bulk_send': {'queries': 2, 'queries_per_message': 2},
+        'batch': {'queries': 7, 'queries_per_message': 4},
+        'webhook': {'queries': 3, 'queries_per_message': 1},
+    },
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget:
+    """
+    Maximal number of DB queries and optionally maximal duration of one call of the public API
+    :param queries: number of queries of the call which don't depend on the number of messages
+    :param queries_per_message: number of queries of the call for every processed message
+    :param seconds: maximal duration of the call in seconds, duration is not checked if it is None
+    """
+
+    def __init__(self, queries=0, queries_per_message=0, seconds=None):
+        self.queries = queries
+        self.queries_per_message = queries_per_message
+        self.seconds = seconds
+
+    def get_max_queries(self, number_of_messages=1):
+        return self.queries + self.queries_per_message * number_of_messages
+
+    def get_errors(self, number_of_queries, duration, number_of_messages=1):
+        """
+        Returns list of messages which describe exceeded limits of the budget
+        """
+        errors = []
+        if number_of_queries > self.get_max_queries(number_of_messages):
+            errors.append('{} queries executed for {} messages, {} expected'.format(
+                number_of_queries, number_of_messages, self.get_max_queries(number_of_messages)
+            ))
+        if self.seconds is not None and duration > self.seconds:
+            errors.append('call took {:.3f} s, {:.3f} s expected'.format(duration, self.seconds))
+        return errors
+
+    def __str__(self):
+        if self.queries_per_message:
+            out = '{} + {}/message queries'.format(self.queries, self.queries_per_message)
+        else:
+            out = '{} queries'.format(self.queries)
+        if self.seconds is not None:
+            out += ', {} s'.format(self.seconds)
+        return out
+
+
+def get_query_budget(message_type, operation):
+    """
+    Returns budget of the operation (send, send_template, bulk_send, batch, check or webhook) of the message type
+    (sms, email, dialer or push-notification). Default budgets can be changed with the setting PYMESS_QUERY_BUDGETS.
+    None is returned if the budget is not declared.
+    """
+    budget = {
+        **DEFAULT_QUERY_BUDGETS.get(message_type, {}),
+        **settings.QUERY_BUDGETS.get(message_type, {}),
+    }.get(operation)
+    return None if budget is None else QueryBudget(**budget)
+
+
+class QueryBudgetMeasurement:
+    """
+    Context manager which records DB queries and wall time of the code block
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self._captured_queries = CaptureQueriesContext(connections[using])
+
+    @property
+    def queries(self):
+        return self._captured_queries.captured_queries
+
+    @property
+    def number_of_queries(self):
+        return len(self._captured_queries)
+
+    def __enter__(self):
+        self._started_at = monotonic()
+        self._captured_queries.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._captured_queries.__exit__(exc_type, exc_value, traceback)
+        self.duration = monotonic() - self._started_at
+
+
+def _format_exceeded_budget(description, errors, queries):
+    return '{}: {}\nCaptured queries were:\n{}'.format(
+        description,
+        ', '.join(errors),
+        '\n'.join('{}. {}'.format(i, query['sql']) for i, query in enumerate(queries, start=1))
+    )
+
+
+@contextmanager
+def assert_query_budget(budget, number_of_messages=1, using=DEFAULT_DB_ALIAS):
+    """
+    Context manager which raises QueryBudgetExceeded if the code block exceeds the budget
+    :param budget: QueryBudget instance
+    :param number_of_messages: number of messages processed in the code block
+    :param using: alias of the measured database
+    """
+    with QueryBudgetMeasurement(using) as measurement:
+        yield measurement
+
+    errors = budget.get_errors(measurement.number_of_queries, measurement.duration, number_of_messages)
+    if errors:
+        raise QueryBudgetExceeded(_format_exceeded_budget('Query budget exceeded', errors, measurement.queries))
+
+
+class QueryBudgetTestCaseMixin:
+    """
+    Mixin of the test case which checks that code does not exceed the declared query budgets, e.g.:
+
+        with self.assertQueryBudget('sms', 'bulk_send', number_of_messages=len(recipients)):
+            SMSController().bulk_send(recipients, 'text')
+    """
+
+    def assertQueryBudget(self, message_type, operation, number_of_messages=1, using=DEFAULT_DB_ALIAS):
+        budget = get_query_budget(message_type, operation)
+        assert budget is not None, 'Query budget of operation "{}" for "{}" is not declared'.format(
+            operation, message_type
+        )
+        return assert_query_budget(budget, number_of_messages, using)
+
+
+class QueryBudgetResult:
+    """
+    Comparison of the measured scenario with the budget of the operation
+    """
+
+    def __init__(self, message_type, budget, benchmark_result):
+        self.message_type = message_type
+        self.budget = budget
+        self.benchmark_result = benchmark_result
+
+    @property
+    def scenario(self):
+        return self.benchmark_result.scenario
+
+    @property
+    def operations(self):
+        return self.benchmark_result.operations
+
+    @property
+    def max_number_of_queries(self):
+        return max((operation.number_of_queries for operation in self.operations), default=None)
+
+    @property
+    def max_duration(self):
+        return max((operation.duration for operation in self.operations), default=None)
+
+    def get_exceeded_operations(self):
+        """
+        Returns list of pairs (operation, errors) of operations which exceeded the budget
+        """
+        if self.budget is None:
+            return []
+        exceeded_operations = []
+        for operation in self.operations:
+            errors = self.budget.get_errors(
+                operation.number_of_queries, operation.duration, operation.number_of_messages
+            )
+            if errors:
+                exceeded_operations.append((operation, errors))
+        return exceeded_operations
+
+    @property
+    def is_exceeded(self):
+        return bool(self.get_exceeded_operations())
+
+    def format_exceeded_operations(self):
+        return '\n'.join(
+            _format_exceeded_budget(
+                'Query budget of {} {} exceeded'.format(self.message_type, self.scenario), errors, operation.queries
+            )
+            for operation, errors in self.get_exceeded_operations()
+        )
+
+
+def check_query_budgets(benchmark, scenarios=None):
+    """
+    Runs scenarios of the benchmark and compares every measured call of the public API with the declared budget
+    :param benchmark: benchmark instance of the message type
+    :param scenarios: list of checked scenarios, all scenarios of the benchmark are checked by default
+    :return: list of QueryBudgetResult instances
+    """
+    return [
+        QueryBudgetResult(
+            benchmark.command_type, get_query_budget(benchmark.command_type, benchmark_result.scenario),
+            benchmark_result
+        )
+        for benchmark_result in benchmark.run(scenarios)
+    ]
@@ -0,0 +1,202 @@
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from uuid import uuid4
+
+from bs4 import BeautifulSoup
+
+
+class ProviderStubRequestHandler(BaseHTTPRequestHandler):
+    """
+    Base request handler of the provider stub server. Every request is delayed by the latency of the server and
+    the part of requests defined by the error rate of the server fails.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    content_type = 'application/json'
+
+    def get_response(self, method, path, body):
+        """
+        Returns pair (status code, response content) for the successful request
+        :param method: HTTP method of the request
+        :param path: path of the request URL without query string
+        :param body: request body (bytes)
+        """
+        raise NotImplementedError
+
+    def get_error_response(self, method, path, body):
+        """
+        Returns pair (status code, response content) for the failed request
+        """
+        return 500, 'Internal Server Error'
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                chunk_size = int(self.rfile.readline().split(b';')[0], 16)
+                chunk = self.rfile.read(chunk_size)
+                self.rfile.readline()
+                if not chunk_size:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _handle_request(self):
+        body = self._read_body()
+        path = urlparse(self.path).path
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if self.server.is_error_request():
+            status_code, content = self.get_error_response(self.command, path, body)
+        else:
+            status_code, content = self.get_response(self.command, path, body)
+
+        content = content.encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', self.content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = _handle_request
+    do_POST = _handle_request
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ATSRequestHandler(ProviderStubRequestHandler):
+    """
+    Stub of the ATS XML API. Sent SMS messages are accepted and all delivery requests return delivered state.
+    """
+
+    content_type = 'text/xml'
+
+    def get_response(self, method, path, body):
+        soup = BeautifulSoup(body, 'html.parser')
+        codes = (
+            [(sms_tag['uniq'], 0) for sms_tag in soup.find_all('sms')]
+            + [(dlr_tag['uniq'], 23) for dlr_tag in soup.find_all('dlr')]
+        )
+        return 200, '<?xml version="1.0" encoding="UTF-8"?><status>{}</status>'.format(''.join(
+            '<code uniq="{}">{}</code>'.format(uniq, code) for uniq, code in codes
+        ))
+
+
+class SMSOperatorRequestHandler(ProviderStubRequestHandler):
+    """
+    Stub of the SMS operator XML API. Sent SMS messages are in unknown state and all delivery requests return
+    delivered state.
+    """
+
+    content_type = 'text/xml'
+
+    def get_response(self, method, path, body):
+        soup = BeautifulSoup(body, 'html.parser')
+        status = 11 if soup.datatype.string == 'SMS' else 0
+        return 200, '<?xml version="1.0"?><SmsServices><DataArray>{}</DataArray></SmsServices>'.format(''.join(
+            '<DataItem><SmsId>{}</SmsId><Status>{}</Status></DataItem>'.format(sms_id_tag.string, status)
+            for sms_id_tag in soup.find_all('smsid')
+        ))
+
+
+class DaktelaRequestHandler(ProviderStubRequestHandler):
+    """
+    Stub of the Daktela campaign records API. Created records are ready and all requested records are finished.
+    """
+
+    def get_response(self, method, path, body):
+        if method == 'POST':
+            record = {'name': 'records_{}'.format(uuid4().hex), 'action': '0', 'statuses': []}
+        else:
+            record = {'name': path.rsplit('/', 1)[-1][:-len('.json')], 'action': '5', 'statuses': []}
+        return 200, json.dumps({'error': [], 'result': record})
+
+    def get_error_response(self, method, path, body):
+        return 500, json.dumps({'error': ['Stub server error'], 'result': None})
+
+
+class MandrillRequestHandler(ProviderStubRequestHandler):
+    """
+    Stub of the Mandrill messages API. Sent messages are in sent state.
+    """
+
+    def get_response(self, method, path, body):
+        if path.endswith('messages/send.json'):
+            data = json.loads(body)
+            return 200, json.dumps([
+                {'email': recipient['email'], 'status': 'sent', '_id': uuid4().hex, 'reject_reason': None}
+                for recipient in data['message']['to']
+            ])
+        elif path.endswith('messages/info.json'):
+            data = json.loads(body)
+            return 200, json.dumps({'_id': data['id'], 'state': 'sent', 'ts': int(time.time()), 'opens': 0,
+                                    'clicks': 0})
+        else:
+            return 404, json.dumps({'status': 'error', 'code': -1, 'name': 'Unknown_Method', 'message': path})
+
+    def get_error_response(self, method, path, body):
+        return 500, json.dumps({'status': 'error', 'code': -1, 'name': 'GeneralError', 'message': 'Stub error'})
+
+
+class OneSignalRequestHandler(ProviderStubRequestHandler):
+    """
+    Stub of the OneSignal notifications API. All notifications are successfully created.
+    """
+
+    def get_response(self, method, path, body):
+        return 200, json.dumps({'id': str(uuid4()), 'recipients': 1})
+
+    def get_error_response(self, method, path, body):
+        return 400, json.dumps({'errors': ['Stub server error']})
+
+
+class ProviderStubServer(ThreadingHTTPServer):
+    """
+    Local HTTP server which simulates the provider API. Server is started in the background thread.
+    :param handler_class: provider request handler class
+    :param latency: delay of every response in seconds
+    :param error_rate: part of requests (0 to 1) which fail with error response
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler_class, latency=0, error_rate=0, host='127.0.0.1', port=0):
+        super().__init__((host, port), handler_class)
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random()
+        self._random_lock = threading.Lock()
+        self._thread = None
+
+    def is_error_request(self):
+        if not self.error_rate:
+            return False
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -1,4 +1,5 @@
 from collections import OrderedDict
+import inspect
 import re
 
 from enum import Enum, auto
@@ -28,6 +29,7 @@ DEFAULTS = {
     },
     'SMS_DEFAULT_SENDER_BACKEND_NAME': DEFAULT_SENDER_BACKEND_NAME,
     'SMS_BACKEND_ROUTER': 'pymess.backend.routers.DefaultBackendRouter',
+    'SMS_BACKEND_ROUTER_PREFIXES': {},
     'SMS_TEMPLATE_MODEL': 'pymess.SMSTemplate',
     'SMS_USE_ACCENT': False,
     'SMS_DEFAULT_PHONE_CODE': None,
@@ -39,6 +41,7 @@ DEFAULTS = {
     'SMS_BATCH_MAX_NUMBER_OF_SEND_ATTEMPTS': 3,
     'SMS_BATCH_MAX_SECONDS_TO_SEND': 60 * 60,
     'SMS_RETRY_SENDING': True,
+    'SMS_RETENTION_DAYS': None,
 
     # E-mail configuration
     'EMAIL_BACKENDS': {
@@ -71,10 +74,14 @@ DEFAULTS = {
     'EMAIL_SENDERS': (),
     'EMAIL_HTML_DATA_DIRECTORY': None,
     'EMAIL_PULL_INFO_BATCH_SIZE': 100,
+    'EMAIL_PULL_INFO_CHUNK_SIZE': 20,
     'EMAIL_PULL_INFO_DELAY_SECONDS': 60 * 60,  # 1 hour
     'EMAIL_PULL_INFO_MAX_TIMEOUT_FROM_SENT_SECONDS': 60 * 60 * 24 * 30,  # 30 days
     'EMAIL_RETRY_SENDING': True,
+    'EMAIL_RETENTION_DAYS': None,
     'EMAIL_STORAGE_PATH': 'pymess/emails',
+    'EMAIL_STORE_COMPRESSED_CONTENT': False,
+    'EMAIL_DEDUPLICATE_ATTACHMENTS': False,
 
     # Dialer configuration
     'DIALER_BACKENDS': {
@@ -84,14 +91,17 @@ DEFAULTS = {
     },
     'DIALER_DEFAULT_SENDER_BACKEND_NAME': DEFAULT_SENDER_BACKEND_NAME,
     'DIALER_BACKEND_ROUTER': 'pymess.backend.routers.DefaultBackendRouter',
+    'DIALER_BACKEND_ROUTER_PREFIXES': {},
     'DIALER_TEMPLATE_MODEL': 'pymess.DialerTemplate',
     'DIALER_IDLE_MESSAGES_TIMEOUT_MINUTES': 60 * 24,
+    'DIALER_WEBHOOK_TIMEOUT_MINUTES': 60,
     'DIALER_NUMBER_OF_STATUS_CHECK_ATTEMPTS': 5,
     'DIALER_BATCH_SENDING': False,
     'DIALER_BATCH_SIZE': 20,
     'DIALER_BATCH_MAX_NUMBER_OF_SEND_ATTEMPTS': 3,
     'DIALER_BATCH_MAX_SECONDS_TO_SEND': 60 * 60,
     'DIALER_RETRY_SENDING': True,
+    'DIALER_RETENTION_DAYS': None,
 
     # Push notification settings
     'PUSH_NOTIFICATION_BACKENDS': {
@@ -107,9 +117,41 @@ DEFAULTS = {
     'PUSH_NOTIFICATION_BATCH_MAX_NUMBER_OF_SEND_ATTEMPTS': 3,
     'PUSH_NOTIFICATION_BATCH_MAX_SECONDS_TO_SEND': 60 * 60,
     'PUSH_NOTIFICATION_RETRY_SENDING': True,
+    'PUSH_NOTIFICATION_RETENTION_DAYS': None,
 
     # General message settings
     'DEFAULT_MESSAGE_PRIORITY': 3,
+    'DISALLOWED_OBJECTS_CACHE_TIMEOUT_SECONDS': None,
+
+    # Statistics settings
+    'STATISTICS_ROLLUP_CHUNK_SIZE': 24,
+    'STATISTICS_ROLLUP_OVERLAP_SECONDS': 5 * 60,
+
+    # Retention settings
+    'RETENTION_CHUNK_SIZE': 500,
+    'RETENTION_ARCHIVE_STORAGE_PATH': 'pymess/archive',
+
+    # Partitioning settings
+    'PARTITION_INTERVAL': 'month',
+    'PARTITION_PREMAKE': 3,
+    'QUERY_WINDOW_DAYS': None,
+
+    # Storage garbage collector settings
+    'STORAGE_GC_CHUNK_SIZE': 2000,
+    'STORAGE_GC_BATCH_SIZE': 100,
+    'STORAGE_GC_MAX_WORKERS': 4,
+    'STORAGE_GC_MIN_AGE_SECONDS': 60 * 60 * 24,  # 1 day
+
+    # Export settings
+    'EXPORT_CHUNK_SIZE': 1000,
+    'EXPORT_MAX_WORKERS': 8,
+
+    # Monitoring settings
+    'METRICS_EXPORTER': None,
+    'METRICS_VIEW_TOKEN': None,
+    'METRICS_QUEUE_DEPTH_REFRESH_SECONDS': 60,
+    'TRACER': None,
+    'QUERY_BUDGETS': {},
 }
 
 
@@ -162,9 +204,23 @@ def get_email_template_model():
     """
     return get_model(settings.EMAIL_TEMPLATE_MODEL)
 
+def _accepts_keyword_argument(callable_class, argument_name):
+    parameters = inspect.signature(callable_class).parameters.values()
+    return any(
+        parameter.name == argument_name or parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters
+    )
+
+
 def get_router(backend_type):
     router_option_name = '{}_BACKEND_ROUTER'.format(backend_type.name)
-    return import_string(getattr(settings, router_option_name))()
+    router_class = import_string(getattr(settings, router_option_name))
+    if _accepts_keyword_argument(router_class, 'backend_type'):
+        return router_class(backend_type=backend_type)
+    else:
+        # Custom routers with the constructor without the backend_type parameter
+        router = router_class()
+        router.backend_type = backend_type
+        return router
 
 
 def _get_backend_config_dict(backend_type):
@@ -174,7 +230,35 @@ def _get_backend_config_dict(backend_type):
 
 def get_backend(backend_type, backend_name):
     backend_from_config = _get_backend_config_dict(backend_type)[backend_name]
-    return import_string(backend_from_config['backend'])(config=backend_from_config.get('config', {}))
+    backend_class = import_string(backend_from_config['backend'])
+    backend_config = backend_from_config.get('config', {})
+    if _accepts_keyword_argument(backend_class, 'name'):
+        return backend_class(config=backend_config, name=backend_name)
+    else:
+        # Custom backends with the constructor without the name parameter
+        backend = backend_class(config=backend_config)
+        backend.name = backend_name
+        return backend
+
+
+def get_backend_names(backend_type):
+    return list(_get_backend_config_dict(backend_type).keys())
+
+
+def get_backend_router_prefixes(backend_type):
+    router_prefixes_option_name = '{}_BACKEND_ROUTER_PREFIXES'.format(backend_type.name)
+    return getattr(settings, router_prefixes_option_name)
+
+
+def get_backend_weights(backend_type):
+    """
+    Returns weights of backends which should be used for load balancing. Only backends with defined weight are returned.
+    """
+    return {
+        backend_name: backend_config['weight']
+        for backend_name, backend_config in _get_backend_config_dict(backend_type).items()
+        if 'weight' in backend_config
+    }
 
 
 def get_default_sender_backend_name(backend_type):
@@ -44,6 +44,7 @@ class PushNotificationMessageState(IntegerChoicesEnum):
     ERROR = 3, _('error')
     DEBUG = 4, _('debug')
     ERROR_RETRY = 5, _('error retry')
+    DELIVERED = 6, _('delivered')
 
 
 class OutputSMSMessageState(IntegerChoicesEnum):
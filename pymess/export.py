@@ -0,0 +1,166 @@
+import csv
+import json
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import prefetch_related_objects
+
+from pymess.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+
+class MessageExporter:
+    """
+    Exports messages to the JSON lines or CSV file. Messages are streamed from the database in chunks, related
+    objects are prefetched for every chunk and rows are written incrementally, therefore memory doesn't grow with
+    the number of exported messages.
+    :param controller: controller of the message type
+    :param include_body: content of the messages is exported if it is True
+    :param chunk_size: number of messages fetched from the database at once
+    :param max_workers: maximal number of parallel reads of the message contents from the storage
+    """
+
+    excluded_field_names = ('content',)
+
+    def __init__(self, controller, include_body=False, chunk_size=None, max_workers=None):
+        self.controller = controller
+        self.model = controller.model
+        self.include_body = include_body
+        self.chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        self.max_workers = max_workers or settings.EXPORT_MAX_WORKERS
+
+    def get_fields(self):
+        return [
+            field for field in self.model._meta.concrete_fields if field.name not in self.excluded_field_names
+        ]
+
+    def get_column_names(self):
+        column_names = [field.attname for field in self.get_fields()] + ['state_name', 'related_objects']
+        if self.include_body:
+            column_names.append('content')
+        return column_names
+
+    def get_prefetch_lookups(self):
+        return ['related_objects__content_type']
+
+    def get_queryset(self, queryset=None):
+        return (self.model.objects.all() if queryset is None else queryset).order_by('pk')
+
+    def get_bodies(self, messages):
+        return [message.content for message in messages]
+
+    def serialize_message(self, message):
+        data = {field.attname: field.value_from_object(message) for field in self.get_fields()}
+        data['state_name'] = self.model.State(message.state).name
+        data['related_objects'] = [
+            {
+                'content_type': '{}.{}'.format(related_object.content_type.app_label, related_object.content_type.model),
+                'object_id': related_object.object_id,
+            }
+            for related_object in message.related_objects.all()
+        ]
+        return data
+
+    def iter_chunks(self, queryset=None):
+        messages = self.get_queryset(queryset).iterator(chunk_size=self.chunk_size)
+        for chunk in iter(lambda: list(islice(messages, self.chunk_size)), []):
+            prefetch_related_objects(chunk, *self.get_prefetch_lookups())
+            yield chunk
+
+    def iter_rows(self, queryset=None):
+        """
+        Yields dicts with the serialized messages
+        """
+        for chunk in self.iter_chunks(queryset):
+            bodies = self.get_bodies(chunk) if self.include_body else None
+            for i, message in enumerate(chunk):
+                row = self.serialize_message(message)
+                if bodies is not None:
+                    row['content'] = bodies[i]
+                yield row
+
+    def _write_jsonl(self, output, rows):
+        number_of_messages = 0
+        for row in rows:
+            output.write(json.dumps(row, cls=DjangoJSONEncoder))
+            output.write('\n')
+            number_of_messages += 1
+        return number_of_messages
+
+    def _write_csv(self, output, rows):
+        writer = csv.DictWriter(output, fieldnames=self.get_column_names())
+        writer.writeheader()
+        number_of_messages = 0
+        for row in rows:
+            writer.writerow({
+                key: json.dumps(value, cls=DjangoJSONEncoder) if isinstance(value, (dict, list)) else value
+                for key, value in row.items()
+            })
+            number_of_messages += 1
+        return number_of_messages
+
+    def export(self, output, format='jsonl', queryset=None):
+        """
+        Writes messages to the output
+        :param output: text file object (e.g. opened with gzip.open(path, 'wt'))
+        :param format: format of the output (jsonl or csv)
+        :param queryset: queryset of the exported messages, all messages are exported by default
+        :return: number of exported messages
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError('Export format "{}" is not supported, use one of {}'.format(
+                format, ', '.join(EXPORT_FORMATS)
+            ))
+        rows = self.iter_rows(queryset)
+        return self._write_jsonl(output, rows) if format == 'jsonl' else self._write_csv(output, rows)
+
+
+class EmailMessageExporter(MessageExporter):
+    """
+    E-mail exporter reads contents of the messages from the storage with the bounded number of parallel reads and
+    exports names of the attachment files.
+    """
+
+    excluded_field_names = ('content_file', 'compressed_content')
+
+    def get_column_names(self):
+        column_names = super().get_column_names()
+        column_names.insert(-1 if self.include_body else len(column_names), 'attachments')
+        return column_names
+
+    def get_prefetch_lookups(self):
+        return super().get_prefetch_lookups() + ['attachments']
+
+    def get_queryset(self, queryset=None):
+        queryset = super().get_queryset(queryset)
+        # Compressed contents are read in the worker threads which should not query the database
+        return queryset.select_related('compressed_content') if self.include_body else queryset
+
+    def _read_body(self, message):
+        try:
+            return message.content
+        except (OSError, ValueError) as ex:
+            # One missing file should not stop the export
+            logger.exception(ex)
+            return None
+        finally:
+            message.content_file.close()
+            if message.compressed_content_id:
+                message.compressed_content.file.close()
+
+    def get_bodies(self, messages):
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(messages))) as executor:
+            return list(executor.map(self._read_body, messages))
+
+    def serialize_message(self, message):
+        data = super().serialize_message(message)
+        data['attachments'] = [attachment.file.name for attachment in message.attachments.all()]
+        return data
@@ -0,0 +1,59 @@
+import cProfile
+
+from time import monotonic
+
+from django.core.management.base import BaseCommand as DjangoBaseCommand
+
+from pymess.tracing import get_tracer, override_tracer
+from pymess.tracing.stats import PhaseStatsTracer
+
+
+class BaseCommand(DjangoBaseCommand):
+    """
+    Base class of pymess commands. Command can be profiled with the option --profile and time of the message
+    processing phases can be printed with the option --stats.
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--profile', action='store', dest='profile', default=None, metavar='FILE',
+                            help='Profiles the command with cProfile and writes the stats to the file '
+                                 '(it can be read with the pstats module).')
+        parser.add_argument('--stats', action='store_true', dest='stats', default=False,
+                            help='Prints time of the message processing phases (claim, render, persist, publish, '
+                                 'status parse).')
+
+    def _print_stats(self, phase_stats, duration):
+        row_format = '{:<16}{:>10}{:>14}{:>12}{:>10}'
+        self.stderr.write(row_format.format('phase', 'calls', 'total ms', 'avg ms', 'share'))
+        for stats in phase_stats:
+            self.stderr.write(row_format.format(
+                stats.phase,
+                stats.calls,
+                '{:.2f}'.format(stats.duration * 1000),
+                '{:.2f}'.format(stats.duration / stats.calls * 1000) if stats.calls else '-',
+                '{:.1f} %'.format(stats.duration / duration * 100) if duration else '-',
+            ))
+        self.stderr.write(row_format.format('command', '', '{:.2f}'.format(duration * 1000), '', ''))
+
+    def execute(self, *args, **options):
+        profile_path = options.get('profile')
+        stats_tracer = PhaseStatsTracer(get_tracer()) if options.get('stats') else None
+
+        profiler = cProfile.Profile() if profile_path else None
+        started_at = monotonic()
+        try:
+            if profiler:
+                profiler.enable()
+            if stats_tracer:
+                with override_tracer(stats_tracer):
+                    return super().execute(*args, **options)
+            else:
+                return super().execute(*args, **options)
+        finally:
+            duration = monotonic() - started_at
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_path)
+            if stats_tracer:
+                self._print_stats(stats_tracer.get_stats(), duration)
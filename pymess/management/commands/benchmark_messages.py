@@ -0,0 +1,70 @@
+from django.core.management.base import CommandError
+
+from pymess.benchmark import (
+    DialerBenchmark, EmailBenchmark, PushNotificationBenchmark, SMSBenchmark, SMSOperatorBenchmark
+)
+from pymess.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Command for measuring throughput of sending messages with the local provider stub servers.
+    """
+
+    benchmarks = {
+        'email': EmailBenchmark,
+        'push-notification': PushNotificationBenchmark,
+        'dialer': DialerBenchmark,
+        'sms': SMSBenchmark,
+    }
+    sms_benchmarks = {
+        'ats': SMSBenchmark,
+        'sms-operator': SMSOperatorBenchmark,
+    }
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--type', action='store', dest='type', default='sms', choices=self.benchmarks.keys(),
+                            help='Tells Django what type of messages should be measured '
+                                 '(email/push-notification/dialer/sms).')
+        parser.add_argument('--sms-backend', action='store', dest='sms_backend', default='ats',
+                            choices=self.sms_benchmarks.keys(), help='SMS backend which is measured (ats/sms-operator).')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Measured scenario (send/send_template/bulk_send/batch/check/webhook), can be used more times. '
+                                 'All scenarios supported by the message type are measured by default.')
+        parser.add_argument('--messages', action='store', dest='number_of_messages', type=int, default=100,
+                            help='Number of messages of every scenario.')
+        parser.add_argument('--bulk-size', action='store', dest='bulk_size', type=int, default=20,
+                            help='Number of messages sent with one bulk or one webhook request.')
+        parser.add_argument('--latency', action='store', dest='latency', type=float, default=0,
+                            help='Latency of the provider stub server responses in milliseconds.')
+        parser.add_argument('--error-rate', action='store', dest='error_rate', type=float, default=0,
+                            help='Part of the provider stub server responses (0 to 1) which are errors.')
+
+    def _format_value(self, value, multiplier=1):
+        return '-' if value is None else '{:.2f}'.format(value * multiplier)
+
+    def handle(self, type, sms_backend, scenarios, number_of_messages, bulk_size, latency, error_rate, **options):
+        benchmark_class = self.sms_benchmarks[sms_backend] if type == 'sms' else self.benchmarks[type]
+        unsupported_scenarios = set(scenarios or ()) - set(benchmark_class.get_scenarios())
+        if unsupported_scenarios:
+            raise CommandError('Unsupported scenarios: {}'.format(', '.join(sorted(unsupported_scenarios))))
+
+        results = benchmark_class(
+            number_of_messages=number_of_messages, bulk_size=bulk_size, latency=latency / 1000, error_rate=error_rate
+        ).run(scenarios)
+
+        row_format = '{:<15}{:>10}{:>12}{:>12}{:>12}{:>12}{:>14}'
+        self.stdout.write(row_format.format(
+            'scenario', 'messages', 'duration s', 'messages/s', 'p50 ms', 'p99 ms', 'queries/msg'
+        ))
+        for result in results:
+            self.stdout.write(row_format.format(
+                result.scenario,
+                result.number_of_messages,
+                self._format_value(result.duration),
+                self._format_value(result.messages_per_second),
+                self._format_value(result.latency_p50, 1000),
+                self._format_value(result.latency_p99, 1000),
+                self._format_value(result.queries_per_message),
+            ))
@@ -1,6 +1,5 @@
-from django.core.management.base import BaseCommand
-
 from pymess.backend.dialer import DialerController
+from pymess.management.base import BaseCommand
 
 
 class Command(BaseCommand):
@@ -0,0 +1,78 @@
+from django.core.management.base import CommandError
+
+from pymess.benchmark import (
+    DialerBenchmark, EmailBenchmark, PushNotificationBenchmark, SMSBenchmark, SMSOperatorBenchmark
+)
+from pymess.benchmark.budgets import check_query_budgets
+from pymess.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Command for checking that calls of the public API don't exceed the declared query budgets.
+    """
+
+    benchmarks = {
+        'email': EmailBenchmark,
+        'push-notification': PushNotificationBenchmark,
+        'dialer': DialerBenchmark,
+        'sms': SMSBenchmark,
+    }
+    sms_benchmarks = {
+        'ats': SMSBenchmark,
+        'sms-operator': SMSOperatorBenchmark,
+    }
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--type', action='append', dest='types', choices=self.benchmarks.keys(),
+                            help='Tells Django what type of messages should be checked '
+                                 '(email/push-notification/dialer/sms), can be used more times. '
+                                 'All types are checked by default.')
+        parser.add_argument('--sms-backend', action='store', dest='sms_backend', default='ats',
+                            choices=self.sms_benchmarks.keys(), help='SMS backend which is checked (ats/sms-operator).')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Checked scenario (send/send_template/bulk_send/batch/check/webhook), can be used '
+                                 'more times. All scenarios supported by the message type are checked by default.')
+        parser.add_argument('--messages', action='store', dest='number_of_messages', type=int, default=20,
+                            help='Number of messages of every scenario.')
+        parser.add_argument('--bulk-size', action='store', dest='bulk_size', type=int, default=10,
+                            help='Number of messages sent with one bulk or one webhook request.')
+
+    def _format_value(self, value, multiplier=1):
+        return '-' if value is None else '{:.2f}'.format(value * multiplier)
+
+    def handle(self, types, sms_backend, scenarios, number_of_messages, bulk_size, **options):
+        results = []
+        for type in types or self.benchmarks.keys():
+            benchmark_class = self.sms_benchmarks[sms_backend] if type == 'sms' else self.benchmarks[type]
+            # Scenarios which depend on missing optional libraries are skipped
+            supported_scenarios = benchmark_class.get_scenarios()
+            results += check_query_budgets(
+                benchmark_class(number_of_messages=number_of_messages, bulk_size=bulk_size),
+                [scenario for scenario in scenarios or supported_scenarios if scenario in supported_scenarios]
+            )
+
+        row_format = '{:<20}{:<15}{:>8}{:>14}{:>32}{:>12}  {}'
+        self.stdout.write(row_format.format(
+            'type', 'scenario', 'calls', 'max queries', 'budget', 'max ms', 'result'
+        ))
+        for result in results:
+            self.stdout.write(row_format.format(
+                result.message_type,
+                result.scenario,
+                len(result.operations),
+                '-' if result.max_number_of_queries is None else result.max_number_of_queries,
+                str(result.budget) if result.budget else '-',
+                self._format_value(result.max_duration, 1000),
+                'EXCEEDED' if result.is_exceeded else 'OK',
+            ))
+
+        exceeded_results = [result for result in results if result.is_exceeded]
+        if exceeded_results:
+            if options['verbosity'] > 1:
+                for result in exceeded_results:
+                    self.stderr.write(result.format_exceeded_operations())
+            raise CommandError('Query budgets exceeded: {}'.format(', '.join(
+                '{} {}'.format(result.message_type, result.scenario) for result in exceeded_results
+            )))
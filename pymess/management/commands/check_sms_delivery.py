@@ -1,6 +1,5 @@
-from django.core.management.base import BaseCommand
-
 from pymess.backend.sms import SMSController
+from pymess.management.base import BaseCommand
 
 
 class Command(BaseCommand):
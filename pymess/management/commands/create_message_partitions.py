@@ -0,0 +1,25 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from pymess.management.base import BaseCommand
+from pymess.utils.partitioning import create_partitions, get_partitioned_models
+
+
+class Command(BaseCommand):
+    """
+    Command for creating partitions of the partitioned message tables for the next periods.
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--premake', action='store', type=int, dest='premake', default=None,
+                            help='Number of created partitions after the current period.')
+        parser.add_argument('--database', action='store', dest='database', default=DEFAULT_DB_ALIAS,
+                            help='Nominates a database to create partitions. Defaults to the "default" database.')
+
+    def handle(self, premake, database, *args, **options):
+        for model in get_partitioned_models():
+            partition_names = create_partitions(model, number_of_partitions=premake, using=database)
+            if partition_names:
+                self.stdout.write('{}: created partitions: {}'.format(
+                    model._meta.db_table, ', '.join(partition_names)
+                ))
@@ -0,0 +1,33 @@
+from pymess.management.base import BaseCommand
+from pymess.storage_gc import StorageGarbageCollector
+
+
+class Command(BaseCommand):
+    """
+    Command for deleting e-mail content and attachment files which are not referenced from the database.
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help='Only prints number of orphaned files.')
+        parser.add_argument('--chunk-size', action='store', type=int, dest='chunk_size', default=None,
+                            help='Number of file names fetched from the database at once.')
+        parser.add_argument('--batch-size', action='store', type=int, dest='batch_size', default=None,
+                            help='Number of files deleted by one worker task.')
+        parser.add_argument('--max-workers', action='store', type=int, dest='max_workers', default=None,
+                            help='Number of parallel workers which delete files.')
+        parser.add_argument('--min-age', action='store', type=int, dest='min_age_seconds', default=None,
+                            help='Files modified in the last defined number of seconds are not deleted.')
+
+    def handle(self, dry_run, chunk_size, batch_size, max_workers, min_age_seconds, *args, **options):
+        result = StorageGarbageCollector(
+            chunk_size=chunk_size,
+            batch_size=batch_size,
+            max_workers=max_workers,
+            min_age_seconds=min_age_seconds,
+            dry_run=dry_run,
+        ).collect()
+        self.stdout.write('orphaned files: {}, deleted files: {}, recent files: {}'.format(
+            result.number_of_orphaned_files, result.number_of_deleted_files, result.number_of_recent_files
+        ))
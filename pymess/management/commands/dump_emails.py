@@ -3,9 +3,9 @@ import json
 import os
 
 from django.core import serializers
-from django.core.management.base import BaseCommand
 
 from pymess.config import get_email_template_model
+from pymess.management.base import BaseCommand
 
 
 class Command(BaseCommand):
@@ -14,6 +14,7 @@ class Command(BaseCommand):
     """
 
     def add_arguments(self, parser):
+        super().add_arguments(parser)
         parser.add_argument('--directory', dest='directory', type=str, required=True)
         parser.add_argument('--indent', default=0, dest='indent', type=int,
                             help='Specifies the indent level to use when pretty-printing output')
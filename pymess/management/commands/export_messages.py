@@ -0,0 +1,84 @@
+import gzip
+import sys
+
+from django.core.management.base import CommandError
+from django.utils.dateparse import parse_datetime
+
+from pymess.backend.dialer import DialerController
+from pymess.backend.emails import EmailController
+from pymess.backend.push import PushNotificationController
+from pymess.backend.sms import SMSController
+from pymess.export import EXPORT_FORMATS
+from pymess.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Command for exporting messages to the JSON lines or CSV file.
+    """
+
+    controllers = {
+        'email': EmailController(),
+        'push-notification': PushNotificationController(),
+        'dialer': DialerController(),
+        'sms': SMSController()
+    }
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--type', action='store', dest='type', default='email', choices=self.controllers.keys(),
+                            help='Tells Django what type of messages should be exported '
+                                 '(email/push-notification/dialer/sms).')
+        parser.add_argument('--output', action='store', dest='output', default='-',
+                            help='Path of the output file, messages are written to the standard output by default. '
+                                 'Output is compressed with gzip if the path ends with ".gz".')
+        parser.add_argument('--format', action='store', dest='format', default='jsonl', choices=EXPORT_FORMATS,
+                            help='Format of the output (jsonl/csv).')
+        parser.add_argument('--from', action='store', dest='from_datetime', default=None,
+                            help='Exports messages created at or after the datetime (ISO format).')
+        parser.add_argument('--to', action='store', dest='to_datetime', default=None,
+                            help='Exports messages created before the datetime (ISO format).')
+        parser.add_argument('--include-body', action='store_true', dest='include_body', default=False,
+                            help='Exports content of the messages.')
+        parser.add_argument('--chunk-size', action='store', type=int, dest='chunk_size', default=None,
+                            help='Number of messages fetched from the database at once.')
+        parser.add_argument('--max-workers', action='store', type=int, dest='max_workers', default=None,
+                            help='Maximal number of parallel reads of the message contents from the storage.')
+
+    def _parse_datetime(self, value):
+        parsed_value = parse_datetime(value)
+        if parsed_value is None:
+            raise CommandError('Invalid datetime "{}"'.format(value))
+        return parsed_value
+
+    def _open_output(self, output):
+        if output == '-':
+            return sys.stdout
+        elif output.endswith('.gz'):
+            return gzip.open(output, 'wt', encoding='utf-8', newline='')
+        else:
+            return open(output, 'w', encoding='utf-8', newline='')
+
+    def handle(self, type, output, format, from_datetime, to_datetime, include_body, chunk_size, max_workers,
+               *args, **options):
+        controller = self.controllers[type]
+        queryset = controller.model.objects.all()
+        if from_datetime:
+            queryset = queryset.filter(created_at__gte=self._parse_datetime(from_datetime))
+        if to_datetime:
+            queryset = queryset.filter(created_at__lt=self._parse_datetime(to_datetime))
+
+        output_file = self._open_output(output)
+        try:
+            number_of_messages = controller.export_messages(
+                output_file,
+                format=format,
+                queryset=queryset,
+                include_body=include_body,
+                chunk_size=chunk_size,
+                max_workers=max_workers,
+            )
+        finally:
+            if output_file is not sys.stdout:
+                output_file.close()
+        self.stderr.write('exported messages: {}'.format(number_of_messages))
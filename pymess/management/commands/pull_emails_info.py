@@ -1,14 +1,16 @@
 import datetime
 import logging
 
-from django.core.management.base import BaseCommand
 from django.db.models import F, Q
 from django.utils.timezone import now
 
 from chamber.utils.transaction import smart_atomic
 
+from pymess import metrics
 from pymess.backend.emails import EmailController
 from pymess.config import settings
+from pymess.management.base import BaseCommand
+from pymess.tracing import start_span
 
 
 logger = logging.getLogger(__name__)
@@ -27,26 +29,28 @@ class Command(BaseCommand):
     def _get_messages_queryset_to_update(self, email_controller):
         delay = datetime.timedelta(seconds=settings.EMAIL_PULL_INFO_DELAY_SECONDS)
         return email_controller.model.objects.filter(
-            # start_time = last_webhook_received_at + delay
-            # info_changed_at < start_time
-            # info_changed_at < last_webhook_received_at + delay
-            Q(info_changed_at__isnull=True) | Q(info_changed_at__lt=F('last_webhook_received_at') + delay),
+            # info is older than the last webhook and the last webhook was received before delay
+            # (info stored from the webhook data has info_changed_at equal to last_webhook_received_at)
+            Q(info_changed_at__isnull=True) | Q(info_changed_at__lt=F('last_webhook_received_at')),
             last_webhook_received_at__lt=now() - delay,
             sent_at__gt=now() - datetime.timedelta(seconds=settings.EMAIL_PULL_INFO_MAX_TIMEOUT_FROM_SENT_SECONDS)
-        ).order_by('-sent_at')
+        ).filter_query_window().order_by('-sent_at')
 
     @smart_atomic
-    def _pull_message_info(self, email_controller):
-        message = self._get_messages_queryset_to_update(email_controller).exclude(
-            pk__in=self.touched_message_pks
-        ).select_for_update().first()
-
-        if not message:
+    def _pull_messages_info(self, email_controller, chunk_size):
+        # Messages locked by another running command are skipped, failed messages are not updated therefore they
+        # must be excluded
+        with start_span('claim_messages', type=metrics.get_type_label(email_controller.backend_type_name)):
+            messages = list(
+                self._get_messages_queryset_to_update(email_controller).exclude(
+                    pk__in=self.touched_message_pks - self.updated_messages
+                ).select_for_update(skip_locked=True)[:chunk_size]
+            )
+        if not messages:
             return False
 
-        self.touched_message_pks.add(message.pk)
-        email_controller.get_backend(message.recipient).pull_message_info(message)
-        self.updated_messages.add(message.pk)
+        self.touched_message_pks |= {message.pk for message in messages}
+        self.updated_messages |= {message.pk for message in email_controller.bulk_pull_messages_info(messages)}
         return True
 
     def _print_result(self, title, message_pks):
@@ -58,13 +62,18 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         email_controller = EmailController()
 
-        for _ in range(settings.EMAIL_PULL_INFO_BATCH_SIZE):
+        while len(self.touched_message_pks) < settings.EMAIL_PULL_INFO_BATCH_SIZE:
+            chunk_size = min(
+                settings.EMAIL_PULL_INFO_CHUNK_SIZE,
+                settings.EMAIL_PULL_INFO_BATCH_SIZE - len(self.touched_message_pks)
+            )
             try:
-                if not self._pull_message_info(email_controller):
+                if not self._pull_messages_info(email_controller, chunk_size):
                     break
             except Exception as ex:
-                # One message error should not stop the whole cycle
+                # One chunk error should not stop the whole cycle
                 logger.exception(ex)
+                break
 
         self._print_result('updated messages', self.updated_messages)
         self._print_result('failed messages', self.touched_message_pks - self.updated_messages)
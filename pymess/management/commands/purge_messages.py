@@ -0,0 +1,42 @@
+from pymess.backend.dialer import DialerController
+from pymess.backend.emails import EmailController
+from pymess.backend.push import PushNotificationController
+from pymess.backend.sms import SMSController
+from pymess.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Command for deleting messages in the final state which are older than the retention period of the message type.
+    """
+
+    controllers = {
+        'email': EmailController(),
+        'push-notification': PushNotificationController(),
+        'dialer': DialerController(),
+        'sms': SMSController()
+    }
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--type', action='append', dest='types', choices=self.controllers.keys(),
+                            help='Tells Django what type of messages should be purged '
+                                 '(email/push-notification/dialer/sms), can be used more times. '
+                                 'All types are purged by default.')
+        parser.add_argument('--archive', action='store_true', dest='archive', default=False,
+                            help='Archives messages to the compressed JSON lines files before deleting.')
+        parser.add_argument('--chunk-size', action='store', type=int, dest='chunk_size', default=None,
+                            help='Number of messages deleted in one transaction.')
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help='Only prints number of messages which would be purged.')
+
+    def handle(self, types, archive, chunk_size, dry_run, *args, **options):
+        for type in types or self.controllers.keys():
+            controller = self.controllers[type]
+            if dry_run:
+                self.stdout.write('{}: messages to purge: {}'.format(type, controller.get_messages_to_purge().count()))
+            else:
+                result = controller.purge_messages(chunk_size=chunk_size, archive=archive)
+                self.stdout.write('{}: purged messages: {}, deleted files: {}, archive files: {}'.format(
+                    type, result.number_of_messages, result.number_of_files, len(result.archive_file_names)
+                ))
@@ -0,0 +1,30 @@
+from pymess.backend.dialer import DialerController
+from pymess.backend.emails import EmailController
+from pymess.backend.push import PushNotificationController
+from pymess.backend.sms import SMSController
+from pymess.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Command for refreshing pre-aggregated hour statistics of the messages changed since the last rollup.
+    """
+
+    controllers = {
+        'email': EmailController(),
+        'push-notification': PushNotificationController(),
+        'dialer': DialerController(),
+        'sms': SMSController()
+    }
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--type', action='append', dest='types', choices=self.controllers.keys(),
+                            help='Tells Django what type of messages should be rolled up '
+                                 '(email/push-notification/dialer/sms), can be used more times. '
+                                 'All types are rolled up by default.')
+
+    def handle(self, types, *args, **options):
+        for type in types or self.controllers.keys():
+            number_of_buckets = self.controllers[type].rollup_statistics()
+            self.stdout.write('{}: refreshed buckets: {}'.format(type, number_of_buckets))
@@ -1,13 +1,17 @@
 import logging
+from time import monotonic
 
 from chamber.utils.transaction import smart_atomic
-from django.core.management.base import BaseCommand, CommandError
+from django.core.management.base import CommandError
 from django.db import DatabaseError
 
+from pymess import metrics
 from pymess.backend.dialer import DialerController
 from pymess.backend.emails import EmailController
 from pymess.backend.push import PushNotificationController
 from pymess.backend.sms import SMSController
+from pymess.management.base import BaseCommand
+from pymess.tracing import start_span
 
 logger = logging.getLogger(__name__)
 
@@ -38,11 +42,12 @@ class Command(BaseCommand):
 
     @smart_atomic
     def _send_message(self, controller):
-        message = controller.get_waiting_or_retry_messages().exclude(
-            pk__in=self.touched_message_pks
-        ).select_for_update(
-            nowait=True
-        ).order_by('priority', 'created_at').first()
+        with start_span('claim_messages', type=metrics.get_type_label(controller.backend_type_name)):
+            message = controller.get_waiting_or_retry_messages().exclude(
+                pk__in=self.touched_message_pks
+            ).select_for_update(
+                nowait=True
+            ).order_by('priority', 'created_at').first()
         if not message or not controller.is_turned_on_batch_sending():
             return False
 
@@ -69,6 +74,7 @@ class Command(BaseCommand):
         if not controller.is_turned_on_batch_sending():
             raise CommandError('Batch sending is turned off')
 
+        started_at = monotonic()
         try:
             for _ in range(controller.get_batch_size()):
                 if not self._send_message(controller):
@@ -77,3 +83,7 @@ class Command(BaseCommand):
             self._print_result('failed messages', self.failed_message_pks)
         except DatabaseError:
             self.stdout.write('messages are already locked')
+        metrics.batch_duration.observe(
+            monotonic() - started_at, type=metrics.get_type_label(controller.backend_type_name)
+        )
+        controller.update_queue_depth_metrics()
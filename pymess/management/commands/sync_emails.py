@@ -2,9 +2,9 @@ import codecs
 import os
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.management.base import BaseCommand
 
 from pymess.config import get_email_template_model, settings
+from pymess.management.base import BaseCommand
 
 
 class Command(BaseCommand):
@@ -0,0 +1,231 @@
+import bisect
+import threading
+from collections import defaultdict
+
+from django.utils.module_loading import import_string
+
+from pymess.config import settings
+from pymess.utils import fullname
+
+
+DEFAULT_HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Metric:
+    """
+    Definition of the pymess metric. Values are not stored in the metric but they are passed to the configured
+    metrics exporter.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+    def get_label_values(self, labels):
+        return tuple('' if labels.get(label_name) is None else str(labels[label_name])
+                     for label_name in self.label_names)
+
+
+class Counter(Metric):
+
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        get_metrics_exporter().inc_counter(self, self.get_label_values(labels), value)
+
+
+class Gauge(Metric):
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        get_metrics_exporter().set_gauge(self, self.get_label_values(labels), value)
+
+
+class Histogram(Metric):
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, label_names, buckets=DEFAULT_HISTOGRAM_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        get_metrics_exporter().observe_histogram(self, self.get_label_values(labels), value)
+
+
+messages_created = Counter(
+    'pymess_messages_created_total', 'Number of created messages', ('type',)
+)
+messages_sent = Counter(
+    'pymess_messages_sent_total', 'Number of messages successfully sent to the provider', ('type', 'backend')
+)
+messages_failed = Counter(
+    'pymess_messages_failed_total', 'Number of messages which sending finally failed', ('type', 'backend')
+)
+messages_retried = Counter(
+    'pymess_messages_retried_total', 'Number of messages which sending failed and will be retried', ('type', 'backend')
+)
+message_state_updates = Counter(
+    'pymess_message_state_updates_total', 'Number of message state updates', ('type', 'backend', 'state')
+)
+provider_call_duration = Histogram(
+    'pymess_provider_call_duration_seconds', 'Duration of provider calls which publish messages',
+    ('type', 'backend')
+)
+status_check_duration = Histogram(
+    'pymess_status_check_duration_seconds', 'Duration of message state checks of one backend', ('type', 'backend')
+)
+status_checked_messages = Counter(
+    'pymess_status_checked_messages_total', 'Number of messages which state was checked', ('type', 'backend')
+)
+batch_duration = Histogram(
+    'pymess_batch_duration_seconds', 'Duration of batch sending of messages', ('type',)
+)
+queue_depth = Gauge(
+    'pymess_queue_depth', 'Number of messages waiting for sending', ('type', 'state', 'priority')
+)
+
+
+class BaseMetricsExporter:
+    """
+    Base class of metrics exporter. Exporter receives all measured values of pymess metrics. This implementation
+    ignores them and it is used if metrics are turned off.
+    """
+
+    def inc_counter(self, metric, label_values, value):
+        pass
+
+    def set_gauge(self, metric, label_values, value):
+        pass
+
+    def observe_histogram(self, metric, label_values, value):
+        pass
+
+    def render(self):
+        """
+        Returns metrics in the Prometheus text format or None if exporter doesn't support it
+        """
+        return None
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values):
+    if not label_names:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(label_name, _escape_label_value(label_value))
+        for label_name, label_value in zip(label_names, label_values)
+    ))
+
+
+class InMemoryMetricsExporter(BaseMetricsExporter):
+    """
+    Exporter stores metrics in the memory of the process and renders them in the Prometheus text format.
+    Every process has its own values, therefore it is suitable for single process deployments.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = defaultdict(dict)
+
+    def _register(self, metric):
+        self._metrics.setdefault(metric.name, metric)
+        return self._values[metric.name]
+
+    def inc_counter(self, metric, label_values, value):
+        with self._lock:
+            values = self._register(metric)
+            values[label_values] = values.get(label_values, 0) + value
+
+    def set_gauge(self, metric, label_values, value):
+        with self._lock:
+            self._register(metric)[label_values] = value
+
+    def observe_histogram(self, metric, label_values, value):
+        with self._lock:
+            values = self._register(metric)
+            if label_values not in values:
+                values[label_values] = {'buckets': [0] * len(metric.buckets), 'sum': 0, 'count': 0}
+            histogram = values[label_values]
+            bucket_index = bisect.bisect_left(metric.buckets, value)
+            if bucket_index < len(metric.buckets):
+                histogram['buckets'][bucket_index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def _render_histogram(self, metric, label_values, histogram):
+        lines = []
+        cumulative_count = 0
+        for bucket, bucket_count in zip(metric.buckets + (float('inf'),), histogram['buckets'] + [None]):
+            cumulative_count = histogram['count'] if bucket_count is None else cumulative_count + bucket_count
+            lines.append('{}_bucket{} {}'.format(
+                metric.name,
+                _format_labels(metric.label_names + ('le',), label_values + (_format_value(bucket),)),
+                _format_value(cumulative_count)
+            ))
+        labels = _format_labels(metric.label_names, label_values)
+        lines.append('{}_sum{} {}'.format(metric.name, labels, _format_value(histogram['sum'])))
+        lines.append('{}_count{} {}'.format(metric.name, labels, _format_value(histogram['count'])))
+        return lines
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                lines.append('# HELP {} {}'.format(name, metric.documentation))
+                lines.append('# TYPE {} {}'.format(name, metric.type))
+                for label_values, value in sorted(self._values[name].items()):
+                    if metric.type == 'histogram':
+                        lines += self._render_histogram(metric, label_values, value)
+                    else:
+                        lines.append('{}{} {}'.format(
+                            name, _format_labels(metric.label_names, label_values), _format_value(value)
+                        ))
+        return '\n'.join(lines) + '\n'
+
+
+_metrics_exporters = {}
+_metrics_exporters_lock = threading.Lock()
+
+
+def get_metrics_exporter():
+    """
+    Returns instance of the metrics exporter defined in the setting PYMESS_METRICS_EXPORTER. One instance is shared
+    in the process.
+    """
+    exporter_path = settings.METRICS_EXPORTER
+    if exporter_path not in _metrics_exporters:
+        with _metrics_exporters_lock:
+            if exporter_path not in _metrics_exporters:
+                _metrics_exporters[exporter_path] = (
+                    import_string(exporter_path)() if exporter_path else BaseMetricsExporter()
+                )
+    return _metrics_exporters[exporter_path]
+
+
+def get_type_label(backend_type):
+    """
+    Returns value of the metrics label type from the controller type (sms, email, dialer, push_notification).
+    """
+    return backend_type.name.lower() if backend_type else ''
+
+
+def get_backend_label(backend):
+    """
+    Returns value of the metrics label backend. Name of the backend from the configuration is preferred.
+    """
+    return backend.name or fullname(backend)
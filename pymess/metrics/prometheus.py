@@ -0,0 +1,44 @@
+import threading
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, generate_latest
+
+from pymess.metrics import BaseMetricsExporter
+
+
+class PrometheusClientMetricsExporter(BaseMetricsExporter):
+    """
+    Exporter registers pymess metrics to the registry of the prometheus_client library. Library handles metrics of
+    multi-process deployments if it is configured for multiprocess mode.
+    """
+
+    registry = REGISTRY
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collectors = {}
+
+    def _get_collector(self, metric, collector_class, **kwargs):
+        if metric.name not in self._collectors:
+            with self._lock:
+                if metric.name not in self._collectors:
+                    self._collectors[metric.name] = collector_class(
+                        metric.name, metric.documentation, metric.label_names, registry=self.registry, **kwargs
+                    )
+        return self._collectors[metric.name]
+
+    def _get_child(self, collector, label_values):
+        return collector.labels(*label_values) if label_values else collector
+
+    def inc_counter(self, metric, label_values, value):
+        self._get_child(self._get_collector(metric, Counter), label_values).inc(value)
+
+    def set_gauge(self, metric, label_values, value):
+        self._get_child(self._get_collector(metric, Gauge), label_values).set(value)
+
+    def observe_histogram(self, metric, label_values, value):
+        self._get_child(
+            self._get_collector(metric, Histogram, buckets=metric.buckets), label_values
+        ).observe(value)
+
+    def render(self):
+        return generate_latest(self.registry).decode('utf-8')
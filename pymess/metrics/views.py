@@ -0,0 +1,58 @@
+import hmac
+import threading
+import time
+
+from django.http import HttpResponse, Http404
+from django.views.generic import View
+
+from pymess.backend.dialer import DialerController
+from pymess.backend.emails import EmailController
+from pymess.backend.push import PushNotificationController
+from pymess.backend.sms import SMSController
+from pymess.config import settings
+from pymess.metrics import get_metrics_exporter
+
+
+class MetricsView(View):
+    """
+    View returns pymess metrics in the Prometheus text format. Requests must contain the bearer token from the setting
+    PYMESS_METRICS_VIEW_TOKEN or must be sent by a staff user. Queue depth metrics of the controllers are updated
+    at most once per PYMESS_METRICS_QUEUE_DEPTH_REFRESH_SECONDS.
+    """
+
+    controller_classes = (SMSController, EmailController, DialerController, PushNotificationController)
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    _queue_depth_lock = threading.Lock()
+    _queue_depth_updated_at = None
+
+    def has_permission(self, request):
+        if settings.METRICS_VIEW_TOKEN:
+            return hmac.compare_digest(
+                request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer {}'.format(settings.METRICS_VIEW_TOKEN)
+            )
+        else:
+            user = getattr(request, 'user', None)
+            return bool(user and user.is_staff)
+
+    def update_queue_depth_metrics(self):
+        with self._queue_depth_lock:
+            updated_at = MetricsView._queue_depth_updated_at
+            if (updated_at is not None
+                    and time.monotonic() - updated_at < settings.METRICS_QUEUE_DEPTH_REFRESH_SECONDS):
+                return
+            for controller_class in self.controller_classes:
+                controller_class().update_queue_depth_metrics()
+            MetricsView._queue_depth_updated_at = time.monotonic()
+
+    def get(self, request, *args, **kwargs):
+        if not self.has_permission(request):
+            return HttpResponse(status=403)
+
+        exporter = get_metrics_exporter()
+        self.update_queue_depth_metrics()
+
+        content = exporter.render()
+        if content is None:
+            raise Http404('Metrics exporter does not support rendering')
+        return HttpResponse(content, content_type=self.content_type)
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0027_migration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dialermessage',
+            name='backend_name',
+            field=models.CharField(blank=True, editable=False, max_length=250, null=True, verbose_name='backend name'),
+        ),
+        migrations.AddField(
+            model_name='emailmessage',
+            name='backend_name',
+            field=models.CharField(blank=True, editable=False, max_length=250, null=True, verbose_name='backend name'),
+        ),
+        migrations.AddField(
+            model_name='outputsmsmessage',
+            name='backend_name',
+            field=models.CharField(blank=True, editable=False, max_length=250, null=True, verbose_name='backend name'),
+        ),
+        migrations.AddField(
+            model_name='pushnotificationmessage',
+            name='backend_name',
+            field=models.CharField(blank=True, editable=False, max_length=250, null=True, verbose_name='backend name'),
+        ),
+    ]
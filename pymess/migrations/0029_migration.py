@@ -0,0 +1,72 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:31
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+from pymess.utils import generate_duplicate_key
+
+
+MESSAGE_RELATED_OBJECT_MODELS = (
+    ('DialerMessage', 'DialerMessageRelatedObject', 'dialer_message'),
+    ('EmailMessage', 'EmailRelatedObject', 'email_message'),
+    ('OutputSMSMessage', 'OutputSMSRelatedObject', 'output_sms_message'),
+    ('PushNotificationMessage', 'PushNotificationMessageRelatedObject', 'push_notification_message'),
+)
+
+
+def fill_duplicate_keys(apps, schema_editor):
+    for message_model_name, related_object_model_name, message_field_name in MESSAGE_RELATED_OBJECT_MODELS:
+        message_model = apps.get_model('pymess', message_model_name)
+        related_object_model = apps.get_model('pymess', related_object_model_name)
+
+        related_object_rows = related_object_model.objects.filter(
+            **{'{}__template_slug__isnull'.format(message_field_name): False}
+        ).order_by(
+            # Ordering by the message field would use the default ordering of the messages (created_at)
+            '{}_id'.format(message_field_name)
+        ).values_list(
+            message_field_name, '{}__template_slug'.format(message_field_name), 'content_type_id', 'object_id'
+        ).iterator(chunk_size=1000)
+
+        messages_to_update = []
+        for (message_pk, template_slug), rows in groupby(related_object_rows, key=lambda row: row[:2]):
+            messages_to_update.append(message_model(
+                pk=message_pk,
+                duplicate_key=generate_duplicate_key(template_slug, (row[2:] for row in rows))
+            ))
+            if len(messages_to_update) >= 1000:
+                message_model.objects.bulk_update(messages_to_update, ('duplicate_key',))
+                messages_to_update = []
+        message_model.objects.bulk_update(messages_to_update, ('duplicate_key',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0028_migration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dialermessage',
+            name='duplicate_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True, verbose_name='duplicate key'),
+        ),
+        migrations.AddField(
+            model_name='emailmessage',
+            name='duplicate_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True, verbose_name='duplicate key'),
+        ),
+        migrations.AddField(
+            model_name='outputsmsmessage',
+            name='duplicate_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True, verbose_name='duplicate key'),
+        ),
+        migrations.AddField(
+            model_name='pushnotificationmessage',
+            name='duplicate_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True, verbose_name='duplicate key'),
+        ),
+        migrations.RunPython(fill_duplicate_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0029_migration'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dialermessage',
+            index=models.Index(fields=['recipient', 'template_slug', 'created_at'], name='dialermessage_dedup'),
+        ),
+        migrations.AddIndex(
+            model_name='emailmessage',
+            index=models.Index(fields=['recipient', 'template_slug', 'created_at'], name='emailmessage_dedup'),
+        ),
+        migrations.AddIndex(
+            model_name='outputsmsmessage',
+            index=models.Index(fields=['recipient', 'template_slug', 'created_at'], name='outputsmsmessage_dedup'),
+        ),
+        migrations.AddIndex(
+            model_name='pushnotificationmessage',
+            index=models.Index(fields=['recipient', 'template_slug', 'created_at'], name='pushnotificationmessage_dedup'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:40
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.db.models.functions import Cast
+
+
+RELATED_OBJECT_MODELS = (
+    'DialerMessageRelatedObject',
+    'DialerTemplateDisallowedObject',
+    'EmailRelatedObject',
+    'EmailTemplateDisallowedObject',
+    'OutputSMSRelatedObject',
+    'PushNotificationMessageRelatedObject',
+    'SMSTemplateDisallowedObject',
+)
+
+CHUNK_SIZE = 10000
+
+
+def fill_object_keys(apps, schema_editor):
+    for model_name in RELATED_OBJECT_MODELS:
+        related_object_model = apps.get_model('pymess', model_name)
+        integer_related_objects_qs = related_object_model.objects.filter(object_id__regex=r'^-?[0-9]{1,18}$')
+        max_pk = related_object_model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+        for from_pk in range(0, max_pk + 1, CHUNK_SIZE):
+            integer_related_objects_qs.filter(pk__gte=from_pk, pk__lt=from_pk + CHUNK_SIZE).update(
+                object_key=Cast('object_id', output_field=models.BigIntegerField())
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0030_migration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dialermessagerelatedobject',
+            name='object_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='integer ID of the related object'),
+        ),
+        migrations.AddField(
+            model_name='dialertemplatedisallowedobject',
+            name='object_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='integer ID of the related object'),
+        ),
+        migrations.AddField(
+            model_name='emailrelatedobject',
+            name='object_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='integer ID of the related object'),
+        ),
+        migrations.AddField(
+            model_name='emailtemplatedisallowedobject',
+            name='object_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='integer ID of the related object'),
+        ),
+        migrations.AddField(
+            model_name='outputsmsrelatedobject',
+            name='object_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='integer ID of the related object'),
+        ),
+        migrations.AddField(
+            model_name='pushnotificationmessagerelatedobject',
+            name='object_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='integer ID of the related object'),
+        ),
+        migrations.AddField(
+            model_name='smstemplatedisallowedobject',
+            name='object_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='integer ID of the related object'),
+        ),
+        migrations.AddIndex(
+            model_name='dialermessagerelatedobject',
+            index=models.Index(fields=['content_type', 'object_key'], name='dialer_related_object_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailrelatedobject',
+            index=models.Index(fields=['content_type', 'object_key'], name='email_related_object_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outputsmsrelatedobject',
+            index=models.Index(fields=['content_type', 'object_key'], name='sms_related_object_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pushnotificationmessagerelatedobject',
+            index=models.Index(fields=['content_type', 'object_key'], name='push_related_object_key_idx'),
+        ),
+        migrations.RunPython(fill_object_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import pymess.models.emails
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0031_migration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailContent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created at')),
+                ('changed_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='changed at')),
+                ('content_hash', models.CharField(max_length=64, unique=True, verbose_name='content hash')),
+                ('file', models.FileField(max_length=250, upload_to=pymess.models.emails.generate_compressed_content_filename, verbose_name='file')),
+            ],
+            options={
+                'verbose_name': 'e-mail content',
+                'verbose_name_plural': 'e-mail contents',
+            },
+        ),
+        migrations.AlterField(
+            model_name='emailmessage',
+            name='content_file',
+            field=models.FileField(blank=True, upload_to=pymess.models.emails.generate_content_filename, verbose_name='content file'),
+        ),
+        migrations.AddField(
+            model_name='emailmessage',
+            name='compressed_content',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='email_messages', to='pymess.emailcontent', verbose_name='compressed content'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:58
+
+from django.db import migrations, models
+import pymess.models.emails
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0032_migration'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attachment',
+            name='file',
+            field=models.FileField(max_length=250, upload_to=pymess.models.emails.generate_attachment_filename, verbose_name='file'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0033_migration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outputsmsmessage',
+            name='external_id',
+            field=models.CharField(blank=True, db_index=True, max_length=250, null=True, verbose_name='external ID'),
+        ),
+        migrations.AddField(
+            model_name='pushnotificationmessage',
+            name='external_id',
+            field=models.CharField(blank=True, db_index=True, max_length=250, null=True, verbose_name='external ID'),
+        ),
+        migrations.AlterField(
+            model_name='pushnotificationmessage',
+            name='state',
+            field=models.PositiveIntegerField(choices=[(1, 'waiting'), (2, 'sent'), (3, 'error'), (4, 'debug'), (5, 'error retry'), (6, 'delivered')], db_index=True, editable=False, verbose_name='state'),
+        ),
+    ]
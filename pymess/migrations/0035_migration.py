@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:14
+
+from django.db import migrations, models
+
+
+def fill_dialer_external_ids(apps, schema_editor):
+    dialer_message_model = apps.get_model('pymess', 'DialerMessage')
+
+    messages_to_update = []
+    for message in dialer_message_model.objects.filter(is_final_state=False, sent_at__isnull=False).only(
+            'pk', 'extra_data').iterator(chunk_size=1000):
+        name = (message.extra_data or {}).get('name')
+        if name:
+            message.external_id = name
+            messages_to_update.append(message)
+        if len(messages_to_update) >= 1000:
+            dialer_message_model.objects.bulk_update(messages_to_update, ('external_id',))
+            messages_to_update = []
+    dialer_message_model.objects.bulk_update(messages_to_update, ('external_id',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0034_migration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dialermessage',
+            name='external_id',
+            field=models.CharField(blank=True, db_index=True, max_length=250, null=True, verbose_name='external ID'),
+        ),
+        migrations.RunPython(fill_dialer_external_ids, migrations.RunPython.noop),
+    ]
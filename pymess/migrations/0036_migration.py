@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:26
+
+from django.db import migrations
+
+
+CHUNK_SIZE = 1000
+
+
+def fill_external_ids_from_data(message_model, data_field_name, get_external_id):
+    messages_to_update = []
+    for message in message_model.objects.filter(external_id__isnull=True).exclude(
+            **{'{}__isnull'.format(data_field_name): True}).only('pk', data_field_name).iterator(chunk_size=CHUNK_SIZE):
+        external_id = get_external_id(message, getattr(message, data_field_name))
+        if external_id:
+            message.external_id = str(external_id)
+            messages_to_update.append(message)
+        if len(messages_to_update) >= CHUNK_SIZE:
+            message_model.objects.bulk_update(messages_to_update, ('external_id',))
+            messages_to_update = []
+    message_model.objects.bulk_update(messages_to_update, ('external_id',))
+
+
+def fill_external_ids(apps, schema_editor):
+    fill_external_ids_from_data(
+        apps.get_model('pymess', 'DialerMessage'),
+        'extra_data',
+        lambda message, extra_data: extra_data.get('name') if isinstance(extra_data, dict) else None
+    )
+    fill_external_ids_from_data(
+        apps.get_model('pymess', 'PushNotificationMessage'),
+        'extra_sender_data',
+        lambda message, extra_sender_data: (
+            extra_sender_data.get('result', {}).get('id')
+            if isinstance(extra_sender_data, dict) and isinstance(extra_sender_data.get('result'), dict) else None
+        )
+    )
+    # SMS operator backends identify messages with the configured prefix and primary key of the message
+    fill_external_ids_from_data(
+        apps.get_model('pymess', 'OutputSMSMessage'),
+        'extra_sender_data',
+        lambda message, extra_sender_data: (
+            '{}-{}'.format(extra_sender_data['prefix'], message.pk)
+            if isinstance(extra_sender_data, dict) and 'prefix' in extra_sender_data else None
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0035_migration'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_external_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0036_migration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created at')),
+                ('changed_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='changed at')),
+                ('message_type', models.CharField(max_length=20, verbose_name='message type')),
+                ('bucket', models.DateTimeField(verbose_name='bucket')),
+                ('backend', models.CharField(blank=True, max_length=250, null=True, verbose_name='backend')),
+                ('template_slug', models.SlugField(blank=True, max_length=100, null=True, verbose_name='slug')),
+                ('tag', models.SlugField(blank=True, null=True, verbose_name='tag')),
+                ('state', models.IntegerField(verbose_name='state')),
+                ('count', models.PositiveIntegerField(verbose_name='count')),
+            ],
+            options={
+                'verbose_name': 'message statistics',
+                'verbose_name_plural': 'message statistics',
+                'ordering': ('-bucket',),
+            },
+        ),
+        migrations.CreateModel(
+            name='MessageStatisticsRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created at')),
+                ('changed_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='changed at')),
+                ('message_type', models.CharField(max_length=20, unique=True, verbose_name='message type')),
+                ('rolled_up_at', models.DateTimeField(blank=True, null=True, verbose_name='rolled up at')),
+            ],
+            options={
+                'verbose_name': 'message statistics rollup',
+                'verbose_name_plural': 'message statistics rollups',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='messagestatistics',
+            index=models.Index(fields=['message_type', 'bucket'], name='message_statistics_bucket_idx'),
+        ),
+    ]
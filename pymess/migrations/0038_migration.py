@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pymess', '0037_migration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dialermessage',
+            name='last_webhook_received_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='last webhook received at'),
+        ),
+    ]
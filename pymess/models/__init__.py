@@ -2,3 +2,4 @@ from .dialer import *
 from .emails import *
 from .push import *
 from .sms import *
+from .statistics import *
@@ -1,32 +1,81 @@
+import re
+import threading
+from collections import defaultdict
+from datetime import timedelta
 from functools import reduce
 from operator import or_ as OR
+from time import monotonic
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
 from django.db.models.functions import Cast
+from django.db.models.signals import class_prepared, post_delete, post_save
+from django.dispatch import receiver
 from django.template import Context, Template
 from django.template.exceptions import TemplateDoesNotExist, TemplateSyntaxError
+from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 
 from chamber.models import SmartModel
 
 from pymess.config import settings
+from pymess.tracing import start_span
+from pymess.utils import generate_duplicate_key
+
+
+# integer IDs which fit to the BigIntegerField
+OBJECT_KEY_RE = re.compile(r'^-?\d{1,18}$')
+
+
+def has_integer_pk(model_class):
+    """
+    Returns True if primary key of the model is stored in the object_key field of related objects
+    """
+    return isinstance(model_class._meta.pk, models.IntegerField)
+
+
+def get_object_key(object_id):
+    """
+    Returns integer value of the related object ID or None if the ID is not an integer
+    """
+    object_id = str(object_id)
+    return int(object_id) if OBJECT_KEY_RE.match(object_id) else None
+
+
+def get_content_types_by_model(related_objects):
+    """
+    Returns dict {model class: content type} for the related objects. Content types are resolved once per model.
+    """
+    return ContentType.objects.get_for_models(*{type(related_object) for related_object in related_objects})
+
+
+def group_related_object_ids_by_content_type(related_objects):
+    """
+    Returns dict {content type: list of related object IDs}
+    """
+    content_types = get_content_types_by_model(related_objects)
+    related_object_ids = defaultdict(list)
+    for related_object in related_objects:
+        related_object_ids[content_types[type(related_object)]].append(str(related_object.pk))
+    return related_object_ids
 
 
 class RelatedObjectQueryset(models.QuerySet):
 
     def annotate_object_pks(self, model_class):
         pk_field = model_class._meta.pk
-        if isinstance(pk_field, models.AutoField):
-            pk_field = models.IntegerField()
+        if has_integer_pk(model_class):
+            object_pk = F('object_key')
+        else:
+            object_pk = Cast('object_id', output_field=pk_field)
         return self.filter(
             content_type=ContentType.objects.get_for_model(model_class)
         ).annotate(
-            object_pk=Cast('object_id', output_field=pk_field)
+            object_pk=object_pk
         )
 
 
@@ -39,20 +88,38 @@ class RelatedObjectManager(models.Manager):
         )
 
     def create_from_related_objects(self, *related_objects):
+        content_types = get_content_types_by_model(related_objects)
         return [
-            self.create_from_related_object(related_object)
+            self.create(
+                object_id=related_object.pk,
+                content_type=content_types[type(related_object)]
+            )
             for related_object in related_objects
         ]
 
+    def bulk_create_from_related_objects(self, *related_objects):
+        """
+        Creates related objects with one query. Model save method, validation and signals are not called.
+        """
+        related_manager_kwargs = getattr(self, 'core_filters', {})
+        content_types = get_content_types_by_model(related_objects)
+        return self.bulk_create([
+            self.model(
+                object_id=related_object.pk,
+                object_key=get_object_key(related_object.pk),
+                content_type=content_types[type(related_object)],
+                **related_manager_kwargs
+            )
+            for related_object in related_objects
+        ])
+
     def _get_related_object_pks(self, *related_objects):
         return [related_object.pk for related_object in related_objects]
 
     def _get_related_objects_qs_kwargs(self, *related_objects):
         return reduce(OR, (
-            Q(**{
-                'object_id': obj.pk,
-                'content_type': ContentType.objects.get_for_model(obj)
-            }) for obj in related_objects
+            Q(content_type=content_type, object_id__in=object_ids)
+            for content_type, object_ids in group_related_object_ids_by_content_type(related_objects).items()
         ))
 
     def update_related_objects(self, *related_objects, limit_to_model=None):
@@ -71,10 +138,24 @@ class RelatedObjectManager(models.Manager):
         )
 
     def get_or_create_from_related_objects(self, *related_objects):
-        return [
-            self.get_or_create_from_related_object(related_object)
-            for related_object in related_objects
-        ]
+        if not related_objects:
+            return []
+
+        content_types = get_content_types_by_model(related_objects)
+        existing_related_objects = {
+            (related_object.content_type_id, related_object.object_id): related_object
+            for related_object in self.filter(self._get_related_objects_qs_kwargs(*related_objects))
+        }
+        result = []
+        for related_object in related_objects:
+            content_type = content_types[type(related_object)]
+            key = (content_type.pk, str(related_object.pk))
+            if key in existing_related_objects:
+                result.append((existing_related_objects[key], False))
+            else:
+                existing_related_objects[key] = self.create(object_id=related_object.pk, content_type=content_type)
+                result.append((existing_related_objects[key], True))
+        return result
 
     def get_related_objects_by_model(self, model_class):
         return model_class.objects.filter(pk__in=self.annotate_object_pks(model_class).values('object_pk'))
@@ -87,26 +168,66 @@ class RelatedObjectManager(models.Manager):
         return self.model.objects.filter(template_filter).filter(self._get_related_objects_qs_kwargs(*related_objects))
 
 
+def get_query_window_start():
+    """
+    Returns the oldest creation time of the messages which are processed by the batch sending, state checks and
+    webhooks or None if the window is not limited. With partitioned tables it allows pruning of the old partitions.
+    """
+    if settings.QUERY_WINDOW_DAYS is None:
+        return None
+    return now() - timedelta(days=settings.QUERY_WINDOW_DAYS)
+
+
 class MessageQueryset(models.QuerySet):
 
+    def filter_query_window(self):
+        query_window_start = get_query_window_start()
+        return self if query_window_start is None else self.filter(created_at__gte=query_window_start)
+
     def filter_related_object(self, related_object):
+        if has_integer_pk(type(related_object)):
+            object_filter = {'related_objects__object_key': related_object.pk}
+        else:
+            object_filter = {'related_objects__object_id': str(related_object.pk)}
         return self.filter(
-            related_objects__object_id=str(related_object.pk),
-            related_objects__content_type=ContentType.objects.get_for_model(related_object)
+            related_objects__content_type=ContentType.objects.get_for_model(related_object),
+            **object_filter
         )
 
     def filter_related_objects(self, related_objects_queryset):
+        if has_integer_pk(related_objects_queryset.model):
+            object_filter = {'related_objects__object_key__in': related_objects_queryset.values('pk')}
+        else:
+            object_filter = {
+                'related_objects__object_id__in': related_objects_queryset.annotate(
+                    object_str_pk=Cast('pk', output_field=models.TextField())
+                ).values('object_str_pk')
+            }
         return self.filter(
-            related_objects__object_id__in=related_objects_queryset.annotate(
-                object_str_pk=Cast('pk', output_field=models.TextField())
-            ).values('object_str_pk'),
-            related_objects__content_type=ContentType.objects.get_for_model(related_objects_queryset.model)
+            related_objects__content_type=ContentType.objects.get_for_model(related_objects_queryset.model),
+            **object_filter
         )
 
+    def filter_external_id(self, external_id):
+        return self.filter_query_window().filter(external_id=external_id)
+
+    def filter_external_ids(self, external_ids):
+        return self.filter_query_window().filter(external_id__in=list(external_ids))
+
+    def get_external_id_map(self, external_ids):
+        """
+        Returns dict where key is external ID and value is list of messages with the external ID
+        """
+        external_id_map = defaultdict(list)
+        for message in self.filter_external_ids(external_ids):
+            external_id_map[message.external_id].append(message)
+        return dict(external_id_map)
+
 
 class MessageManager(models.Manager):
 
     def was_sent(self, template_slug, related_object):
+        # Query window is not applied, template which was ever sent to the related object must not be sent again
         return self.filter(
             template_slug=template_slug,
         ).filter_related_object(related_object).exists()
@@ -120,6 +241,11 @@ class BaseMessage(SmartModel):
     template_slug = models.SlugField(verbose_name=_('slug'), max_length=100, null=True, blank=True, editable=False,
                                      db_index=True)
     backend = models.CharField(verbose_name=_('backend'), null=True, blank=True, editable=False, max_length=250)
+    backend_name = models.CharField(verbose_name=_('backend name'), null=True, blank=True, editable=False,
+                                    max_length=250)
+    external_id = models.CharField(verbose_name=_('external ID'), blank=True, null=True, db_index=True, max_length=250)
+    duplicate_key = models.CharField(verbose_name=_('duplicate key'), null=True, blank=True, editable=False,
+                                     max_length=64, db_index=True)
     error = models.TextField(verbose_name=_('error'), null=True, blank=True, editable=False)
     extra_data = models.JSONField(verbose_name=_('extra data'), null=True, blank=True, editable=False,
                                   encoder=DjangoJSONEncoder)
@@ -139,6 +265,9 @@ class BaseMessage(SmartModel):
     class Meta:
         abstract = True
         ordering = ('-created_at',)
+        indexes = (
+            models.Index(fields=('recipient', 'template_slug', 'created_at'), name='%(class)s_dedup'),
+        )
 
 
 class BaseRelatedObject(SmartModel):
@@ -146,6 +275,8 @@ class BaseRelatedObject(SmartModel):
     content_type = models.ForeignKey(ContentType, verbose_name=_('content type of the related object'),
                                      null=False, blank=False, on_delete=models.CASCADE)
     object_id = models.TextField(verbose_name=_('ID of the related object'), null=False, blank=False, db_index=True)
+    object_key = models.BigIntegerField(verbose_name=_('integer ID of the related object'), null=True, blank=True,
+                                        editable=False)
     content_object = GenericForeignKey('content_type', 'object_id')
 
     objects = RelatedObjectManager.from_queryset(RelatedObjectQueryset)()
@@ -157,6 +288,69 @@ class BaseRelatedObject(SmartModel):
     def __str__(self):
         return str(self.content_object)
 
+    def _pre_save(self, changed, changed_fields, *args, **kwargs):
+        super()._pre_save(changed, changed_fields, *args, **kwargs)
+        self.object_key = get_object_key(self.object_id)
+
+
+class BaseTemplateDisallowedObject(BaseRelatedObject):
+    """
+    Object for which template cannot be sent. Model must define foreign key "template", global disallowed objects have
+    empty template.
+    """
+
+    class Meta(BaseRelatedObject.Meta):
+        abstract = True
+
+
+class DisallowedObjectsCache:
+    """
+    In-memory cache of disallowed objects pairs (content type ID, object ID) per template and for global disallowed
+    objects (template is NULL). Cache is invalidated when disallowed object is saved or deleted in the current process,
+    other processes reload it after PYMESS_DISALLOWED_OBJECTS_CACHE_TIMEOUT_SECONDS. The cache is turned off by default.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def is_turned_on(self):
+        return bool(settings.DISALLOWED_OBJECTS_CACHE_TIMEOUT_SECONDS)
+
+    def _load(self, disallowed_object_model, template_pk):
+        return frozenset(
+            disallowed_object_model.objects.filter(template=template_pk).values_list('content_type_id', 'object_id')
+        )
+
+    def get(self, disallowed_object_model, template_pk):
+        key = (disallowed_object_model, template_pk)
+        cached_value = self._cache.get(key)
+        if (cached_value is None
+                or monotonic() - cached_value[0] > settings.DISALLOWED_OBJECTS_CACHE_TIMEOUT_SECONDS):
+            cached_value = (monotonic(), self._load(disallowed_object_model, template_pk))
+            with self._lock:
+                self._cache[key] = cached_value
+        return cached_value[1]
+
+    def invalidate(self, disallowed_object_model):
+        with self._lock:
+            for key in [key for key in self._cache if key[0] is disallowed_object_model]:
+                del self._cache[key]
+
+
+disallowed_objects_cache = DisallowedObjectsCache()
+
+
+def invalidate_disallowed_objects_cache(sender, **kwargs):
+    disallowed_objects_cache.invalidate(sender)
+
+
+@receiver(class_prepared)
+def connect_disallowed_objects_cache_invalidation(sender, **kwargs):
+    if issubclass(sender, BaseTemplateDisallowedObject) and not sender._meta.abstract:
+        post_save.connect(invalidate_disallowed_objects_cache, sender=sender)
+        post_delete.connect(invalidate_disallowed_objects_cache, sender=sender)
+
 
 class BaseAbstractTemplate(SmartModel):
 
@@ -176,7 +370,8 @@ class BaseAbstractTemplate(SmartModel):
         return Template(text).render(Context(context_data))
 
     def render_body(self, context_data, recipient=None):
-        return self.render_text_template(self.get_body(), context_data, recipient)
+        with start_span('render_body', template_slug=self.slug):
+            return self.render_text_template(self.get_body(), context_data, recipient)
 
     def clean_body(self, context_data=None):
         try:
@@ -195,20 +390,40 @@ class BaseAbstractTemplate(SmartModel):
             )
             and (
                 not hasattr(self, 'disallowed_objects')
-                or related_objects is None
-                or not self.disallowed_objects.filter_from_related_objects(*related_objects).exists()
+                or not related_objects
+                or not self.exist_disallowed_objects(related_objects)
             )
         )
 
+    def exist_disallowed_objects(self, related_objects):
+        if disallowed_objects_cache.is_turned_on():
+            disallowed_object_model = self.disallowed_objects.model
+            return not (
+                disallowed_objects_cache.get(disallowed_object_model, self.pk)
+                | disallowed_objects_cache.get(disallowed_object_model, None)
+            ).isdisjoint(
+                (content_type.pk, object_id)
+                for content_type, object_ids in group_related_object_ids_by_content_type(related_objects).items()
+                for object_id in object_ids
+            )
+        else:
+            return self.disallowed_objects.filter_from_related_objects(*related_objects).exists()
+
+    def get_duplicate_key(self, related_objects):
+        """
+        Returns hash of the template and related objects which is stored with the message to find duplicate messages
+        """
+        return generate_duplicate_key(self.slug, (
+            (content_type.pk, object_id)
+            for content_type, object_ids in group_related_object_ids_by_content_type(related_objects).items()
+            for object_id in object_ids
+        ))
+
     def exist_duplicate_messages(self, related_objects):
         if related_objects:
-            qs = self.get_controller().model.objects.filter(template=self)
-            for obj in related_objects:
-                qs = qs.filter(
-                    related_objects__object_id=obj.pk,
-                    related_objects__content_type=ContentType.objects.get_for_model(obj)
-                )
-            return qs.exists()
+            return self.get_controller().model.objects.filter(
+                duplicate_key=self.get_duplicate_key(related_objects)
+            ).exists()
         else:
             return False
 
@@ -218,8 +433,12 @@ class BaseAbstractTemplate(SmartModel):
     def get_controller(self):
         raise NotImplementedError
 
-    def send(self, recipient, context_data, related_objects=None, tag=None, **kwargs):
-        if self.can_send(recipient, related_objects):
+    def was_sent_recently(self, recipient, dedup_window_seconds):
+        return bool(self.get_controller().get_recently_sent_recipients([recipient], self.slug, dedup_window_seconds))
+
+    def send(self, recipient, context_data, related_objects=None, tag=None, dedup_window_seconds=None, **kwargs):
+        if (self.can_send(recipient, related_objects)
+                and not (dedup_window_seconds and self.was_sent_recently(recipient, dedup_window_seconds))):
             return self.get_controller().send(
                 recipient=recipient,
                 content=self.render_body(context_data, recipient),
@@ -7,7 +7,7 @@ from pymess.config import settings
 from pymess.enums import DialerMessageState
 from pymess.utils import normalize_phone_number
 
-from .common import BaseAbstractTemplate, BaseMessage, BaseRelatedObject
+from .common import BaseAbstractTemplate, BaseMessage, BaseRelatedObject, BaseTemplateDisallowedObject
 
 
 __all__ = (
@@ -55,6 +55,12 @@ class AbstractDialerMessage(BaseMessage):
 class DialerMessage(AbstractDialerMessage):
 
     is_final_state = models.BooleanField(verbose_name=_('is final state'), null=False, default=False)
+    last_webhook_received_at = models.DateTimeField(
+        verbose_name=_('last webhook received at'),
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     def __str__(self):
         return '{recipient}, {template_slug}, {state}'.format(
@@ -69,6 +75,9 @@ class DialerMessageRelatedObject(BaseRelatedObject):
     class Meta(BaseRelatedObject.Meta):
         verbose_name = _('related object of a dialer message')
         verbose_name_plural = _('related objects of dialer messages')
+        indexes = (
+            models.Index(fields=('content_type', 'object_key'), name='dialer_related_object_key_idx'),
+        )
 
 
 class AbstractDialerTemplate(BaseAbstractTemplate):
@@ -90,7 +99,7 @@ class DialerTemplate(AbstractDialerTemplate):
     pass
 
 
-class DialerTemplateDisallowedObject(BaseRelatedObject):
+class DialerTemplateDisallowedObject(BaseTemplateDisallowedObject):
 
     template = models.ForeignKey(
         verbose_name=_('template'),
@@ -101,6 +110,6 @@ class DialerTemplateDisallowedObject(BaseRelatedObject):
         db_index=True
     )
 
-    class Meta(BaseRelatedObject.Meta):
+    class Meta(BaseTemplateDisallowedObject.Meta):
         verbose_name = _('disallowed object of a dialer template')
         verbose_name_plural = _('disallowed objects of dialer templates')
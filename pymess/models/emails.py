@@ -1,3 +1,7 @@
+import hashlib
+import os
+import zlib
+
 import import_string
 from pathlib import Path
 from uuid import uuid4
@@ -6,21 +10,24 @@ from chamber.models import SmartModel
 
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
 from django.utils.functional import cached_property
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils.translation import ugettext, ugettext_lazy as _
 from django.template import Template, Context
 from django.template.exceptions import TemplateSyntaxError, TemplateDoesNotExist
 
 from pymess.config import settings
 from pymess.enums import EmailMessageState
+from pymess.tracing import start_span
 from pymess.utils.html import raise_error_if_contains_banned_tags
 
-from .common import BaseAbstractTemplate, BaseMessage, BaseRelatedObject, MessageQueryset
+from .common import BaseAbstractTemplate, BaseMessage, BaseRelatedObject, BaseTemplateDisallowedObject, MessageQueryset
 
 
 __all__ = (
     'EmailMessage',
+    'EmailContent',
     'EmailRelatedObject',
     'EmailTemplate',
     'Attachment',
@@ -34,19 +41,78 @@ def generate_content_filename(instance, filename):
     return Path(settings.EMAIL_STORAGE_PATH) / 'contents' / 'content_{}.txt'.format(uuid4())
 
 
+def generate_compressed_content_filename(instance, filename):
+    return Path(settings.EMAIL_STORAGE_PATH) / 'compressed_contents' / instance.content_hash[:2] / '{}.zlib'.format(
+        instance.content_hash
+    )
+
+
 def generate_attachment_filename(instance, filename):
     return Path(settings.EMAIL_STORAGE_PATH) / 'attachments' / filename
 
 
+def generate_deduplicated_attachment_filename(content_hash, filename):
+    return Path(settings.EMAIL_STORAGE_PATH) / 'attachments' / content_hash / filename
+
+
 def generate_template_attachment_filename(instance, filename):
     return Path(settings.EMAIL_STORAGE_PATH) / 'template_attachments' / filename
 
 
+class EmailContentManager(models.Manager):
+
+    def get_or_create_from_content(self, content):
+        """
+        Returns stored content object with the same content hash or creates a new one with the compressed content file
+        """
+        encoded_content = content.encode()
+        content_hash = hashlib.sha256(encoded_content).hexdigest()
+        email_content = self.filter(content_hash=content_hash).first()
+        if email_content is None:
+            email_content = self.model(content_hash=content_hash)
+            email_content.file.save(None, ContentFile(zlib.compress(encoded_content)), save=False)
+            try:
+                with transaction.atomic():
+                    email_content.save()
+            except IntegrityError:
+                # content was stored by another process in the meantime
+                email_content.file.delete(save=False)
+                email_content = self.get(content_hash=content_hash)
+        return email_content
+
+
+class EmailContent(SmartModel):
+
+    content_hash = models.CharField(verbose_name=_('content hash'), null=False, blank=False, max_length=64,
+                                    unique=True)
+    file = models.FileField(verbose_name=_('file'), null=False, blank=False, max_length=250,
+                            upload_to=generate_compressed_content_filename)
+
+    objects = EmailContentManager()
+
+    class Meta:
+        verbose_name = _('e-mail content')
+        verbose_name_plural = _('e-mail contents')
+
+    def __str__(self):
+        return self.content_hash
+
+    @cached_property
+    def content(self):
+        return zlib.decompress(self.file.read()).decode()
+
+
 class EmailMessageQuerySet(MessageQueryset):
 
     def create(self, content, **kwargs):
         message = self.model(**kwargs)
-        message.content_file.save(None, ContentFile(content.encode()))
+        with start_span('store_email_content', template_slug=message.template_slug,
+                        is_compressed=settings.EMAIL_STORE_COMPRESSED_CONTENT):
+            if settings.EMAIL_STORE_COMPRESSED_CONTENT:
+                message.compressed_content = EmailContent.objects.get_or_create_from_content(content)
+                message.save()
+            else:
+                message.content_file.save(None, ContentFile(content.encode()))
         return message
 
 
@@ -63,7 +129,6 @@ class EmailMessage(BaseMessage):
     sender = models.EmailField(verbose_name=_('sender'), blank=False, null=False)
     sender_name = models.CharField(verbose_name=_('sender name'), blank=True, null=True, max_length=250)
     subject = models.TextField(verbose_name=_('subject'), blank=False, null=False)
-    external_id = models.CharField(verbose_name=_('external ID'), blank=True, null=True, db_index=True, max_length=250)
     last_webhook_received_at = models.DateTimeField(
         verbose_name=_('last webhook received at'),
         null=True,
@@ -79,9 +144,18 @@ class EmailMessage(BaseMessage):
     content_file = models.FileField(
         verbose_name=_('content file'),
         null=False,
-        blank=False,
+        blank=True,
         upload_to=generate_content_filename,
     )
+    compressed_content = models.ForeignKey(
+        EmailContent,
+        verbose_name=_('compressed content'),
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name='email_messages',
+        editable=False,
+    )
 
     objects = EmailMessageQuerySet.as_manager()
 
@@ -105,7 +179,10 @@ class EmailMessage(BaseMessage):
 
     @cached_property
     def content(self):
-        return self.content_file.read().decode()
+        if self.compressed_content_id:
+            return self.compressed_content.content
+        else:
+            return self.content_file.read().decode()
 
 
 class EmailRelatedObject(BaseRelatedObject):
@@ -116,10 +193,18 @@ class EmailRelatedObject(BaseRelatedObject):
     class Meta(BaseRelatedObject.Meta):
         verbose_name = _('related object of a e-mail message')
         verbose_name_plural = _('related objects of e-mail messages')
+        indexes = (
+            models.Index(fields=('content_type', 'object_key'), name='email_related_object_key_idx'),
+        )
 
 
 class AttachmentManager(models.Manager):
 
+    def _get_or_store_deduplicated_file(self, storage, filename, file):
+        content = b''.join(file.chunks())
+        file_name = str(generate_deduplicated_attachment_filename(hashlib.sha256(content).hexdigest(), filename))
+        return file_name if storage.exists(file_name) else storage.save(file_name, ContentFile(content))
+
     def create_from_tripple(self, tripple):
         filename, file, content_type = tripple
         attachment = self.model(
@@ -127,7 +212,15 @@ class AttachmentManager(models.Manager):
             content_type=content_type,
             filename=filename
         )
-        attachment.file.save(filename, file, save=True)
+        if settings.EMAIL_DEDUPLICATE_ATTACHMENTS and isinstance(file, FieldFile) and file.name:
+            # File is already stored (template attachment), therefore only its name is referenced
+            attachment.file = file.name
+            attachment.save()
+        elif settings.EMAIL_DEDUPLICATE_ATTACHMENTS:
+            attachment.file = self._get_or_store_deduplicated_file(attachment.file.storage, filename, file)
+            attachment.save()
+        else:
+            attachment.file.save(filename, file, save=True)
         return attachment
 
     def create_from_tripples(self, *tripples):
@@ -141,7 +234,7 @@ class Attachment(SmartModel):
     email_message = models.ForeignKey(EmailMessage, verbose_name=_('e-mail message'), on_delete=models.CASCADE,
                                       related_name='attachments')
     content_type = models.CharField(verbose_name=_('content type'), blank=False, null=False, max_length=100)
-    file = models.FileField(verbose_name=_('file'), null=False, blank=False,
+    file = models.FileField(verbose_name=_('file'), null=False, blank=False, max_length=250,
                             upload_to=generate_attachment_filename)
     filename = models.CharField(verbose_name=_('filename'), blank=True, null=True, max_length=100)
 
@@ -180,8 +273,9 @@ class AbstractEmailTemplate(BaseAbstractTemplate):
         return self.subject
 
     def render_subject(self, context_data, recipient=None):
-        context_data = self._update_context_data(context_data, recipient)
-        return Template(self.get_subject()).render(Context(context_data))
+        with start_span('render_subject', template_slug=self.slug):
+            context_data = self._update_context_data(context_data, recipient)
+            return Template(self.get_subject()).render(Context(context_data))
 
     def send(self, recipient, context_data, related_objects=None, tag=None, attachments=None,
              priority=settings.DEFAULT_MESSAGE_PRIORITY, **kwargs):
@@ -240,7 +334,7 @@ class EmailTemplate(AbstractEmailTemplate):
         attachments += [
             (
                 template_attachment.filename or os.path.basename(template_attachment.file.name),
-                ContentFile(template_attachment.file.read()),
+                template_attachment.file,
                 template_attachment.content_type,
             ) for template_attachment in self.template_attachments.all()
         ]
@@ -255,7 +349,7 @@ class EmailTemplate(AbstractEmailTemplate):
         )
 
 
-class EmailTemplateDisallowedObject(BaseRelatedObject):
+class EmailTemplateDisallowedObject(BaseTemplateDisallowedObject):
 
     template = models.ForeignKey(
         verbose_name=_('template'),
@@ -266,7 +360,7 @@ class EmailTemplateDisallowedObject(BaseRelatedObject):
         db_index=True
     )
 
-    class Meta(BaseRelatedObject.Meta):
+    class Meta(BaseTemplateDisallowedObject.Meta):
         verbose_name = _('disallowed object of an e-mail template')
         verbose_name_plural = _('disallowed objects of e-mail templates')
 
@@ -54,6 +54,9 @@ class PushNotificationMessageRelatedObject(BaseRelatedObject):
     class Meta(BaseRelatedObject.Meta):
         verbose_name = _('related object of a push notification message')
         verbose_name_plural = _('related objects of a push notification message')
+        indexes = (
+            models.Index(fields=('content_type', 'object_key'), name='push_related_object_key_idx'),
+        )
 
 
 class AbstractPushNotificationTemplate(BaseAbstractTemplate):
@@ -7,7 +7,7 @@ from pymess.config import settings
 from pymess.utils import normalize_phone_number
 from pymess.enums import OutputSMSMessageState
 
-from .common import BaseAbstractTemplate, BaseMessage, BaseRelatedObject
+from .common import BaseAbstractTemplate, BaseMessage, BaseRelatedObject, BaseTemplateDisallowedObject
 
 
 __all__ = (
@@ -55,6 +55,9 @@ class OutputSMSRelatedObject(BaseRelatedObject):
     class Meta(BaseRelatedObject.Meta):
         verbose_name = _('related object of a SMS message')
         verbose_name_plural = _('related objects of SMS messages')
+        indexes = (
+            models.Index(fields=('content_type', 'object_key'), name='sms_related_object_key_idx'),
+        )
 
 
 class AbstractSMSTemplate(BaseAbstractTemplate):
@@ -73,7 +76,7 @@ class SMSTemplate(AbstractSMSTemplate):
     pass
 
 
-class SMSTemplateDisallowedObject(BaseRelatedObject):
+class SMSTemplateDisallowedObject(BaseTemplateDisallowedObject):
 
     template = models.ForeignKey(
         verbose_name=_('template'),
@@ -84,6 +87,6 @@ class SMSTemplateDisallowedObject(BaseRelatedObject):
         db_index=True
     )
 
-    class Meta(BaseRelatedObject.Meta):
+    class Meta(BaseTemplateDisallowedObject.Meta):
         verbose_name = _('disallowed object of an SMS template')
         verbose_name_plural = _('disallowed objects of SMS templates')
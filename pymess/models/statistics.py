@@ -0,0 +1,149 @@
+from datetime import timedelta, timezone as datetime_timezone
+
+from django.db import models, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils.timezone import now
+from django.utils.translation import ugettext_lazy as _
+
+from chamber.models import SmartModel
+
+from pymess.config import settings
+
+
+__all__ = (
+    'MessageStatistics',
+    'MessageStatisticsRollup',
+)
+
+
+STATISTICS_DIMENSIONS = ('backend', 'template_slug', 'tag', 'state')
+
+
+def get_hour_bucket(value):
+    """
+    Returns start of the hour (in UTC) to which the datetime value belongs
+    """
+    return value.astimezone(datetime_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+class MessageStatisticsQueryset(models.QuerySet):
+
+    def filter_message_type(self, message_type):
+        return self.filter(message_type=message_type)
+
+    def filter_period(self, from_datetime=None, to_datetime=None):
+        """
+        Filters buckets of the period. Buckets are whole hours, therefore the bucket which contains from_datetime is
+        included and the bucket which contains to_datetime is excluded.
+        """
+        qs = self
+        if from_datetime is not None:
+            qs = qs.filter(bucket__gte=get_hour_bucket(from_datetime))
+        if to_datetime is not None:
+            qs = qs.filter(bucket__lt=get_hour_bucket(to_datetime))
+        return qs
+
+    def count_by(self, *fields):
+        """
+        Returns list of dicts with values of the fields and number of messages (key count), e.g. count_by('state')
+        returns number of messages in every state. Fields can be message_type, bucket, backend, template_slug, tag
+        and state.
+        """
+        return list(self.order_by().values(*fields).annotate(count=Sum('count')).order_by(*fields))
+
+    def get_count(self):
+        return self.aggregate(count=Sum('count'))['count'] or 0
+
+
+class MessageStatisticsManager(models.Manager):
+
+    def _get_buckets_to_refresh(self, message_model, changed_since):
+        messages_qs = message_model.objects.all()
+        if changed_since is not None:
+            messages_qs = messages_qs.filter(changed_at__gte=changed_since)
+        return sorted(
+            messages_qs.order_by().annotate(
+                bucket=TruncHour('created_at', tzinfo=datetime_timezone.utc)
+            ).values_list('bucket', flat=True).distinct()
+        )
+
+    def _refresh_buckets(self, message_model, message_type, buckets):
+        buckets_messages_qs = message_model.objects.filter(
+            created_at__gte=buckets[0], created_at__lt=buckets[-1] + timedelta(hours=1)
+        ).order_by().annotate(
+            bucket=TruncHour('created_at', tzinfo=datetime_timezone.utc)
+        ).filter(
+            bucket__in=buckets
+        ).values(
+            'bucket', *STATISTICS_DIMENSIONS
+        ).annotate(
+            count=Count('pk')
+        )
+        self.filter(message_type=message_type, bucket__in=buckets).delete()
+        self.bulk_create([
+            self.model(message_type=message_type, **bucket_statistics) for bucket_statistics in buckets_messages_qs
+        ])
+
+    def rollup(self, message_model, message_type):
+        """
+        Refreshes statistics of the hour buckets which contain messages changed since the last rollup. Statistics of
+        the whole bucket is computed again, therefore the rollup can be repeated safely. Buckets are refreshed in
+        chunks, every chunk in its own short transaction.
+        :param message_model: message model class
+        :param message_type: type of the messages (sms, email, dialer, push_notification)
+        :return: number of refreshed buckets
+        """
+        rollup = MessageStatisticsRollup.objects.get_or_create(message_type=message_type)[0]
+        started_at = now()
+        changed_since = (
+            rollup.rolled_up_at - timedelta(seconds=settings.STATISTICS_ROLLUP_OVERLAP_SECONDS)
+            if rollup.rolled_up_at else None
+        )
+        buckets = self._get_buckets_to_refresh(message_model, changed_since)
+        chunk_size = settings.STATISTICS_ROLLUP_CHUNK_SIZE
+        for i in range(0, len(buckets), chunk_size):
+            with transaction.atomic():
+                # Lock of the rollup serializes concurrently running rollups of the same message type
+                MessageStatisticsRollup.objects.select_for_update().get(pk=rollup.pk)
+                self._refresh_buckets(message_model, message_type, buckets[i:i + chunk_size])
+        rollup.change_and_save(rolled_up_at=started_at)
+        return len(buckets)
+
+
+class MessageStatistics(SmartModel):
+
+    message_type = models.CharField(verbose_name=_('message type'), null=False, blank=False, max_length=20)
+    bucket = models.DateTimeField(verbose_name=_('bucket'), null=False, blank=False)
+    backend = models.CharField(verbose_name=_('backend'), null=True, blank=True, max_length=250)
+    template_slug = models.SlugField(verbose_name=_('slug'), max_length=100, null=True, blank=True)
+    tag = models.SlugField(verbose_name=_('tag'), null=True, blank=True)
+    state = models.IntegerField(verbose_name=_('state'), null=False, blank=False)
+    count = models.PositiveIntegerField(verbose_name=_('count'), null=False, blank=False)
+
+    objects = MessageStatisticsManager.from_queryset(MessageStatisticsQueryset)()
+
+    def __str__(self):
+        return '{}, {}, {}'.format(self.message_type, self.bucket, self.state)
+
+    class Meta:
+        verbose_name = _('message statistics')
+        verbose_name_plural = _('message statistics')
+        ordering = ('-bucket',)
+        indexes = (
+            models.Index(fields=('message_type', 'bucket'), name='message_statistics_bucket_idx'),
+        )
+
+
+class MessageStatisticsRollup(SmartModel):
+
+    message_type = models.CharField(verbose_name=_('message type'), null=False, blank=False, max_length=20,
+                                    unique=True)
+    rolled_up_at = models.DateTimeField(verbose_name=_('rolled up at'), null=True, blank=True)
+
+    def __str__(self):
+        return self.message_type
+
+    class Meta:
+        verbose_name = _('message statistics rollup')
+        verbose_name_plural = _('message statistics rollups')
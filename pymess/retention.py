@@ -0,0 +1,207 @@
+import gzip
+import json
+import logging
+
+from io import BytesIO
+from pathlib import Path
+
+from django.core import serializers
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.timezone import now
+
+from pymess import metrics
+from pymess.config import settings
+from pymess.models import Attachment, EmailContent, EmailMessage, EmailTemplateAttachment
+
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeResult:
+
+    def __init__(self):
+        self.number_of_messages = 0
+        self.number_of_files = 0
+        self.archive_file_names = []
+
+
+class MessagePurger:
+    """
+    Purges messages in the final state which are older than the retention period of the message type. Messages are
+    processed in chunks and every chunk is deleted in its own short transaction. Before deleting, messages can be
+    archived to the compressed JSON lines file (one file per chunk). Storage files of the messages are deleted after
+    the chunk is committed.
+    :param controller: controller of the message type
+    :param chunk_size: number of messages deleted in one transaction
+    :param archive: messages are archived before deleting if it is True
+    """
+
+    def __init__(self, controller, chunk_size=None, archive=False):
+        self.controller = controller
+        self.chunk_size = chunk_size or settings.RETENTION_CHUNK_SIZE
+        self.archive = archive
+        self.started_at = now()
+
+    def get_messages_to_purge(self):
+        return self.controller.get_messages_to_purge().prefetch_related('related_objects__content_type')
+
+    def serialize_message(self, message):
+        data = serializers.serialize('python', [message])[0]
+        data['related_objects'] = [
+            {
+                'content_type': '{}.{}'.format(related_object.content_type.app_label, related_object.content_type.model),
+                'object_id': related_object.object_id,
+            }
+            for related_object in message.related_objects.all()
+        ]
+        return data
+
+    def get_archive_file_name(self, chunk_index):
+        return str(
+            Path(settings.RETENTION_ARCHIVE_STORAGE_PATH)
+            / metrics.get_type_label(self.controller.backend_type_name)
+            / '{}_{:05d}.jsonl.gz'.format(self.started_at.strftime('%Y%m%dT%H%M%S'), chunk_index)
+        )
+
+    def archive_messages(self, messages, chunk_index):
+        """
+        Stores messages to the compressed JSON lines file and returns name of the stored file
+        """
+        buffer = BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as archive_file:
+            for message in messages:
+                archive_file.write(json.dumps(self.serialize_message(message), cls=DjangoJSONEncoder).encode())
+                archive_file.write(b'\n')
+        return default_storage.save(self.get_archive_file_name(chunk_index), ContentFile(buffer.getvalue()))
+
+    def collect_files(self, messages):
+        """
+        Returns storage files of the messages which should be deleted with the messages
+        """
+        return None
+
+    def delete_files(self, files):
+        """
+        Deletes collected storage files of the deleted messages and returns number of deleted files
+        """
+        return 0
+
+    def _delete_storage_files(self, storage, file_names):
+        number_of_deleted_files = 0
+        for file_name in file_names:
+            try:
+                storage.delete(file_name)
+                number_of_deleted_files += 1
+            except Exception as ex:
+                # File which was not deleted is removed later with the storage garbage collector
+                logger.exception(ex)
+        return number_of_deleted_files
+
+    def _delete_messages(self, messages):
+        with transaction.atomic():
+            # Messages changed in the meantime are not deleted
+            message_pks = set(self.controller.get_messages_to_purge().filter(
+                pk__in=[message.pk for message in messages]
+            ).select_for_update().values_list('pk', flat=True))
+            self.controller.model.objects.filter(pk__in=message_pks).delete()
+        return [message for message in messages if message.pk in message_pks]
+
+    def _get_chunk(self, last_pk):
+        return list(self.get_messages_to_purge().filter(pk__gt=last_pk).order_by('pk')[:self.chunk_size])
+
+    def purge(self):
+        """
+        Purges all messages older than the retention period
+        :return: PurgeResult instance
+        """
+        result = PurgeResult()
+        last_pk = 0
+        chunk_index = 0
+        messages = self._get_chunk(last_pk)
+        while messages:
+            if self.archive:
+                result.archive_file_names.append(self.archive_messages(messages, chunk_index))
+            deleted_messages = self._delete_messages(messages)
+            result.number_of_messages += len(deleted_messages)
+            # Related objects of the deleted messages are still available from the prefetched cache
+            result.number_of_files += self.delete_files(self.collect_files(deleted_messages))
+
+            last_pk = messages[-1].pk
+            chunk_index += 1
+            messages = self._get_chunk(last_pk)
+        return result
+
+
+class EmailMessagePurger(MessagePurger):
+    """
+    E-mail purger deletes content files of the messages, compressed contents and attachments which are not referenced
+    by other messages or templates.
+    """
+
+    def get_messages_to_purge(self):
+        return super().get_messages_to_purge().prefetch_related('attachments')
+
+    def serialize_message(self, message):
+        data = super().serialize_message(message)
+        try:
+            data['content'] = message.content
+        except (OSError, ValueError) as ex:
+            logger.exception(ex)
+            data['content'] = None
+        data['attachments'] = [
+            serializers.serialize('python', [attachment])[0] for attachment in message.attachments.all()
+        ]
+        return data
+
+    def collect_files(self, messages):
+        return {
+            'content_file_names': {message.content_file.name for message in messages if message.content_file},
+            'compressed_content_pks': {
+                message.compressed_content_id for message in messages if message.compressed_content_id
+            },
+            'attachment_file_names': {
+                attachment.file.name for message in messages for attachment in message.attachments.all()
+                if attachment.file
+            },
+        }
+
+    def _delete_unreferenced_compressed_contents(self, compressed_content_pks):
+        if not compressed_content_pks:
+            return 0
+
+        with transaction.atomic():
+            unreferenced_compressed_contents = list(EmailContent.objects.filter(
+                pk__in=compressed_content_pks, email_messages__isnull=True
+            ).select_for_update(of=('self',)))
+            EmailContent.objects.filter(
+                pk__in=[compressed_content.pk for compressed_content in unreferenced_compressed_contents]
+            ).delete()
+        return self._delete_storage_files(
+            EmailContent._meta.get_field('file').storage,
+            [compressed_content.file.name for compressed_content in unreferenced_compressed_contents]
+        )
+
+    def _delete_unreferenced_attachment_files(self, attachment_file_names):
+        if not attachment_file_names:
+            return 0
+
+        # Attachment files can be shared by more messages (deduplicated attachments) or by templates
+        referenced_file_names = (
+            set(Attachment.objects.filter(file__in=attachment_file_names).values_list('file', flat=True))
+            | set(EmailTemplateAttachment.objects.filter(file__in=attachment_file_names).values_list('file', flat=True))
+        )
+        return self._delete_storage_files(
+            Attachment._meta.get_field('file').storage, attachment_file_names - referenced_file_names
+        )
+
+    def delete_files(self, files):
+        return (
+            self._delete_storage_files(
+                EmailMessage._meta.get_field('content_file').storage, files['content_file_names']
+            )
+            + self._delete_unreferenced_compressed_contents(files['compressed_content_pks'])
+            + self._delete_unreferenced_attachment_files(files['attachment_file_names'])
+        )
@@ -0,0 +1,205 @@
+import heapq
+import logging
+import posixpath
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F
+from django.db.models.functions import Collate
+from django.utils.timezone import now
+
+from pymess.config import settings
+from pymess.models import Attachment, EmailContent, EmailMessage, EmailTemplateAttachment
+
+
+logger = logging.getLogger(__name__)
+
+
+# Directories of the EMAIL_STORAGE_PATH with files of the models, other files of the storage are never touched
+STORAGE_DIRECTORIES = ('contents', 'compressed_contents', 'attachments', 'template_attachments')
+
+FILE_FIELDS = (
+    (EmailMessage, 'content_file'),
+    (EmailContent, 'file'),
+    (Attachment, 'file'),
+    (EmailTemplateAttachment, 'file'),
+)
+
+# Collations which compare strings in the same order as Python
+BINARY_COLLATIONS = {
+    'postgresql': 'C',
+}
+
+
+class UnsortedFileNamesError(Exception):
+    pass
+
+
+def _check_sorted(file_names, source):
+    last_file_name = None
+    for file_name in file_names:
+        if last_file_name is not None and file_name < last_file_name:
+            raise UnsortedFileNamesError(
+                'File names of {} are not sorted ("{}" is after "{}")'.format(source, file_name, last_file_name)
+            )
+        last_file_name = file_name
+        yield file_name
+
+
+def iter_storage_file_names(storage, path):
+    """
+    Yields names of all files in the storage directory and its subdirectories sorted by name. Only listing of one
+    directory is loaded to the memory at once.
+    """
+    try:
+        directory_names, file_names = storage.listdir(path)
+    except FileNotFoundError:
+        return
+
+    # Directory name with the separator is sorted in the same way as names of the files in the directory
+    for name, is_directory in sorted(
+            [(directory_name + '/', True) for directory_name in directory_names]
+            + [(file_name, False) for file_name in file_names]):
+        name = posixpath.join(path, name.rstrip('/'))
+        if is_directory:
+            yield from iter_storage_file_names(storage, name)
+        else:
+            yield name
+
+
+def iter_referenced_file_names(model, field_name, chunk_size, using=DEFAULT_DB_ALIAS):
+    """
+    Yields names of the files stored in the model field sorted by name. Names are streamed from the database in
+    chunks.
+    """
+    collation = BINARY_COLLATIONS.get(connections[using].vendor)
+    return model.objects.using(using).exclude(
+        **{field_name: ''}
+    ).exclude(
+        **{'{}__isnull'.format(field_name): True}
+    ).order_by(
+        Collate(field_name, collation) if collation else F(field_name)
+    ).values_list(field_name, flat=True).iterator(chunk_size=chunk_size)
+
+
+def iter_orphaned_file_names(storage_file_names, referenced_file_names):
+    """
+    Yields names of the storage files which are not referenced. Both iterables must be sorted by name.
+    """
+    referenced_file_names = iter(referenced_file_names)
+    referenced_file_name = next(referenced_file_names, None)
+    for storage_file_name in storage_file_names:
+        while referenced_file_name is not None and referenced_file_name < storage_file_name:
+            referenced_file_name = next(referenced_file_names, None)
+        if referenced_file_name != storage_file_name:
+            yield storage_file_name
+
+
+class StorageGarbageCollectorResult:
+
+    def __init__(self):
+        self.number_of_orphaned_files = 0
+        self.number_of_deleted_files = 0
+        self.number_of_recent_files = 0
+
+    def update(self, number_of_orphaned_files, number_of_deleted_files, number_of_recent_files):
+        self.number_of_orphaned_files += number_of_orphaned_files
+        self.number_of_deleted_files += number_of_deleted_files
+        self.number_of_recent_files += number_of_recent_files
+
+
+class StorageGarbageCollector:
+    """
+    Deletes e-mail content, compressed content and attachment files which are not referenced by any model (e.g.
+    files of rolled back transactions). Storage listing and file names from the database are streamed sorted by name
+    and compared with bounded memory. Orphaned files are deleted in batches by parallel workers. Files which are
+    younger than min_age_seconds are kept, because their rows may not be committed yet.
+    :param chunk_size: number of file names fetched from the database at once
+    :param batch_size: number of files deleted by one worker task
+    :param max_workers: number of parallel workers which delete files
+    :param min_age_seconds: files modified in the last min_age_seconds seconds are not deleted
+    :param dry_run: orphaned files are only counted if it is True
+    :param using: alias of the database
+    """
+
+    def __init__(self, chunk_size=None, batch_size=None, max_workers=None, min_age_seconds=None, dry_run=False,
+                 using=DEFAULT_DB_ALIAS):
+        self.chunk_size = chunk_size or settings.STORAGE_GC_CHUNK_SIZE
+        self.batch_size = batch_size or settings.STORAGE_GC_BATCH_SIZE
+        self.max_workers = max_workers or settings.STORAGE_GC_MAX_WORKERS
+        self.min_age_seconds = settings.STORAGE_GC_MIN_AGE_SECONDS if min_age_seconds is None else min_age_seconds
+        self.dry_run = dry_run
+        self.using = using
+
+    def _get_fields_by_storage(self):
+        fields_by_storage = {}
+        for model, field_name in FILE_FIELDS:
+            storage = model._meta.get_field(field_name).storage
+            fields_by_storage.setdefault(storage, []).append((model, field_name))
+        return fields_by_storage
+
+    def get_storage_file_names(self, storage):
+        return _check_sorted(
+            heapq.merge(*(
+                iter_storage_file_names(storage, str(Path(settings.EMAIL_STORAGE_PATH) / directory))
+                for directory in STORAGE_DIRECTORIES
+            )),
+            'storage'
+        )
+
+    def get_referenced_file_names(self, fields):
+        return _check_sorted(
+            heapq.merge(*(
+                iter_referenced_file_names(model, field_name, self.chunk_size, self.using)
+                for model, field_name in fields
+            )),
+            'database (database collation must compare strings by code points)'
+        )
+
+    def _delete_files(self, storage, file_names):
+        """
+        Deletes batch of the orphaned files and returns number of the orphaned, deleted and recent files
+        """
+        min_modified_at = now() - timedelta(seconds=self.min_age_seconds)
+        number_of_deleted_files = number_of_recent_files = 0
+        for file_name in file_names:
+            try:
+                if self.min_age_seconds and storage.get_modified_time(file_name) >= min_modified_at:
+                    number_of_recent_files += 1
+                elif not self.dry_run:
+                    storage.delete(file_name)
+                    number_of_deleted_files += 1
+            except Exception as ex:
+                # One file error should not stop deleting of the other files
+                logger.exception(ex)
+        return len(file_names), number_of_deleted_files, number_of_recent_files
+
+    def _collect_storage(self, storage, fields, result):
+        orphaned_file_names = iter_orphaned_file_names(
+            self.get_storage_file_names(storage), self.get_referenced_file_names(fields)
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = set()
+            for batch in iter(lambda: list(islice(orphaned_file_names, self.batch_size)), []):
+                futures.add(executor.submit(self._delete_files, storage, batch))
+                if len(futures) >= self.max_workers * 2:
+                    # Number of waiting batches is limited, therefore listing is not loaded to the memory
+                    done_futures, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done_futures:
+                        result.update(*future.result())
+            for future in wait(futures).done:
+                result.update(*future.result())
+
+    def collect(self):
+        """
+        Finds and deletes orphaned files of all storages
+        :return: StorageGarbageCollectorResult instance
+        """
+        result = StorageGarbageCollectorResult()
+        for storage, fields in self._get_fields_by_storage().items():
+            self._collect_storage(storage, fields, result)
+        return result
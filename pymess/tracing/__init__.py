@@ -0,0 +1,109 @@
+import threading
+
+from contextlib import contextmanager
+
+from django.utils.module_loading import import_string
+
+from pymess.config import settings
+
+
+class BaseSpan:
+    """
+    Span which ignores all attributes. It is used if tracing is turned off.
+    """
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NOOP_SPAN = BaseSpan()
+
+
+class BaseTracer:
+    """
+    Base class of tracer. Tracer creates spans around parts of the message lifecycle. This implementation doesn't
+    create any spans and it is used if tracing is turned off.
+    """
+
+    def start_span(self, name, attributes):
+        """
+        Returns context manager which yields span object with method set_attribute(key, value).
+        :param name: name of the span
+        :param attributes: dict of the span attributes
+        """
+        return NOOP_SPAN
+
+
+NOOP_TRACER = BaseTracer()
+
+_tracers = {}
+_tracers_lock = threading.Lock()
+_overridden_tracer = None
+
+
+def get_tracer():
+    """
+    Returns instance of the tracer defined in the setting PYMESS_TRACER. One instance is shared in the process.
+    """
+    if _overridden_tracer is not None:
+        return _overridden_tracer
+
+    tracer_path = settings.TRACER
+    if not tracer_path:
+        return NOOP_TRACER
+
+    if tracer_path not in _tracers:
+        with _tracers_lock:
+            if tracer_path not in _tracers:
+                _tracers[tracer_path] = import_string(tracer_path)()
+    return _tracers[tracer_path]
+
+
+@contextmanager
+def override_tracer(tracer):
+    """
+    Context manager which replaces the configured tracer in the whole process
+    :param tracer: tracer instance which is used inside the context manager
+    """
+    global _overridden_tracer
+
+    previous_tracer = _overridden_tracer
+    _overridden_tracer = tracer
+    try:
+        yield tracer
+    finally:
+        _overridden_tracer = previous_tracer
+
+
+def get_attribute_key(key):
+    return 'pymess.{}'.format(key)
+
+
+def start_span(name, **attributes):
+    """
+    Starts span of the configured tracer. Attributes with None value are not set.
+    :param name: name of the span
+    :param attributes: span attributes, keys are prefixed with "pymess."
+    """
+    tracer = get_tracer()
+    if tracer is NOOP_TRACER:
+        return NOOP_SPAN
+
+    return tracer.start_span(
+        'pymess.{}'.format(name),
+        {get_attribute_key(key): value for key, value in attributes.items() if value is not None}
+    )
+
+
+def set_span_attribute(span, key, value):
+    """
+    Sets attribute to the span started with the start_span function.
+    """
+    if value is not None:
+        span.set_attribute(get_attribute_key(key), value)
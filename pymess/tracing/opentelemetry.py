@@ -0,0 +1,18 @@
+from opentelemetry import trace
+
+from pymess.tracing import BaseTracer
+
+
+class OpenTelemetryTracer(BaseTracer):
+    """
+    Tracer creates spans with the OpenTelemetry API. Spans are exported by the tracer provider configured
+    in your project.
+    """
+
+    instrumenting_module_name = 'pymess'
+
+    def __init__(self):
+        self._tracer = trace.get_tracer(self.instrumenting_module_name)
+
+    def start_span(self, name, attributes):
+        return self._tracer.start_as_current_span(name, attributes=attributes)
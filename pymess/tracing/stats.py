@@ -0,0 +1,102 @@
+import threading
+
+from collections import OrderedDict
+from time import monotonic
+
+from pymess.tracing import NOOP_TRACER, BaseSpan, BaseTracer
+
+
+PHASES = OrderedDict((
+    ('claim', ('claim_messages',)),
+    ('render', ('render_body', 'render_subject')),
+    ('persist', (
+        'create_message', 'create_related_objects', 'create_attachments', 'store_email_content', 'update_message',
+        'update_messages',
+    )),
+    ('publish', ('publish_message', 'publish_messages')),
+    ('status parse', ('parse_status',)),
+))
+
+
+class PhaseStats:
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.calls = 0
+        self.duration = 0
+
+
+class PhaseStatsSpan(BaseSpan):
+    """
+    Span which measures its duration without durations of the nested spans and passes attributes to the span
+    of the wrapped tracer.
+    """
+
+    def __init__(self, tracer, name, wrapped_span_context):
+        self._tracer = tracer
+        self._name = name
+        self._wrapped_span_context = wrapped_span_context
+        self._wrapped_span = None
+        self._nested_duration = 0
+
+    def set_attribute(self, key, value):
+        self._wrapped_span.set_attribute(key, value)
+
+    def __enter__(self):
+        self._wrapped_span = self._wrapped_span_context.__enter__()
+        self._tracer._push_span(self)
+        self._started_at = monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = monotonic() - self._started_at
+        self._tracer._pop_span(self, duration)
+        return self._wrapped_span_context.__exit__(exc_type, exc_value, traceback)
+
+
+class PhaseStatsTracer(BaseTracer):
+    """
+    Tracer which sums durations of the spans by phases of the message processing. Spans are passed to the wrapped
+    tracer too, therefore the configured tracing works with collecting of the stats. Duration of the span is counted
+    without durations of the nested spans, e.g. persisting of the message state is not counted to the publish phase.
+    """
+
+    def __init__(self, tracer=NOOP_TRACER):
+        self._tracer = tracer
+        self._phases = {span_name: phase for phase, span_names in PHASES.items() for span_name in span_names}
+        self._stats = OrderedDict((phase, PhaseStats(phase)) for phase in PHASES)
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _get_span_stack(self):
+        if not hasattr(self._local, 'span_stack'):
+            self._local.span_stack = []
+        return self._local.span_stack
+
+    def _push_span(self, span):
+        self._get_span_stack().append(span)
+
+    def _pop_span(self, span, duration):
+        span_stack = self._get_span_stack()
+        span_stack.pop()
+        if span_stack:
+            span_stack[-1]._nested_duration += duration
+
+        name = span._name[len('pymess.'):] if span._name.startswith('pymess.') else span._name
+        phase = self._phases.get(name, name)
+        with self._stats_lock:
+            if phase not in self._stats:
+                self._stats[phase] = PhaseStats(phase)
+            phase_stats = self._stats[phase]
+            phase_stats.calls += 1
+            phase_stats.duration += duration - span._nested_duration
+
+    def start_span(self, name, attributes):
+        return PhaseStatsSpan(self, name, self._tracer.start_span(name, attributes))
+
+    def get_stats(self):
+        """
+        Returns list of PhaseStats of all phases
+        """
+        with self._stats_lock:
+            return list(self._stats.values())
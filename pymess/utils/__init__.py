@@ -1,3 +1,5 @@
+import hashlib
+
 from pymess.config import settings
 
 
@@ -19,3 +21,15 @@ def fullname(o):
     Helper that returns name of the input object with its path.
     """
     return o.__module__ + "." + o.__class__.__name__
+
+
+def generate_duplicate_key(template_slug, related_object_keys):
+    """
+    Helper that returns hash of the template slug and the sorted pairs (content type ID, object ID) of related objects.
+    """
+    return hashlib.sha256('|'.join([template_slug] + [
+        '{}:{}'.format(content_type_id, object_id)
+        for content_type_id, object_id in sorted({
+            (int(content_type_id), str(object_id)) for content_type_id, object_id in related_object_keys
+        })
+    ]).encode()).hexdigest()
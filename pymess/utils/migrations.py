@@ -4,6 +4,7 @@ import os
 from chamber.shortcuts import change_and_save
 
 from pymess.config import settings
+from pymess.utils.partitioning import get_partitioned_models, is_partitioned, partition_table
 
 
 def get_email_template_body_from_file(email_template_slug):
@@ -30,3 +31,36 @@ class SyncEmailTemplates:
         for email_template in email_templates_found:
             email_template.body = get_email_template_body_from_file(email_template.slug)
         email_template_class.objects.bulk_update(email_templates_found, ['body'])
+
+
+class PartitionTables:
+    """
+    Migration helper which converts tables of the message models and their related object models to the tables
+    partitioned by range of created_at (PostgreSQL declarative partitioning). It is used with RunPython operation:
+
+        migrations.RunPython(PartitionTables(), migrations.RunPython.noop)
+
+    Tables which are already partitioned and databases other than PostgreSQL are skipped.
+    :param model_labels: list of model labels (e.g. pymess.OutputSMSMessage), all message models and related
+        object models are partitioned by default
+    :param interval: length of one partition (day, week or month), setting PYMESS_PARTITION_INTERVAL by default
+    """
+
+    def __init__(self, model_labels=None, interval=None):
+        self.model_labels = model_labels
+        self.interval = interval
+
+    def _get_models(self, apps):
+        if self.model_labels:
+            return [apps.get_model(*model_label.split('.')) for model_label in self.model_labels]
+        else:
+            return [apps.get_model(model._meta.app_label, model._meta.object_name) for model in get_partitioned_models()]
+
+    def __call__(self, apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql':
+            return
+
+        for model in self._get_models(apps):
+            if not is_partitioned(connection, model._meta.db_table):
+                partition_table(connection, model, self.interval)
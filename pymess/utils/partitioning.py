@@ -0,0 +1,315 @@
+import re
+
+from datetime import timedelta, timezone as datetime_timezone
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from pymess.config import settings
+
+
+PARTITION_INTERVALS = ('day', 'week', 'month')
+
+PARTITION_UPPER_BOUND_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def get_partition_interval(interval=None):
+    interval = interval or settings.PARTITION_INTERVAL
+    if interval not in PARTITION_INTERVALS:
+        raise ImproperlyConfigured(
+            'Partition interval "{}" is not supported, use one of {}'.format(interval, ', '.join(PARTITION_INTERVALS))
+        )
+    return interval
+
+
+def get_period_start(value, interval):
+    """
+    Returns start of the period (in UTC) to which the datetime value belongs
+    """
+    value = value.astimezone(datetime_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        return value - timedelta(days=value.weekday())
+    elif interval == 'month':
+        return value.replace(day=1)
+    else:
+        return value
+
+
+def get_next_period_start(value, interval):
+    value = get_period_start(value, interval)
+    if interval == 'week':
+        return value + timedelta(days=7)
+    elif interval == 'month':
+        return (value + timedelta(days=32)).replace(day=1)
+    else:
+        return value + timedelta(days=1)
+
+
+def get_partitioned_models():
+    """
+    Returns message models and their related object models which can be partitioned by created_at
+    """
+    from pymess.models.common import BaseMessage, BaseRelatedObject, BaseTemplateDisallowedObject
+
+    return [
+        model for model in apps.get_app_config('pymess').get_models()
+        if issubclass(model, (BaseMessage, BaseRelatedObject)) and not issubclass(model, BaseTemplateDisallowedObject)
+    ]
+
+
+def is_partitioned(connection, table_name):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [table_name])
+        return cursor.fetchone() is not None
+
+
+def get_partition_upper_bounds(connection, table_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [table_name]
+        )
+        return [
+            parse_datetime(match.group(1))
+            for match in (PARTITION_UPPER_BOUND_RE.search(bound) for (bound,) in cursor.fetchall()) if match
+        ]
+
+
+def get_partition_name(table_name, period_start):
+    return '{}_p{}'.format(table_name, period_start.strftime('%Y%m%d'))
+
+
+def get_default_partition_name(table_name):
+    return '{}_default'.format(table_name)
+
+
+def get_default_partition(connection, table_name):
+    """
+    Returns name of the default partition of the partitioned table or None if the table has no default partition
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT partdefid::regclass::text FROM pg_partitioned_table '
+            'WHERE partrelid = to_regclass(%s) AND partdefid <> 0',
+            [table_name]
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def _create_default_partition(connection, table_name):
+    """
+    Default partition contains rows which don't belong to any period partition, therefore messages can be created
+    even if the partitions were not created in advance
+    """
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TABLE {} PARTITION OF {} DEFAULT'.format(
+            quote_name(get_default_partition_name(table_name)), quote_name(table_name)
+        ))
+
+
+def _create_partition(connection, table_name, partition_column, default_partition_name, partition_name,
+                      partition_start, partition_end):
+    quote_name = connection.ops.quote_name
+    period_filter = '{column} >= %s AND {column} < %s'.format(column=quote_name(partition_column))
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if default_partition_name:
+            cursor.execute(
+                'SELECT EXISTS (SELECT 1 FROM {} WHERE {})'.format(default_partition_name, period_filter),
+                [partition_start, partition_end]
+            )
+            (has_default_partition_rows,) = cursor.fetchone()
+        else:
+            has_default_partition_rows = False
+
+        if has_default_partition_rows:
+            # Partition can't be created while the default partition contains rows of its period, rows are moved
+            # to the new table which is attached as the partition afterwards
+            cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(
+                quote_name(partition_name), quote_name(table_name)
+            ))
+            cursor.execute(
+                'WITH moved_rows AS (DELETE FROM {} WHERE {} RETURNING *) '
+                'INSERT INTO {} SELECT * FROM moved_rows'.format(
+                    default_partition_name, period_filter, quote_name(partition_name)
+                ),
+                [partition_start, partition_end]
+            )
+            cursor.execute(
+                'ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)'.format(
+                    quote_name(table_name), quote_name(partition_name)
+                ),
+                [partition_start, partition_end]
+            )
+        else:
+            cursor.execute(
+                'CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)'.format(
+                    quote_name(partition_name), quote_name(table_name)
+                ),
+                [partition_start, partition_end]
+            )
+
+
+def _create_partitions(connection, table_name, partition_column, interval, number_of_partitions):
+    default_partition_name = get_default_partition(connection, table_name)
+    if not default_partition_name:
+        _create_default_partition(connection, table_name)
+        default_partition_name = get_default_partition(connection, table_name)
+
+    partition_start = max([get_period_start(now(), interval)] + get_partition_upper_bounds(connection, table_name))
+    partitions_end = get_period_start(now(), interval)
+    for _ in range(number_of_partitions + 1):
+        partitions_end = get_next_period_start(partitions_end, interval)
+
+    created_partition_names = []
+    while partition_start < partitions_end:
+        partition_end = get_next_period_start(partition_start, interval)
+        partition_name = get_partition_name(table_name, partition_start)
+        _create_partition(
+            connection, table_name, partition_column, default_partition_name, partition_name, partition_start,
+            partition_end
+        )
+        created_partition_names.append(partition_name)
+        partition_start = partition_end
+    return created_partition_names
+
+
+def create_partitions(model, interval=None, number_of_partitions=None, using=DEFAULT_DB_ALIAS):
+    """
+    Creates partitions of the partitioned model table for the current period and the next periods. Already
+    existing partitions are skipped, therefore the function should be called periodically. Default partition is
+    created if it doesn't exist and rows of the created periods are moved from it to the new partitions.
+    :param model: message model or related object model
+    :param interval: length of one partition (day, week or month), setting PYMESS_PARTITION_INTERVAL by default
+    :param number_of_partitions: number of created partitions after the current one, setting
+        PYMESS_PARTITION_PREMAKE by default
+    :param using: alias of the database
+    :return: list of names of the created partitions
+    """
+    connection = connections[using]
+    table_name = model._meta.db_table
+    if not is_partitioned(connection, table_name):
+        return []
+
+    return _create_partitions(
+        connection,
+        table_name,
+        model._meta.get_field('created_at').column,
+        get_partition_interval(interval),
+        settings.PARTITION_PREMAKE if number_of_partitions is None else number_of_partitions
+    )
+
+
+def _fetch_all(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def partition_table(connection, model, interval=None, number_of_partitions=None):
+    """
+    Converts the model table to the table partitioned by range of created_at. The original table is attached as
+    the first partition with all its rows, therefore no data are copied. Default partition receives rows which don't
+    belong to any created partition. Primary key of the partitioned table must contain created_at and foreign keys
+    can't reference the partitioned table, foreign keys referencing the table are dropped.
+    """
+    interval = get_partition_interval(interval)
+    quote_name = connection.ops.quote_name
+    table_name = model._meta.db_table
+    legacy_table_name = '{}_legacy'.format(table_name)
+    pk_column = model._meta.pk.column
+    partition_column = model._meta.get_field('created_at').column
+
+    # Foreign keys cloned to partitions (conparentid) are dropped with the constraint of the partitioned table
+    for (referencing_table_name, constraint_name) in _fetch_all(
+            connection,
+            'SELECT conrelid::regclass::text, conname FROM pg_constraint '
+            'WHERE contype = %s AND confrelid = to_regclass(%s) AND conparentid = 0',
+            ['f', table_name]):
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE {} DROP CONSTRAINT {}'.format(
+                referencing_table_name, quote_name(constraint_name)
+            ))
+
+    index_definitions = _fetch_all(
+        connection,
+        'SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'WHERE i.indrelid = to_regclass(%s) AND NOT i.indisunique',
+        [table_name]
+    )
+    # Primary key of the partitioned table contains created_at, therefore foreign keys can't reference it
+    foreign_key_definitions = _fetch_all(
+        connection,
+        'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+        'WHERE contype = %s AND conrelid = to_regclass(%s) '
+        'AND confrelid NOT IN (SELECT partrelid FROM pg_partitioned_table)',
+        ['f', table_name]
+    )
+    (last_created_at,), = _fetch_all(
+        connection,
+        'SELECT max({}) FROM {}'.format(quote_name(partition_column), quote_name(table_name)),
+        []
+    )
+    legacy_partition_end = get_next_period_start(max(filter(None, (now(), last_created_at))), interval)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE {} RENAME TO {}'.format(quote_name(table_name), quote_name(legacy_table_name)))
+        # Indexes of the partitioned table are created with the original names, matching indexes of the legacy
+        # table are attached to them without rebuilding
+        for index_name, _ in index_definitions:
+            cursor.execute('ALTER INDEX {} RENAME TO {}'.format(
+                quote_name(index_name), quote_name('{}_legacy'.format(index_name[:55]))
+            ))
+        cursor.execute(
+            'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+            'PARTITION BY RANGE ({})'.format(
+                quote_name(table_name), quote_name(legacy_table_name), quote_name(partition_column)
+            )
+        )
+        cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY ({}, {})'.format(
+            quote_name(table_name), quote_name('{}_partitioned_pkey'.format(table_name)),
+            quote_name(pk_column), quote_name(partition_column)
+        ))
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [legacy_table_name, pk_column])
+        (sequence_name,) = cursor.fetchone()
+        if sequence_name:
+            # Sequence must not be dropped with the legacy partition
+            cursor.execute('ALTER SEQUENCE {} OWNED BY {}.{}'.format(
+                sequence_name, quote_name(table_name), quote_name(pk_column)
+            ))
+        for _, index_definition in index_definitions:
+            cursor.execute(index_definition)
+        for constraint_name, constraint_definition in foreign_key_definitions:
+            cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(
+                quote_name(table_name), quote_name(constraint_name), constraint_definition
+            ))
+        # Partition can't have two primary keys, primary key of the partitioned table is created on attaching
+        cursor.execute(
+            'SELECT conname FROM pg_constraint WHERE contype = %s AND conrelid = to_regclass(%s)',
+            ['p', legacy_table_name]
+        )
+        for (legacy_pk_constraint_name,) in cursor.fetchall():
+            cursor.execute('ALTER TABLE {} DROP CONSTRAINT {}'.format(
+                quote_name(legacy_table_name), quote_name(legacy_pk_constraint_name)
+            ))
+        cursor.execute(
+            'ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (MINVALUE) TO (%s)'.format(
+                quote_name(table_name), quote_name(legacy_table_name)
+            ),
+            [legacy_partition_end]
+        )
+    return _create_partitions(
+        connection,
+        table_name,
+        partition_column,
+        interval,
+        settings.PARTITION_PREMAKE if number_of_partitions is None else number_of_partitions
+    )
+
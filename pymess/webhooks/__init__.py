@@ -0,0 +1,125 @@
+import base64
+import hashlib
+import hmac
+import logging
+
+from django.db import transaction
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import View
+from django.utils.decorators import method_decorator
+
+from is_core.auth.permissions import AllowAny
+
+from pymess.config import get_backend, get_backend_names
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_request_signature(key, url, params):
+    """
+    Returns base64 encoded HMAC-SHA1 signature of the URL and the sorted POST parameters (name and value of every
+    parameter are appended to the URL). Signatures of Twilio and Mandrill requests are computed this way.
+    """
+    data = url + ''.join(
+        '{}{}'.format(param_name, value) for param_name in sorted(params) for value in params.getlist(param_name)
+    )
+    return base64.b64encode(hmac.new(key.encode(), data.encode(), hashlib.sha1).digest()).decode()
+
+
+def is_valid_request_signature(request, signature, key, urls):
+    """
+    Returns True if the request signature matches the signature computed with one of the URLs. Provider signs the URL
+    which was configured for the webhook, the URL of the request can differ from it (for example behind the proxy).
+    """
+    return bool(signature and key) and any(
+        hmac.compare_digest(get_request_signature(key, url, request.POST), signature)
+        for url in set(urls) | {request.build_absolute_uri()}
+    )
+
+
+def get_configured_backends(backend_type, backend_class):
+    """
+    Returns configured backends of the backend class, webhook credentials are read from their configuration
+    """
+    return [
+        backend for backend in (
+            get_backend(backend_type, backend_name) for backend_name in get_backend_names(backend_type)
+        ) if isinstance(backend, backend_class)
+    ]
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BaseStateWebhookView(View):
+    """
+    Base view for the provider notifications with the message states. The request is verified before the notification
+    is processed, requests which were not sent by the provider are refused with status 403. States of the messages are
+    updated by external ID, messages in the final states are not changed.
+    """
+
+    permission = AllowAny()
+
+    model = None
+    final_states = ()
+    backend_type = None
+    backend_class = None
+
+    def head(self, *args, **kwargs):
+        return HttpResponse()
+
+    def get_backends(self):
+        return get_configured_backends(self.backend_type, self.backend_class)
+
+    def is_valid_request(self, request):
+        """
+        Returns True if the request was sent by the provider
+        """
+        raise NotImplementedError
+
+    def get_message_states(self, request):
+        """
+        Returns iterable of triples (external ID, state, error) parsed from the notification request. Error can be
+        None if the message error should not be changed.
+        """
+        raise NotImplementedError
+
+    def post(self, request, *args, **kwargs):
+        if not self.is_valid_request(request):
+            logger.warning('Webhook request with invalid signature was refused')
+            return HttpResponse(status=403)
+
+        try:
+            message_states = list(self.get_message_states(request))
+        except (ValueError, TypeError, KeyError):
+            return HttpResponse(status=400)
+
+        try:
+            self.update_message_states(message_states)
+        except Exception as ex:  # pylint: disable=W0703
+            logger.exception(ex)
+
+        return HttpResponse()
+
+    def update_message_states(self, message_states):
+        # Only the last state of the message in the notification is used
+        last_message_states = {
+            external_id: (state, error) for external_id, state, error in message_states
+            if external_id and state is not None
+        }
+        if not last_message_states:
+            return
+
+        with transaction.atomic():
+            messages = self.model.objects.filter_external_ids(
+                last_message_states.keys()
+            ).exclude(
+                state__in=self.final_states
+            ).select_for_update()
+            for message in messages:
+                state, error = last_message_states[message.external_id]
+                message.change_and_save(
+                    state=state,
+                    update_only_changed_fields=True,
+                    **({} if error is None else {'error': error})
+                )
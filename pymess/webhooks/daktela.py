@@ -0,0 +1,62 @@
+import hmac
+import json
+import logging
+
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import View
+from django.utils.decorators import method_decorator
+
+from is_core.auth.permissions import AllowAny
+
+from pymess.backend.dialer import DialerController
+from pymess.backend.dialer.daktela import DaktelaDialerBackend
+from pymess.config import ControllerType
+
+from . import get_configured_backends
+
+
+logger = logging.getLogger(__name__)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DaktelaWebhookView(View):
+    """
+    View for the Daktela campaign records updates. Body of the request must be JSON with one campaign record or list of
+    campaign records in the format of the Daktela API (fields "name", "action" and "statuses"). The webhook must send
+    the header "Authorization: Bearer <token>" with the WEBHOOK_TOKEN option of the Daktela backend configuration.
+    """
+
+    permission = AllowAny()
+
+    def head(self, *args, **kwargs):
+        return HttpResponse()
+
+    def is_valid_request(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        return any(
+            hmac.compare_digest(authorization, 'Bearer {}'.format(backend.config['WEBHOOK_TOKEN']))
+            for backend in get_configured_backends(ControllerType.DIALER, DaktelaDialerBackend)
+            if backend.config['WEBHOOK_TOKEN']
+        )
+
+    def post(self, request, *args, **kwargs):
+        if not self.is_valid_request(request):
+            logger.warning('Webhook request with invalid signature was refused')
+            return HttpResponse(status=403)
+
+        try:
+            records = json.loads(request.body)
+            records = records if isinstance(records, list) else [records]
+            records = {record['name']: record for record in records}
+        except (ValueError, TypeError, KeyError):
+            return HttpResponse(status=400)
+
+        try:
+            DialerController().bulk_update_dialer_states_from_records(records)
+        except Exception as ex:  # pylint: disable=W0703
+            # Daktela retries the request if the update failed
+            logger.exception(ex)
+            return HttpResponse(status=500)
+
+        return HttpResponse()
@@ -9,37 +9,100 @@ from django.utils.timezone import now
 
 from is_core.auth.permissions import AllowAny
 
+from pymess.backend.emails.mandrill import MandrillEmailBackend
+from pymess.config import ControllerType
 from pymess.models import EmailMessage
 
+from . import get_configured_backends, is_valid_request_signature
+
 
 logger = logging.getLogger(__name__)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class MandrillWebhookView(View):
+    """
+    View for the Mandrill webhooks. Requests are verified with the X-Mandrill-Signature header signed with
+    the WEBHOOK_KEY option of the Mandrill backend configuration. If no webhook key is configured, requests are not
+    verified and only mark the messages to be updated with the pull_emails_info command.
+    """
 
     permission = AllowAny()
 
     def head(self, *args, **kwargs):
         return HttpResponse()
 
+    def get_webhook_backends(self):
+        return [
+            backend for backend in get_configured_backends(ControllerType.EMAIL, MandrillEmailBackend)
+            if backend.config['WEBHOOK_KEY']
+        ]
+
+    def is_valid_request(self, request, webhook_backends):
+        signature = request.META.get('HTTP_X_MANDRILL_SIGNATURE')
+        return any(
+            is_valid_request_signature(
+                request, signature, backend.config['WEBHOOK_KEY'], filter(None, [backend.config['WEBHOOK_URL']])
+            ) for backend in webhook_backends
+        )
+
     def post(self, request, *args, **kwargs):
+        webhook_backends = self.get_webhook_backends()
+        if not webhook_backends:
+            logger.warning(
+                'Mandrill WEBHOOK_KEY is not configured, webhook request is not verified and message data of its '
+                'events are ignored'
+            )
+        elif not self.is_valid_request(request, webhook_backends):
+            logger.warning('Webhook request with invalid signature was refused')
+            return HttpResponse(status=403)
+
         try:
             data = json.loads(request.POST.get('mandrill_events'))
         except TypeError:
             return HttpResponse(status=400)
 
-        for event in data:
-            try:
-                self.process_event(event)
-            except Exception as ex:  # pylint: disable=W0703
-                logger.exception(ex)
+        try:
+            self.process_events(data, store_info=bool(webhook_backends))
+        except Exception as ex:  # pylint: disable=W0703
+            logger.exception(ex)
 
         return HttpResponse()
 
-    def process_event(self, event_dict):
-        message_id = event_dict.get('_id', None)
-        if message_id:
-            message = EmailMessage.objects.filter(external_id=message_id).first()
-            if message:
-                message.change_and_save(last_webhook_received_at=now())
+    def _get_last_events(self, events):
+        """
+        Returns dict with the last received event for every message ID
+        """
+        last_events = {}
+        for event in events:
+            message_id = event.get('_id', None)
+            if message_id and event.get('ts', 0) >= last_events.get(message_id, {}).get('ts', 0):
+                last_events[message_id] = event
+        return last_events
+
+    def process_events(self, events, store_info=True):
+        """
+        All events are processed together. Messages are marked to be updated with pull_emails_info command. Message
+        data which are sent with the event are stored as message info, therefore message info need not to be pulled
+        from Mandrill API. Data of the unverified requests must not be stored (store_info is False).
+        """
+        last_events = self._get_last_events(events)
+        if not last_events:
+            return
+
+        received_at = now()
+        EmailMessage.objects.filter_external_ids(last_events.keys()).update(
+            last_webhook_received_at=received_at, changed_at=received_at
+        )
+        if not store_info:
+            return
+
+        messages_with_info = list(EmailMessage.objects.filter_external_ids(
+            message_id for message_id, event in last_events.items() if event.get('msg')
+        ).only('pk', 'external_id', 'extra_sender_data'))
+        for message in messages_with_info:
+            message.extra_sender_data = {
+                **(message.extra_sender_data or {}), 'info': last_events[message.external_id]['msg']
+            }
+            message.info_changed_at = received_at
+        EmailMessage.objects.bulk_update(messages_with_info, ('extra_sender_data', 'info_changed_at'))
@@ -0,0 +1,43 @@
+import hmac
+import json
+
+from pymess.backend.push.onesignal import OneSignalPushNotificationBackend
+from pymess.config import ControllerType
+from pymess.enums import PushNotificationMessageState
+from pymess.models import PushNotificationMessage
+
+from . import BaseStateWebhookView
+
+
+class OneSignalEventView(BaseStateWebhookView):
+    """
+    View for the OneSignal event webhooks. Body of the request must be JSON with one event or list of events which
+    contain notification ID (field "id") and event name (field "event"). OneSignal doesn't sign the requests,
+    therefore the webhook must send the header "Authorization: Bearer <token>" with the WEBHOOK_TOKEN option of
+    the OneSignal backend configuration.
+    """
+
+    model = PushNotificationMessage
+    final_states = (PushNotificationMessageState.DELIVERED, PushNotificationMessageState.ERROR)
+    backend_type = ControllerType.PUSH_NOTIFICATION
+    backend_class = OneSignalPushNotificationBackend
+
+    STATES_MAPPING = {
+        'notification.displayed': PushNotificationMessageState.DELIVERED,
+        'notification.clicked': PushNotificationMessageState.DELIVERED,
+        'notification.dismissed': PushNotificationMessageState.DELIVERED,
+    }
+
+    def is_valid_request(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        return any(
+            hmac.compare_digest(authorization, 'Bearer {}'.format(backend.config['WEBHOOK_TOKEN']))
+            for backend in self.get_backends() if backend.config['WEBHOOK_TOKEN']
+        )
+
+    def get_message_states(self, request):
+        events = json.loads(request.body)
+        return [
+            (event['id'], self.STATES_MAPPING.get(event['event']), None)
+            for event in (events if isinstance(events, list) else [events])
+        ]
@@ -0,0 +1,128 @@
+import base64
+import json
+import logging
+import re
+
+from urllib.parse import urlparse
+
+import requests
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from pymess.backend.sms.sns import SNSSMSBackend
+from pymess.config import ControllerType
+from pymess.enums import OutputSMSMessageState
+from pymess.models import OutputSMSMessage
+
+from . import BaseStateWebhookView
+
+
+logger = logging.getLogger(__name__)
+
+
+SIGNING_CERT_HOST_RE = re.compile(r'^sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?$')
+
+SIGNATURE_HASHES = {
+    '1': hashes.SHA1,
+    '2': hashes.SHA256,
+}
+
+# Keys of the notification which are signed in the given order, missing keys are skipped
+NOTIFICATION_SIGNED_KEYS = ('Message', 'MessageId', 'Subject', 'Timestamp', 'TopicArn', 'Type')
+SUBSCRIPTION_SIGNED_KEYS = ('Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type')
+
+
+class SNSDeliveryStatusView(BaseStateWebhookView):
+    """
+    View for the HTTP(S) subscription of the SNS topic which receives SMS delivery status logs
+    (https://docs.aws.amazon.com/sns/latest/dg/sms_stats_cloudwatch.html). Message of the notification can contain one
+    delivery status log or list of them. Signature of the notification is verified with the SNS signing certificate
+    and the topic must be set in the DELIVERY_STATUS_TOPIC_ARN option of the SNS backend configuration.
+    """
+
+    model = OutputSMSMessage
+    final_states = (
+        OutputSMSMessageState.DELIVERED, OutputSMSMessageState.ERROR_UPDATE, OutputSMSMessageState.ERROR
+    )
+    backend_type = ControllerType.SMS
+    backend_class = SNSSMSBackend
+
+    STATES_MAPPING = {
+        'SUCCESS': OutputSMSMessageState.DELIVERED,
+        'FAILURE': OutputSMSMessageState.ERROR_UPDATE,
+    }
+
+    signing_cert_timeout = 5
+
+    _signing_certificates = {}
+
+    def _get_signing_certificate(self, signing_cert_url):
+        parsed_url = urlparse(signing_cert_url)
+        if parsed_url.scheme != 'https' or not SIGNING_CERT_HOST_RE.match(parsed_url.hostname or ''):
+            raise ValueError('Invalid SNS signing certificate URL "{}"'.format(signing_cert_url))
+
+        if signing_cert_url not in self._signing_certificates:
+            response = requests.get(signing_cert_url, timeout=self.signing_cert_timeout)
+            response.raise_for_status()
+            self._signing_certificates[signing_cert_url] = x509.load_pem_x509_certificate(response.content)
+        return self._signing_certificates[signing_cert_url]
+
+    def _get_string_to_sign(self, notification):
+        signed_keys = (
+            NOTIFICATION_SIGNED_KEYS if notification['Type'] == 'Notification' else SUBSCRIPTION_SIGNED_KEYS
+        )
+        return ''.join(
+            '{}\n{}\n'.format(key, notification[key]) for key in signed_keys if key in notification
+        )
+
+    def _is_valid_notification(self, notification):
+        topic_arns = {
+            backend.config['DELIVERY_STATUS_TOPIC_ARN'] for backend in self.get_backends()
+            if backend.config['DELIVERY_STATUS_TOPIC_ARN']
+        }
+        if notification['TopicArn'] not in topic_arns:
+            return False
+
+        signature_hash = SIGNATURE_HASHES[notification['SignatureVersion']]
+        try:
+            self._get_signing_certificate(notification['SigningCertURL']).public_key().verify(
+                base64.b64decode(notification['Signature']),
+                self._get_string_to_sign(notification).encode(),
+                padding.PKCS1v15(),
+                signature_hash()
+            )
+        except InvalidSignature:
+            return False
+        return True
+
+    def is_valid_request(self, request):
+        try:
+            return self._is_valid_notification(json.loads(request.body))
+        except (ValueError, TypeError, KeyError, requests.RequestException) as ex:
+            logger.warning('SNS notification can\'t be verified: {}'.format(ex))
+            return False
+
+    def _get_delivery_statuses(self, notification):
+        if notification['Type'] == 'SubscriptionConfirmation':
+            logger.warning('SNS subscription must be confirmed with URL "{}"'.format(notification['SubscribeURL']))
+            return []
+        elif notification['Type'] == 'Notification':
+            delivery_statuses = json.loads(notification['Message'])
+            return delivery_statuses if isinstance(delivery_statuses, list) else [delivery_statuses]
+        else:
+            return []
+
+    def get_message_states(self, request):
+        return [
+            (
+                delivery_status['notification']['messageId'],
+                self.STATES_MAPPING.get(delivery_status['status']),
+                (
+                    delivery_status.get('delivery', {}).get('providerResponse')
+                    if delivery_status['status'] == 'FAILURE' else None
+                ),
+            ) for delivery_status in self._get_delivery_statuses(json.loads(request.body))
+        ]
@@ -0,0 +1,48 @@
+from django.conf import settings
+
+from pymess.backend.sms.twilio import TwilioSMSBackend, TwilioState
+from pymess.config import ControllerType
+from pymess.enums import OutputSMSMessageState
+from pymess.models import OutputSMSMessage
+
+from . import BaseStateWebhookView, is_valid_request_signature
+
+
+class TwilioStatusCallbackView(BaseStateWebhookView):
+    """
+    View for the Twilio message status callbacks. URL of the view must be set in the STATUS_CALLBACK option of
+    the Twilio backend configuration. Requests are verified with the X-Twilio-Signature header signed with
+    the TWILIO_AUTH_TOKEN setting.
+    """
+
+    model = OutputSMSMessage
+    final_states = (
+        OutputSMSMessageState.DELIVERED, OutputSMSMessageState.ERROR_UPDATE, OutputSMSMessageState.ERROR
+    )
+    backend_type = ControllerType.SMS
+    backend_class = TwilioSMSBackend
+
+    def is_valid_request(self, request):
+        return is_valid_request_signature(
+            request,
+            request.META.get('HTTP_X_TWILIO_SIGNATURE'),
+            getattr(settings, 'TWILIO_AUTH_TOKEN', None),
+            [backend.config['STATUS_CALLBACK'] for backend in self.get_backends() if backend.config['STATUS_CALLBACK']]
+        )
+
+    def get_message_states(self, request):
+        message_sid = request.POST['MessageSid']
+        try:
+            twilio_state = TwilioState(request.POST['MessageStatus'].upper())
+        except ValueError:
+            # Statuses which are not mapped to the message state (e.g. newly added Twilio statuses) are ignored
+            return ()
+
+        error_code = request.POST.get('ErrorCode')
+        return (
+            (
+                message_sid,
+                TwilioSMSBackend.STATES_MAPPING.get(twilio_state),
+                'Twilio error code: {}'.format(error_code) if error_code else None,
+            ),
+        )